@@ -1,30 +1,47 @@
 # api.py
 
 import os
+import time
 import uuid
 import asyncio
+import logging
+from collections import Counter, deque
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import socketio
-from pdf2image import convert_from_path
 
 # ─── 1) Import your existing OCR + extractor modules ───
-from ocr_utils import run_ocr, classify_category, normalize_ascii
-from delivery_challan import extract_delivery_challan_fields
-from lr_copy import extract_lr_copy_fields
-from tax_invoice import extract_tax_invoice_fields
-from weighbridge import extract_weighbridge_fields
-from e_way_bill import extract_eway_bill_fields
+from ocr_utils import run_ocr_layout
+from classifier import classify_category
+from text_model import get_text_model
+from extraction import classify_and_extract
+from executors import run_ocr_in_executor, run_extract_in_executor, run_store_in_executor, shutdown_executors
+from scheduler import FairScheduler
+from pdf_text import split_pdf_pages
+from pdf_pages import aiter_pdf_pages, render_page
+from page_buffer import PageBuffer, memory_used
+from ocr_backends import get_ocr_backend
+from job_store import get_job_store, JOB_LEASE_SECONDS
+from upload_store import UploadSessions, UploadError, UploadTooLarge
+from form_stream import aiter_form, StoredUpload
+from pipeline import Stage, RASTER_WORKERS, RASTER_QUEUE_SIZE, MAX_QUEUED_PAGES
+from metrics import STAGE_SECONDS, JOBS, capture_samples, replay_samples, register_gauge, render as render_metrics
+from log_config import configure_logging, stop_logging, bind, dropped_records, SAMPLED
+
+# Structured logging through a background writer thread (see log_config.py)
+configure_logging()
+log = logging.getLogger("api")
 
 # ─── 2) (Optional) Set GOOGLE_APPLICATION_CREDENTIALS here ───
 # os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "vision-api.json"
 
-# ─── 3) Create folders for uploads and temporary pages ───
+# ─── 3) Create folder for uploads (page images stay in memory, see page_buffer.py;
+#        an upload is kept until its pages are done so jobs can be resumed from it) ───
 UPLOAD_DIR = "uploads"
-TEMP_DIR = "temp_pages"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(TEMP_DIR, exist_ok=True)
+upload_sessions = UploadSessions(UPLOAD_DIR)   # chunked uploads in progress (see section 11)
 
 
 # ─── 4) Initialize Socket.IO + FastAPI ───
@@ -43,265 +60,603 @@ app.add_middleware(
 # Mount the Socket.IO server under the same ASGI app
 socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
-# ─── 5) In‐memory queues per connected socket ───
-# Structure: { sid_str: { "queue": [job1, job2, …], "is_processing": False } }
-user_queues = {}
 
+@app.on_event("startup")
+async def startup():
+    # Open the Vision channels (or check the local/replay OCR backend) before the first upload arrives
+    await asyncio.get_running_loop().run_in_executor(None, get_ocr_backend().warm_up)
+    # Trained classifier, if any (extract workers load their own copy once)
+    get_text_model()
+    await scheduler.start()
+    await rasterizer.start()
+    # Resume what the previous process left behind, then keep our leases alive
+    await run_store_in_executor(job_store.requeue_expired)
+    await resume_jobs(await run_store_in_executor(job_store.queued_jobs))
+    background_tasks.append(asyncio.create_task(keep_leases()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await rasterizer.stop()
+    await scheduler.stop()
+    shutdown_executors()
+    get_ocr_backend().close()
+    stop_logging()
+
+# ─── 5) Connected sockets + durable job store (see job_store.py) ───
+# Jobs are rows in the job store first and scheduler entries second: a job's
+# dict carries its job_id, batch_id and source_path plus, while this process
+# holds it, the in-memory page image. Store calls are disk writes: they go
+# through run_store_in_executor, never straight from the event loop.
+connected_sids = set()
+socket_owners = {}           # sid -> client id the socket connected with (see connect)
+job_store = get_job_store()
+sources_in_use = Counter()   # uploads still being split into jobs; not deleted before that's done
+background_tasks = []
+
+
+def file_status(job, status, result=None):
+    return {
+        "fileName": job["file_name"],
+        "status": status,
+        "result": result,
+        "parent": job["parent"],
+        "pdf": job["pdf"],
+        "page": job["page"],
+        "batchId": job["batch_id"],
+    }
+
+
+async def emit_status(job, status, result=None):
+    # Pushed to whichever socket is attached to the batch now; if none is, the
+    # client gets the result when it reattaches (see the "reattach" event)
+    sid = await run_store_in_executor(job_store.batch_sid, job["batch_id"])
+    if sid in connected_sids:
+        with STAGE_SECONDS.time(stage="emit"):
+            await sio.emit("fileStatus", file_status(job, status, result), to=sid)
+
+
+async def enqueue_job(batch_id, job, source_path):
+    job["batch_id"] = batch_id
+    job["source_path"] = source_path
+    job["job_id"] = await run_store_in_executor(job_store.add_job, batch_id, job, source_path)
+    await scheduler.submit(await run_store_in_executor(job_store.batch_owner, batch_id), job)
+
+
+async def resume_jobs(jobs):
+    # Jobs loaded from the store have no page image; it is rebuilt from the upload on demand
+    owners = {}
+    for job in jobs:
+        job["image"] = None
+        if job["batch_id"] not in owners:
+            owners[job["batch_id"]] = await run_store_in_executor(job_store.batch_owner, job["batch_id"])
+        await scheduler.submit(owners[job["batch_id"]], job)
+    if jobs:
+        log.info("Resumed %d job(s)", len(jobs))
+
+
+async def keep_leases():
+    # Renew the leases on our running jobs; requeue jobs whose owner stopped renewing
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        await run_store_in_executor(job_store.renew_leases)
+        await resume_jobs(await run_store_in_executor(job_store.requeue_expired))
+
+
+def load_page_image(job):
+    source_path = job["source_path"]
+    if job["pdf"]:
+        page = render_page(source_path, job["page"])
+        try:
+            return PageBuffer.from_image(page, f"{os.path.basename(source_path)}_page_{job['page']}.jpg")
+        finally:
+            page.close()
+    with open(source_path, "rb") as f:
+        return PageBuffer(f.read(), os.path.basename(source_path))
+
+
+def hold_source(source_path):
+    sources_in_use[source_path] += 1
+
+
+def unhold_source(source_path):
+    sources_in_use[source_path] -= 1
+    if sources_in_use[source_path] <= 0:
+        del sources_in_use[source_path]
 
-# ─── 6) Utility: Dispatch to the correct extractor based on category ───
-def extract_fields_for_category(text: str, category: str) -> dict:
-    if category == "Delivery Challan":
-        return extract_delivery_challan_fields(text)
-    elif category == "LR Copy":
-        return extract_lr_copy_fields(text)
-    elif category == "Tax Invoice":
-        return extract_tax_invoice_fields(text)
-    elif category == "Weighbridge":
-        return extract_weighbridge_fields(text)
-    elif category == "E Way Bill":
-        return extract_eway_bill_fields(text)
-    else:
-        return {}  # “Unknown” → no fields
+
+async def release_source(source_path):
+    # Delete an upload once no queued/running job may need to re-render it.
+    # Uploads are stored by content hash, so one file can back several batches.
+    if not source_path or source_path in sources_in_use:
+        return
+    pending = await run_store_in_executor(job_store.source_pending, source_path)
+    # Checked again after the await: a new upload of the same content may hold it now
+    if pending == 0 and source_path not in sources_in_use and os.path.exists(source_path):
+        os.remove(source_path)
+        log.debug("Deleted upload '%s'", source_path)
+
+
+# ─── 6) Category dispatch lives in extraction.py (runs in the extract pool) ───
 
 
 # ─── 7) Per‐image OCR + extraction job ───
-async def process_image_job(sid: str, job: dict):
+async def process_image_job(owner: str, job: dict):
 
+    batch_id = job["batch_id"]
+    job_id = job["job_id"]
     file_name = job["file_name"]
-    image_path = job["image_path"]
+    layer_text = job.get("text")          # set when the PDF text layer was used (no image then)
+    category_hint = job.get("category_hint")   # picks the preprocessing policy, see preprocess.py
     parent = job.get("parent", None)
     is_pdf = job.get("pdf", False)
     page_number = job.get("page", 0)
 
-    # 7.1) Emit “processing” status
-    print(f"[process_image_job] → socket '{sid}' processing file='{file_name}', parent='{parent}', page={page_number}, pdf={is_pdf}")
-    await sio.emit(
-        "fileStatus",
-        {
-            "fileName": file_name,
-            "status": "processing",
-            "result": None,
-            "parent": parent,
-            "pdf": is_pdf,
-            "page": page_number,
-        },
-        to=sid,
-    )
+    with bind(batch_id=batch_id, job_id=job_id):   # correlation IDs on every log line of this job
+        # 7.1) Claim the job in the store (it may be finished already, or running in another process)
+        if not await run_store_in_executor(job_store.claim, job_id):
+            log.debug("Job already taken, skipping", extra={"file": file_name, "page": page_number})
+            if job.get("image") is not None:
+                job["image"].release()
+            return
 
-    # 7.2) Run OCR, classification, and extraction
-    try:
-        text = run_ocr(image_path)                         # Google Vision → raw text
-        category = classify_category(text.lower())          # classify into one of your categories
-        extracted = extract_fields_for_category(text, category)
-
-        # ─── INJECT A DEFAULT "Category Confidence" ───
-        # This makes the React UI display the extracted fields by satisfying:
-        #   parseFloat(page.data["Category Confidence"]) * 100 > 80
-        extracted["Category Confidence"] = "1.0"
-
-        result_data = extracted
-        status_str = "completed"
-        print(f"[process_image_job]   ↪ OCR & extract succeeded for '{file_name}', category='{category}', result_keys={list(extracted.keys())}")
-    except Exception as e:
-        result_data = {"error": str(e)}
-        status_str = "failed"
-        print(f"[process_image_job]   ↪ OCR/extract FAILED for '{file_name}' → {e}")
-
-    # 7.3) Emit “completed” (or “failed”) with the extracted fields
-    await sio.emit(
-        "fileStatus",
-        {
-            "fileName": file_name,
-            "status": status_str,
-            "result": result_data,
-            "parent": parent,
-            "pdf": is_pdf,
-            "page": page_number,
-        },
-        to=sid,
-    )
-    print(f"[process_image_job]   ↪ Emitted status='{status_str}' for file='{file_name}', page={page_number}")
+        started = time.perf_counter()
 
-    # 7.4) Clean up that temporary JPEG
-    try:
-        if os.path.isfile(image_path):
-            os.remove(image_path)
-    except:
-        pass
-
-
-# ─── 8) Process queued jobs for a given socket ID ───
-async def process_user_queue(sid: str):
-    queue_data = user_queues.get(sid, None)
-    if not queue_data or queue_data["is_processing"]:
-        print(f"[process_user_queue] → Nothing to do for sid='{sid}' or already processing.")
-        return
+        # 7.2) Emit “processing” status
+        log.debug("Processing page", extra={"file": file_name, "parent": parent, "page": page_number, "pdf": is_pdf, **SAMPLED})
+        await emit_status(job, "processing")
 
-    queue_data["is_processing"] = True
-    print(f"[process_user_queue] → Starting to process {len(queue_data['queue'])} jobs for sid='{sid}'")
+        # 7.3) Run OCR, classification, and extraction off the event loop
+        try:
+            layout = None                                                                  # word positions, see word_layout.py
+            if layer_text is not None:
+                text = layer_text                                                          # digital PDF → no OCR needed
+            else:
+                if job["image"] is None:
+                    job["image"] = await run_ocr_in_executor(load_page_image, job)         # resumed job → rebuild the page
+                with STAGE_SECONDS.time(stage="ocr"):
+                    text, layout = await run_ocr_in_executor(run_ocr_layout, job["image"], category_hint)  # OCR backend → text + word boxes (thread pool)
+            (category, extracted), samples = await run_extract_in_executor(
+                capture_samples, classify_and_extract, text, layout)                      # classify + extract (process pool)
+            replay_samples(samples)                                                        # the pool's stage timings, see metrics.py
+
+            await run_store_in_executor(job_store.complete, job_id, extracted)
+            result_data = extracted
+            status_str = "completed"
+            log.debug("OCR & extract succeeded", extra={"file": file_name, "page": page_number, "category": category, **SAMPLED})
+        except Exception as e:
+            if await run_store_in_executor(job_store.fail, job_id, e) == "queued":
+                # Retried at the back of the batch's queue, keeping the page image
+                log.warning("OCR/extract failed, will retry: %s", e, extra={"file": file_name, "page": page_number})
+                JOBS.inc(status="retried")
+                await scheduler.submit(owner, job)
+                return
+            result_data = {"error": str(e)}
+            status_str = "failed"
+            log.error("OCR/extract failed: %s", e, extra={"file": file_name, "page": page_number})
+
+        # 7.4) Emit “completed” (or “failed”) with the extracted fields
+        await emit_status(job, status_str, result_data)
+        JOBS.inc(status=status_str)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="job")
+
+        # 7.5) Free the page image, and the upload once all its pages are done
+        if job.get("image") is not None:
+            job["image"].release()
+        await release_source(job["source_path"])
+
+
+# ─── 8) Shared scheduler: N workers, round-robin between clients ───
+# Jobs are scheduled by the owner of their batch (the client id, see connect),
+# so several batches from one client share its turn and its in-flight cap.
+# Caps and weights are configured in scheduler.py
+scheduler = FairScheduler(process_image_job)
 
-    while queue_data["queue"]:
-        job = queue_data["queue"].pop(0)
-        print(f"[process_user_queue]    ↪ Dequeued job: {job}")
-        await process_image_job(sid, job)
 
-    queue_data["is_processing"] = False
-    print(f"[process_user_queue] → Completed all jobs for sid='{sid}'")
+# ─── 9) Socket.IO Event Handlers ───
+def client_owner(auth, sid):
+    # The client id a browser tab keeps across reconnects (io(url, {auth: {clientId}}));
+    # clients that don't send one are their socket
+    client_id = (auth or {}).get("clientId") if isinstance(auth, dict) else None
+    return str(client_id)[:128] if client_id else sid
 
 
-# ─── 9) Socket.IO Event Handlers ───
 @sio.event
-async def connect(sid, environ):
-    # Create an empty queue for this client
-    user_queues[sid] = {"queue": [], "is_processing": False}
-    print(f"[Socket.IO] Connected: {sid}")
+async def connect(sid, environ, auth=None):
+    connected_sids.add(sid)
+    socket_owners[sid] = client_owner(auth, sid)
+    log.info("Socket connected: %s (client %s)", sid, socket_owners[sid])
 
 
 @sio.event
 async def disconnect(sid):
-    # On disconnect, clean up any remaining temp images and remove queue
-    queue_data = user_queues.pop(sid, None)
-    if queue_data:
-        for job in queue_data["queue"]:
-            try:
-                if os.path.isfile(job["image_path"]):
-                    os.remove(job["image_path"])
-            except:
-                pass
-    print(f"[Socket.IO] Disconnected: {sid}")
-
+    # Jobs keep running: the client can reattach to its batch after reconnecting
+    connected_sids.discard(sid)
+    socket_owners.pop(sid, None)
+    log.info("Socket disconnected: %s", sid)
 
-# ─── 10) HTTP endpoint to accept uploads ───
-@app.post("/extractText")
-async def extract_text(request: Request):
-
-    print("======================================")
-    print("[extract_text] → Received new POST /extractText")
-    print("   → Raw headers:", dict(request.headers))
-
-    # 10.1) Parse the entire form once
-    form = await request.form()
-    print("[extract_text]   ↪ Parsed form keys:", list(form.keys()))
-
-    # 10.2) Determine socket_id: check “socket_id” or “socket-id” in form, else header
-    socket_id = None
-    if "socket_id" in form:
-        socket_id = form.get("socket_id")
-        print(f"[extract_text]   ↪ Found socket_id in form: '{socket_id}'")
-    elif "socket-id" in form:
-        socket_id = form.get("socket-id")
-        print(f"[extract_text]   ↪ Found 'socket-id' in form: '{socket_id}'")
-    else:
-        socket_id = request.headers.get("socket-id")
-        print(f"[extract_text]   ↪ Fallback to header 'socket-id': '{socket_id}'")
-
-    if not socket_id or socket_id not in user_queues:
-        print(f"[extract_text]   ↪ ERROR: Missing or invalid socket_id: '{socket_id}'")
-        raise HTTPException(status_code=400, detail="Invalid or missing socket_id")
 
-    # 10.3) Extract parents[] array (if any)
-    raw_parents = form.getlist("parents[]")  # might be an empty list if none sent
-    print(f"[extract_text]   ↪ parents[] array (length={len(raw_parents)}): {raw_parents}")
+@sio.event
+async def reattach(sid, data):
+    # Move a batch to this (new) socket and resend the results it missed
+    batch_id = (data or {}).get("batchId")
+    if not batch_id or not await run_store_in_executor(job_store.attach, batch_id, sid):
+        return {"ok": False, "error": "Unknown batch"}
+    for job in await run_store_in_executor(job_store.finished_jobs, batch_id):
+        # The UI only fills in pages it has seen a "processing" status for
+        await sio.emit("fileStatus", file_status(job, "processing"), to=sid)
+        if job["state"] == "done":
+            await sio.emit("fileStatus", file_status(job, "completed", job["result"]), to=sid)
+        else:
+            await sio.emit("fileStatus", file_status(job, "failed", {"error": job["error"]}), to=sid)
+    counts = await run_store_in_executor(job_store.batch_counts, batch_id)
+    log.info("Socket %s reattached to batch: %s", sid, counts, extra={"batch_id": batch_id})
+    return {"ok": True, "batchId": batch_id, "counts": counts}
 
-    # 10.4) Extract list of uploaded files under "images"
-    uploads = form.getlist("images")  # each entry is an UploadFile
-    print(f"[extract_text]   ↪ images array (length={len(uploads)}): {[u.filename for u in uploads]}")
 
-    if len(uploads) == 0:
-        print("[extract_text]   ↪ ERROR: No files found under key 'images'.")
-        raise HTTPException(status_code=400, detail="No files uploaded")
+# ─── 10) HTTP endpoint to accept uploads ───
+async def enqueue_pdf_pages(batch_id, saved_path, clean_name, parent):
+    text_pages, scanned_pages = await asyncio.get_running_loop().run_in_executor(
+        None, split_pdf_pages, saved_path
+    )
+    log.debug("PDF '%s': %d page(s) with usable text layer", clean_name, len(text_pages))
 
-    # 10.5) Loop over each uploaded file
-    for idx, upload in enumerate(uploads):
-        raw_filename = upload.filename                  # e.g. "WB73B6961  30-1/1680.pdf"
-        clean_name = os.path.basename(raw_filename)     # becomes "1680.pdf"
+    for page_num, page_text in text_pages.items():
+        job = {
+            "file_name": clean_name,
+            "image": None,
+            "text": page_text,
+            "parent": parent,
+            "pdf": True,
+            "page": page_num,
+        }
+        await enqueue_job(batch_id, job, saved_path)
+        log.debug("Enqueued text-layer job", extra={"file": clean_name, "page": page_num, "job_id": job["job_id"], **SAMPLED})
+
+    # scanned_pages is None when the text layer couldn't be read → render every page
+    unique_id = str(uuid.uuid4())
+    try:
+        async for page_num, pil_page in aiter_pdf_pages(saved_path, scanned_pages):
+            page_filename = f"{unique_id}_{clean_name}_page_{page_num}.jpg"
+            page_image = await asyncio.get_running_loop().run_in_executor(
+                None, PageBuffer.from_image, pil_page, page_filename
+            )
+            pil_page.close()
 
-        unique_id = str(uuid.uuid4())
-        saved_path = os.path.join(UPLOAD_DIR, f"{unique_id}_{clean_name}")
+            weak_text = scanned_pages.get(page_num) if scanned_pages else None
+            job = {
+                "file_name": clean_name,
+                "image": page_image,
+                "category_hint": classify_category(weak_text) if weak_text else None,
+                "parent": parent,
+                "pdf": True,
+                "page": page_num,
+            }
+            # Rendering pauses while OCR is MAX_QUEUED_PAGES pages behind
+            await scheduler.wait_for_room(MAX_QUEUED_PAGES)
+            await enqueue_job(batch_id, job, saved_path)
+            log.debug("Enqueued page job", extra={"file": clean_name, "page": page_num, "job_id": job["job_id"],
+                                                  "bytes": page_image.size, "in_memory": page_image.in_memory, **SAMPLED})
+    except Exception as e:
+        log.warning("Converting PDF '%s' failed: %s", clean_name, e)
+        raise RuntimeError(f"PDF→Image conversion failed for {clean_name}: {e}") from e
 
-        # 10.5.a) Save the raw upload (PDF or image) to disk
-        try:
-            with open(saved_path, "wb") as f:
-                f.write(await upload.read())
-            print(f"[extract_text]    ↪ Saved '{clean_name}' → '{saved_path}'")
-        except Exception as e:
-            print(f"[extract_text]    ↪ ERROR saving {clean_name}: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to save {clean_name}: {e}"
-            )
 
-        lower = clean_name.lower()
-        parent = raw_parents[idx] if idx < len(raw_parents) else None
-        print(f"[extract_text]    ↪ Processing file #{idx}: '{clean_name}', parent='{parent}'")
-
-        # 10.5.b) If it’s a PDF, convert to JPEGs and enqueue one job per page
-        if lower.endswith(".pdf"):
-            try:
-                pil_pages = convert_from_path(saved_path, dpi=300)
-                print(f"[extract_text]    ↪ PDF '{clean_name}' converted to {len(pil_pages)} page(s).")
-            except Exception as e:
-                os.remove(saved_path)
-                print(f"[extract_text]    ↪ ERROR converting PDF '{clean_name}': {e}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"PDF→Image conversion failed for {clean_name}: {e}"
-                )
-
-            for page_num, pil_page in enumerate(pil_pages, start=1):
-                page_filename = f"{unique_id}_{clean_name}_page_{page_num}.jpg"
-                page_path = os.path.join(TEMP_DIR, page_filename)
-                pil_page.save(page_path, "JPEG")
-                print(f"[extract_text]      ↪ Saved page {page_num} → '{page_path}'")
-
-                job = {
-                    "file_name": clean_name,
-                    "image_path": page_path,
-                    "parent": parent,
-                    "pdf": True,
-                    "page": page_num,
-                }
-                user_queues[socket_id]["queue"].append(job)
-                print(f"[extract_text]      ↪ Enqueued job: {job}")
-
-            # Delete the original PDF immediately
-            os.remove(saved_path)
-            print(f"[extract_text]    ↪ Deleted original PDF '{saved_path}'")
-
-        # 10.5.c) If it’s a JPG/PNG, save it and enqueue a single job
-        elif lower.endswith((".jpg", ".jpeg", ".png")):
-            page_filename = f"{unique_id}_{clean_name}"
-            page_path = os.path.join(TEMP_DIR, page_filename)
-            try:
-                with open(page_path, "wb") as f:
-                    f.write(await upload.read())
-                print(f"[extract_text]    ↪ Saved image '{clean_name}' → '{page_path}'")
-            except Exception as e:
-                print(f"[extract_text]    ↪ ERROR saving image '{clean_name}': {e}")
-                raise HTTPException(status_code=500, detail=f"Failed to save {clean_name}: {e}")
+async def enqueue_upload(batch_id, saved_path, clean_name, parent):
+    # Split one stored upload into page jobs. The caller holds the source
+    # (hold_source) from before its first await; it is released here.
+    try:
+        # If it’s a PDF, use its text layer where good enough; stream the rest page by
+        # page into in-memory JPEGs, enqueueing each page as soon as it is rendered
+        if clean_name.lower().endswith(".pdf"):
+            await enqueue_pdf_pages(batch_id, saved_path, clean_name, parent)
 
+        # If it’s a JPG/PNG, enqueue a single job; the worker reads the image from disk
+        else:
             job = {
                 "file_name": clean_name,
-                "image_path": page_path,
+                "image": None,
                 "parent": parent,
                 "pdf": False,
                 "page": 0,
             }
-            user_queues[socket_id]["queue"].append(job)
-            print(f"[extract_text]    ↪ Enqueued job: {job}")
+            await enqueue_job(batch_id, job, saved_path)
+            log.debug("Enqueued image job", extra={"file": clean_name, "job_id": job["job_id"], **SAMPLED})
+    finally:
+        # The upload is deleted once its last page job finishes (now, if they all have)
+        unhold_source(saved_path)
+        await release_source(saved_path)
+
+
+async def rasterize_upload(item):
+    # Rasterize stage (see pipeline.py): one received file → page jobs
+    batch_id, saved_path, clean_name, parent = item
+    with bind(batch_id=batch_id):
+        try:
+            await enqueue_upload(batch_id, saved_path, clean_name, parent)
+        except Exception as e:
+            # The upload request has been answered already: report the file as a failed page of its batch
+            job = {"file_name": clean_name, "parent": parent, "pdf": clean_name.lower().endswith(".pdf"), "page": 0}
+            job["batch_id"], job["source_path"] = batch_id, None
+            job["job_id"] = await run_store_in_executor(job_store.add_job, batch_id, job)
+            await run_store_in_executor(job_store.fail, job["job_id"], e, False)
+            await emit_status(job, "failed", {"error": str(e)})
 
-        else:
-            # Unsupported file type—delete and return an error
-            os.remove(saved_path)
-            print(f"[extract_text]    ↪ ERROR unsupported file type: '{clean_name}'")
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {clean_name}")
 
-    # 10.6) Kick off background processing of this socket's queue
-    print(f"[extract_text]   ↪ Queued total of {len(user_queues[socket_id]['queue'])} job(s) for socket '{socket_id}'")
-    asyncio.create_task(process_user_queue(socket_id))
+rasterizer = Stage("rasterize", rasterize_upload, RASTER_WORKERS, RASTER_QUEUE_SIZE)
+
+
+async def hand_off(batch_id, saved_path, clean_name, parent):
+    # Queue a held upload for the rasterize stage; waits while that stage is full
+    try:
+        await rasterizer.put((batch_id, saved_path, clean_name, parent))
+    except BaseException:
+        unhold_source(saved_path)
+        await release_source(saved_path)
+        raise
+
+
+def check_file_type(clean_name):
+    if not clean_name.lower().endswith((".pdf", ".jpg", ".jpeg", ".png")):
+        log.info("Rejected unsupported file type: '%s'", clean_name)
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {clean_name}")
+
+
+def check_socket(socket_id):
+    if not socket_id or socket_id not in connected_sids:
+        log.info("Rejected missing or invalid socket_id: '%s'", socket_id)
+        raise HTTPException(status_code=400, detail="Invalid or missing socket_id")
+
+
+# /extractText is the "receive" stage: the body is parsed as it arrives (see
+# form_stream.py) and each file goes to the rasterize stage as soon as its
+# part is complete, so the first pages are OCR'd while later files are still
+# uploading. A file's parents[] entry must come before the next file (docOcrWeb
+# sends it right after the file); socket_id/socket-id form fields must come
+# before the first file, otherwise the "socket-id" header is used.
+@app.post("/extractText")
+async def extract_text(request: Request):
+    log.debug("POST /extractText", extra={"content_length": request.headers.get("content-length")})
+
+    socket_id = request.headers.get("socket-id")
+    batch_id = None
+    parents = []
+    stored = deque()  # files held (hold_source) as soon as they were stored, not yet looked at
+    received = []     # (saved_path, clean_name) in arrival order, each held
+    handed_off = 0    # received[:handed_off] are with the rasterize stage
+
+    def hold_stored(upload):
+        # Called by the parser the moment a file is in place, before any await:
+        # a file with the same content may belong to a job that is about to finish
+        hold_source(upload.path)
+        stored.append(upload.path)
+
+    async def hand_off_ready(final=False):
+        # File i goes once its parent is known: parents[i] arrived, or file i+1 did
+        nonlocal batch_id, handed_off
+        while handed_off < len(received) and (final or handed_off < len(parents)
+                                              or handed_off < len(received) - 1):
+            if batch_id is None:
+                # 10.2) First file: the socket must be known by now
+                check_socket(socket_id)
+                batch_id = await run_store_in_executor(job_store.create_batch, socket_id, socket_owners.get(socket_id))
+                log.info("New batch for socket %s", socket_id, extra={"batch_id": batch_id})
+            saved_path, clean_name = received[handed_off]
+            parent = parents[handed_off] if handed_off < len(parents) else None
+            handed_off += 1
+            await hand_off(batch_id, saved_path, clean_name, parent)
+
+    try:
+        # 10.1) Read the form part by part; files are streamed to disk and hashed on the way
+        async for name, value in aiter_form(request, UPLOAD_DIR, on_file=hold_stored):
+            if isinstance(value, StoredUpload):
+                stored.popleft()
+                clean_name = os.path.basename(value.filename)     # "WB73B6961  30-1/1680.pdf" → "1680.pdf"
+                if name != "images" or not clean_name.lower().endswith((".pdf", ".jpg", ".jpeg", ".png")):
+                    unhold_source(value.path)
+                    await release_source(value.path)
+                    if name != "images":
+                        continue
+                    check_file_type(clean_name)
+                received.append((value.path, clean_name))
+                log.debug("Received '%s' (%d bytes) → '%s'", clean_name, value.size, value.path, extra={"batch_id": batch_id})
+            elif name == "parents[]":
+                parents.append(value)
+            elif name in ("socket_id", "socket-id"):
+                if batch_id is None:
+                    socket_id = value
+            await hand_off_ready()
+
+        if not received:
+            log.info("Rejected upload without files under 'images'")
+            raise HTTPException(status_code=400, detail="No files uploaded")
+        await hand_off_ready(final=True)
+    except UploadTooLarge as e:
+        log.info("Rejected upload: %s", e)
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        log.info("Rejected upload: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Files never handed off (error, client went away) are not needed any more
+        for saved_path in [path for path, _ in received[handed_off:]] + list(stored):
+            unhold_source(saved_path)
+            await release_source(saved_path)
+
+    # 10.3) The files are queued for rasterizing; their first pages may already be done
+    log.info("%d file(s) received, %d file(s) waiting to be rasterized", len(received), rasterizer.qsize(),
+             extra={"batch_id": batch_id})
+
+    return {"message": "Files are being processed", "batch_id": batch_id}
+
+
+# ─── 11) Chunked, resumable uploads (see upload_store.py) ───
+# A dropped connection during one big /extractText request restarts the whole
+# upload. Clients on poor links instead:
+#   POST /batches                          (socket-id header) → batch_id
+#   POST /uploads    {file_name, size}     → upload_id, part_size, total_parts, received
+#   PUT  /uploads/{upload_id}/parts/{n}    raw bytes of part n; re-sending a part is harmless
+#   GET  /uploads/{upload_id}              → received, to resume after a failure
+#   POST /uploads/{upload_id}/complete  {batch_id, parent} → file is reassembled and enqueued
+# Each file goes to the rasterize stage as soon as it completes, while the others are still uploading.
+completing_uploads = set()
+
+
+def _session_or_404(upload_id):
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upload: {upload_id}")
+    return session
+
+
+@app.post("/batches")
+async def create_batch(request: Request):
+    socket_id = request.headers.get("socket-id")
+    check_socket(socket_id)
+    batch_id = await run_store_in_executor(job_store.create_batch, socket_id, socket_owners.get(socket_id))
+    log.info("New batch for socket %s", socket_id, extra={"batch_id": batch_id})
+    return {"batch_id": batch_id}
+
+
+@app.post("/uploads")
+async def create_upload(request: Request):
+    body = await request.json()
+    clean_name = os.path.basename(str(body.get("file_name") or ""))
+    check_file_type(clean_name)
+    try:
+        session = upload_sessions.create(clean_name, int(body.get("size", -1)))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (UploadError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log.debug("Upload session %s: '%s', %d bytes in %d part(s)",
+              session["upload_id"], clean_name, session["size"], session["total_parts"])
+    return {**session, "received": []}
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    return _session_or_404(upload_id)
+
+
+@app.put("/uploads/{upload_id}/parts/{n}")
+async def upload_part(upload_id: str, n: int, request: Request):
+    session = _session_or_404(upload_id)
+    try:
+        size = await upload_sessions.write_part(session, n, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"upload_id": upload_id, "part": n, "size": size}
+
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: Request):
+    body = await request.json()
+    batch_id = body.get("batch_id")
+    parent = body.get("parent")
+    await _batch_or_404(batch_id)
+    if upload_id in completing_uploads:
+        raise HTTPException(status_code=409, detail=f"Upload {upload_id} is already being completed")
+    session = _session_or_404(upload_id)
+
+    loop = asyncio.get_running_loop()
+    completing_uploads.add(upload_id)
+    try:
+        # Reassembly reads and writes the whole file: keep it off the event loop
+        staged = await loop.run_in_executor(None, upload_sessions.assemble, session)
+        try:
+            # Committed and held with no await in between, as in extract_text:
+            # a job with the same content may release_source it otherwise
+            saved_path, _, size = staged.commit()
+        except BaseException:
+            staged.discard()
+            raise
+        hold_source(saved_path)
+        try:
+            await loop.run_in_executor(None, upload_sessions.discard, upload_id)   # the parts
+        except BaseException:
+            unhold_source(saved_path)
+            await release_source(saved_path)
+            raise
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        completing_uploads.discard(upload_id)
+
+    clean_name = session["file_name"]
+    log.debug("Reassembled '%s' (%d bytes) → '%s'", clean_name, size, saved_path, extra={"batch_id": batch_id})
+    await hand_off(batch_id, saved_path, clean_name, parent)
+    return {"upload_id": upload_id, "batch_id": batch_id, "file_name": clean_name, "size": size}
+
+
+# ─── 12) REST: batch status + results, read back from the job store ───
+# For consumers that poll instead of holding a socket:
+#   GET /batches/{batch_id}                            → counts per state
+#   GET /batches/{batch_id}/results?since=0&limit=100  → pages finished after `since`
+# Pass `next_cursor` from one results page as `since` for the next poll.
+RESULTS_PAGE_MAX = 1000
+
+
+async def _batch_or_404(batch_id):
+    batch = await run_store_in_executor(job_store.get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch: {batch_id}")
+    return batch
+
+
+@app.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    batch = await _batch_or_404(batch_id)
+    counts = await run_store_in_executor(job_store.batch_counts, batch_id)
+    total = sum(counts.values())
+    finished = counts.get("done", 0) + counts.get("failed", 0)
+    return {**batch, "total": total, "counts": counts, "complete": total > 0 and finished == total}
+
+
+@app.get("/batches/{batch_id}/results")
+async def batch_results(batch_id: str, since: int = 0, limit: int = 100):
+    await _batch_or_404(batch_id)
+    limit = max(1, min(limit, RESULTS_PAGE_MAX))
+    jobs = await run_store_in_executor(job_store.results_since, batch_id, since, limit + 1)
+    has_more = len(jobs) > limit
+    jobs = jobs[:limit]
+    return {
+        "batch_id": batch_id,
+        "results": [
+            {
+                "seq": job["seq"],
+                "job_id": job["job_id"],
+                "file_name": job["file_name"],
+                "parent": job["parent"],
+                "pdf": job["pdf"],
+                "page": job["page"],
+                "status": "completed" if job["state"] == "done" else "failed",
+                "result": job["result"],
+                "error": job["error"] if job["state"] == "failed" else None,
+                "finished_at": job["finished_at"],
+            }
+            for job in jobs
+        ],
+        "next_cursor": jobs[-1]["seq"] if jobs else since,
+        "has_more": has_more,
+    }
+
+
+# ─── 13) Prometheus metrics (stage timings are recorded where they happen, see metrics.py) ───
+register_gauge("ocr_queued_jobs", "Page jobs waiting in the scheduler", lambda: scheduler.pending())
+register_gauge("ocr_inflight_jobs", "Page jobs being OCR'd or extracted", lambda: scheduler.inflight())
+register_gauge("ocr_raster_queue_depth", "Received files waiting to be rasterized", lambda: rasterizer.qsize())
+register_gauge("ocr_page_memory_bytes", "Encoded page images held in memory", memory_used)
+register_gauge("ocr_connected_sockets", "Connected Socket.IO clients", lambda: len(connected_sids))
+register_gauge("ocr_log_dropped_records", "Log records dropped because the log queue was full", dropped_records)
+
 
-    return {"message": "Files are being processed"}
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
-# ─── 11) Run via UVicorn ───
+# ─── 14) Run via UVicorn ───
 # uvicorn api:socket_app --reload --port 8000
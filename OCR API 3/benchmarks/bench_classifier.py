@@ -0,0 +1,87 @@
+# benchmarks/bench_classifier.py
+#
+# Micro-benchmark: the scored keyword classifier (classifier.py) against the
+# old first-match if/elif chain, on long pages.
+#
+#   python benchmarks/bench_classifier.py [--lines 2000] [--repeat 20]
+#
+# Each page is the document's title and labels followed by --lines lines of
+# filler (line items), as on a long real page. The chain searches the whole
+# page for every keyword it doesn't find; the scored classifier searches the
+# first CLASSIFIER_SCAN_CHARS characters for all of them, and the rest of the
+# page only for its strong keywords when that is not conclusive (the
+# "Unknown" page). Prints µs per page for both and the category + confidence
+# the scored one returns.
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_document import OCRDocument  # noqa: E402
+from classifier import classify  # noqa: E402
+
+FILLER = "Survey No 12, Plot 4 MIDC Industrial Area, Ph 9876543210, Rs 1,250.00"
+
+PAGES = {
+    "E Way Bill": ["e-Way Bill", "Generated Date: 12/01/2024", "Valid Upto: 13/01/2024", "Vehicle MH12AB1234", "Quantity 12000 KGS"],
+    "Delivery Challan": ["DELIVERY CHALLAN", "DC No.: DC-2024/17", "Place of Dispatch: Pune"],
+    "LR Copy": ["CONSIGNMENT NOTE", "LR Copy", "Consignor", "Consignee"],
+    "Weighbridge": ["Ajanta Weigh Bridge", "Gross Wt 24560 Kg", "Tare Wt 12350 Kg", "Net Wt 12210 Kg"],
+    "Tax Invoice": ["TAX INVOICE", "Invoice No. INV-2024/17", "Authorised Signatory"],
+    "Unknown": ["Thank you, visit again"],
+}
+
+
+def legacy_classify_category(text):
+    # The if/elif chain classifier.py replaced, kept here as the reference
+    # (takes the already-lowercased text, as it did via OCRDocument.lower_text)
+    if (("eway bill" in text or "e-way bill" in text) and "generated date" in text
+            and "vehicle" in text and "quantity" in text):
+        return "E Way Bill"
+    elif "delivery challan" in text or "dc no" in text:
+        return "Delivery Challan"
+    elif "lr copy" in text or "lorry receipt" in text or "consignment note" in text:
+        return "LR Copy"
+    elif ("weighbridge" in text or "nett wt" in text or "gross wt" in text or "tare wt" in text
+          or "total net weight" in text or "mwb madarsa" in text or ("net" in text and "weight" in text)):
+        return "Weighbridge"
+    elif "tax invoice" in text or "invoice no" in text:
+        return "Tax Invoice"
+    return "Unknown"
+
+
+def build_page(keyword_lines, line_count):
+    return "\n".join(keyword_lines + [FILLER] * max(0, line_count - len(keyword_lines)))
+
+
+def best_time(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keyword classifier benchmark")
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'page':>18} {'chain µs':>10} {'scored µs':>10}  result")
+    for expected, keyword_lines in PAGES.items():
+        text = build_page(keyword_lines, args.lines)
+        # Both get the lowercased text for free: extraction.py builds the OCRDocument anyway
+        doc = OCRDocument.from_text(text)
+        chain = best_time(legacy_classify_category, doc.lower_text, args.repeat)
+        scored = best_time(classify, doc, args.repeat)
+        category, confidence = classify(doc)
+        print(f"{expected:>18} {chain * 1e6:>10.1f} {scored * 1e6:>10.1f}  {category} ({confidence:.2f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
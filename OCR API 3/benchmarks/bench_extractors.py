@@ -0,0 +1,236 @@
+# benchmarks/bench_extractors.py
+#
+# Golden-corpus benchmark: accuracy and speed of classification + every field
+# extractor.
+#
+#   python benchmarks/bench_extractors.py                          # accuracy gate + timings
+#   python benchmarks/bench_extractors.py --verbose                # also list every wrong field
+#   python benchmarks/bench_extractors.py --save-timings t.json    # keep this machine's timings
+#   python benchmarks/bench_extractors.py --compare-timings t.json # ... and gate on them later
+#
+# The corpus (--corpus, default benchmarks/golden/) uses the layout
+# `main.py --save-text` writes, so pages from a real run can be added as they
+# are, then checked by hand:
+#
+#   golden/<category>/<name>.txt           OCR text of one page
+#   golden/<category>/<name>.json          expected fields, e.g. {"Vehicle Number": "GJ15AT4471"}
+#   golden/<category>/<name>.layout.json   word positions (optional, see word_layout.py)
+#
+# The directory name is the expected category. Only the fields listed in the
+# .json are scored, so a page can be partly labelled; "Not found" means the
+# extractor must not find anything. Values are compared case-insensitively
+# with whitespace collapsed. Expected values are what is printed on the page;
+# a field the extractors are known to get wrong is listed, with the reason,
+# under "_known_failures" in the same .json:
+#
+#   {"Net Weight (Tons)": "12.210 Tons",
+#    "_known_failures": {"Net Weight (Tons)": "kg figure not divided by 1000"}}
+#
+# Each page goes through classify_and_extract, as in the extract pool, --repeat
+# times. Reported: per-field accuracy, category accuracy, and latency
+# percentiles per page. Exits non-zero when a field that is not a known
+# failure is wrong. A known failure that now passes is reported so it can be
+# taken off the list.
+#
+# Timings depend on the machine, so none are committed and speed is only
+# gated on request: --save-timings writes this run's latencies to a file, and
+# --compare-timings fails when a latency is more than --max-slowdown times the
+# one in that file (p50 per category, p50 and p90 over all pages). Save and
+# compare on the same machine, e.g. before and after a change.
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import classify_and_extract  # noqa: E402
+from word_layout import WordLayout  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "golden")
+KNOWN_FAILURES = "_known_failures"
+_SPACES = re.compile(r"\s+")
+
+
+def load_corpus(corpus_dir):
+    """[(doc_id, category, text, layout or None, expected fields, known failures)], sorted by doc_id."""
+    docs = []
+    for category in sorted(os.listdir(corpus_dir)):
+        category_dir = os.path.join(corpus_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            if not name.endswith(".txt"):
+                continue
+            stem = os.path.join(category_dir, name[:-4])
+            with open(stem + ".txt", encoding="utf-8") as f:
+                text = f.read()
+            try:
+                with open(stem + ".json", encoding="utf-8") as f:
+                    expected = json.load(f)
+            except FileNotFoundError:
+                print(f"⚠️ {category}/{name}: no expected fields (.json), skipped")
+                continue
+            known = expected.pop(KNOWN_FAILURES, {})
+            unlabelled = sorted(set(known) - set(expected) - {"(category)"})
+            if unlabelled:
+                raise ValueError(f"{category}/{name}: {KNOWN_FAILURES} lists unlabelled field(s) {unlabelled}")
+            layout = None
+            if os.path.exists(stem + ".layout.json"):
+                with open(stem + ".layout.json", encoding="utf-8") as f:
+                    layout = WordLayout.from_dict(json.load(f))
+            docs.append((f"{category}/{name[:-4]}", category, text, layout, expected, known))
+    return docs
+
+
+def same_value(expected, got):
+    return _SPACES.sub(" ", str(expected)).strip().lower() == _SPACES.sub(" ", str(got)).strip().lower()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_summary(samples):
+    values = sorted(samples)
+    return {"p50": percentile(values, 0.5), "p90": percentile(values, 0.9),
+            "p99": percentile(values, 0.99), "max": values[-1] if values else 0.0}
+
+
+def run(docs, repeat):
+    """Scores every document and times it; returns the report."""
+    documents = {}
+    fields = defaultdict(lambda: [0, 0])        # "Category/Field" -> [correct, total]
+    latencies = defaultdict(list)               # category -> µs per call
+    for doc_id, category, text, layout, expected, known in docs:
+        got_category, extracted = classify_and_extract(text, layout)
+        checks = {"(category)": got_category == category}
+        wrong = {}
+        for field, want in expected.items():
+            got = extracted.get(field, "Not found")
+            checks[field] = same_value(want, got)
+            if not checks[field]:
+                wrong[field] = {"expected": want, "got": got}
+        if not checks["(category)"]:
+            wrong["(category)"] = {"expected": category, "got": got_category}
+        for field, ok in checks.items():
+            fields[f"{category}/{field}"][0] += int(ok)
+            fields[f"{category}/{field}"][1] += 1
+        documents[doc_id] = {"checks": checks, "wrong": wrong, "known": known}
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            classify_and_extract(text, layout)
+            elapsed = (time.perf_counter() - started) * 1e6
+            latencies[category].append(elapsed)
+            latencies["(all)"].append(elapsed)
+
+    return {
+        "documents": documents,
+        "fields": dict(sorted(fields.items())),
+        "latency_us": {name: latency_summary(values) for name, values in sorted(latencies.items())},
+    }
+
+
+def print_report(report, verbose):
+    print(f"{'field':<52} {'correct':>9} {'accuracy':>9}")
+    correct = total = 0
+    for field, (ok, n) in report["fields"].items():
+        correct += ok
+        total += n
+        print(f"{field:<52} {f'{ok}/{n}':>9} {ok / n:>9.0%}")
+    print(f"{'overall':<52} {f'{correct}/{total}':>9} {correct / max(total, 1):>9.1%}")
+    print()
+    print(f"{'latency per page (µs)':<24} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for name, s in report["latency_us"].items():
+        print(f"{name:<24} {s['p50']:>9.1f} {s['p90']:>9.1f} {s['p99']:>9.1f} {s['max']:>9.1f}")
+    if verbose:
+        print()
+        for doc_id, doc in report["documents"].items():
+            for field, diff in doc["wrong"].items():
+                reason = doc["known"].get(field)
+                note = f"  (known: {reason})" if reason else ""
+                print(f"✗ {doc_id}  {field}: expected {diff['expected']!r}, got {diff['got']!r}{note}")
+
+
+def check_accuracy(report):
+    """Returns (failures, fixed): wrong fields that are not known failures, and known failures that pass."""
+    failures, fixed = [], []
+    for doc_id, doc in report["documents"].items():
+        for field, ok in doc["checks"].items():
+            if not ok and field not in doc["known"]:
+                diff = doc["wrong"][field]
+                failures.append(f"accuracy: {doc_id} {field} is wrong "
+                                f"(expected {diff['expected']!r}, got {diff['got']!r})")
+            elif ok and field in doc["known"]:
+                fixed.append(f"accuracy: {doc_id} {field} is right now; take it off {KNOWN_FAILURES}")
+    return failures, fixed
+
+
+def compare_timings(report, timings, max_slowdown):
+    """Latencies more than max_slowdown times the saved ones, as printable lines."""
+    regressions = []
+    for name, now in report["latency_us"].items():
+        then = timings.get(name)
+        if not then:
+            continue
+        # p90 of a category with one or two pages is mostly noise: only checked over all pages
+        for q in ("p50", "p90") if name == "(all)" else ("p50",):
+            if then[q] > 0 and now[q] > then[q] * max_slowdown:
+                regressions.append(f"speed: {name} {q} {now[q]:.1f} µs vs {then[q]:.1f} µs saved "
+                                   f"(×{now[q] / then[q]:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Golden-corpus accuracy/speed benchmark for the extractors")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="corpus directory (default benchmarks/golden)")
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs per page (default 200)")
+    parser.add_argument("--save-timings", metavar="FILE", help="write this run's latencies to FILE (machine-local)")
+    parser.add_argument("--compare-timings", metavar="FILE", help="fail on latencies slower than those in FILE")
+    parser.add_argument("--max-slowdown", type=float, default=1.5,
+                        help="ratio to --compare-timings that counts as a regression (default 1.5)")
+    parser.add_argument("--verbose", action="store_true", help="list every wrong field")
+    args = parser.parse_args(argv)
+
+    docs = load_corpus(args.corpus)
+    if not docs:
+        print(f"❌ No labelled pages in '{args.corpus}'")
+        return 2
+    print(f"📚 {len(docs)} page(s) from '{args.corpus}', {args.repeat} timed run(s) each\n")
+    report = run(docs, max(1, args.repeat))
+    print_report(report, args.verbose)
+
+    failures, fixed = check_accuracy(report)
+    known = sum(len(doc["known"]) for doc in report["documents"].values())
+    if args.compare_timings:
+        with open(args.compare_timings, encoding="utf-8") as f:
+            failures += compare_timings(report, json.load(f), args.max_slowdown)
+    if args.save_timings:
+        with open(args.save_timings, "w", encoding="utf-8") as f:
+            json.dump(report["latency_us"], f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"\n✅ Saved timings to '{args.save_timings}'")
+
+    print()
+    for line in fixed:
+        print(f"✅ {line}")
+    for line in failures:
+        print(f"❌ {line}")
+    if failures:
+        print(f"\n{len(failures)} failure(s) ({known} known failure(s) in the corpus not counted)")
+        return 1
+    print(f"No failures ({known} known failure(s) in the corpus, see --verbose)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# benchmarks/bench_layout.py
+#
+# Micro-benchmark: positional queries on a WordLayout (word_layout.py).
+#
+#   python benchmarks/bench_layout.py [--rows 60] [--cols 8] [--repeat 200]
+#
+# Builds a synthetic page of --rows × --cols label/value words with a
+# "Vehicle No : WB73B 6961" row in the middle, then times building the grid
+# index, value_right_of, text_below and a pickle round trip (what the
+# extract process pool pays per page). Prints µs per call.
+import os
+import sys
+import time
+import pickle
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from word_layout import WordLayout  # noqa: E402
+
+WORD_W, WORD_H, GAP, ROW_H = 90, 22, 12, 34
+
+
+def build_page(rows, cols):
+    words, boxes = [], []
+    for r in range(rows):
+        y = 40 + r * ROW_H
+        if r == rows // 2:
+            row_words = ["Vehicle", "No", ":", "WB73B", "6961"]
+        elif r == rows // 2 + 2:
+            row_words = ["From"]
+        elif r == rows // 2 + 3:
+            row_words = ["Pune", "(Maharashtra)"]
+        else:
+            row_words = [f"field{r}_{c}" for c in range(cols)]
+        x = 30
+        for word in row_words:
+            words.append(word)
+            boxes.extend((x, y, x + WORD_W, y + WORD_H))
+            x += WORD_W + GAP
+    return words, boxes
+
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WordLayout query benchmark")
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--cols", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    words, boxes = build_page(args.rows, args.cols)
+    layout = WordLayout(words, boxes)
+    print(f"{len(layout)} words, {len(pickle.dumps(layout))} bytes pickled")
+    print(f"  value_right_of('vehicle no') = {layout.value_right_of('vehicle no')!r}")
+    print(f"  text_below('from')           = {layout.text_below('from')!r}")
+
+    def build_grid():
+        WordLayout(words, boxes).within(0, 0, 1, 1)
+
+    timings = {
+        "build + grid": build_grid,
+        "find_label": lambda: layout.find_label("vehicle no"),
+        "value_right_of": lambda: layout.value_right_of("vehicle no"),
+        "text_below": lambda: layout.text_below("from"),
+        "pickle round trip": lambda: pickle.loads(pickle.dumps(layout)),
+    }
+    for name, func in timings.items():
+        print(f"{name:>20} {best_time(func, args.repeat) * 1e6:>10.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# benchmarks/bench_weighbridge.py
+#
+# Micro-benchmark: extract_weighbridge_fields must scale linearly with the
+# number of OCR lines (long multi-ticket printouts are our slowest pages).
+#
+#   python benchmarks/bench_weighbridge.py [--sizes 250 500 1000 2000 4000] [--repeat 5]
+#
+# Pages are built from repeated ticket lines that never satisfy the vehicle /
+# net-weight passes, i.e. the worst case where every pass scans to the end.
+# Prints time per page and per line for each size, then the log-log slope of
+# time vs. line count (≈1.0 is linear, ≈2.0 quadratic). Exits non-zero if the
+# slope is above --max-slope.
+import io
+import os
+import sys
+import math
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weighbridge import extract_weighbridge_fields  # noqa: E402
+
+TICKET_LINES = [
+    "Shree Ganesh Weigh Bridge",
+    "Ticket Serial 4521",
+    "Gross 24560 Kg",
+    "Tare 12350 Kg",
+    "Operator: Ramesh",
+    "Charges Rs 50",
+    "Time 10:22",
+    "Thank you, visit again",
+]
+
+
+def build_page(line_count):
+    return "\n".join(TICKET_LINES[i % len(TICKET_LINES)] for i in range(line_count))
+
+
+def time_page(text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):   # the extractor prints a banner
+            started = time.perf_counter()
+            extract_weighbridge_fields(text)
+            best = min(best, time.perf_counter() - started)
+    return best
+
+
+def loglog_slope(points):
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(t) for _, t in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return cov / var
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weighbridge extractor scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-slope", type=float, default=1.3)
+    args = parser.parse_args(argv)
+
+    points = []
+    print(f"{'lines':>8} {'ms/page':>10} {'µs/line':>10}")
+    for n in args.sizes:
+        seconds = time_page(build_page(n), args.repeat)
+        points.append((n, seconds))
+        print(f"{n:>8} {seconds * 1000:>10.2f} {seconds * 1e6 / n:>10.2f}")
+
+    slope = loglog_slope(points)
+    print(f"log-log slope: {slope:.2f} (1.0 = linear, 2.0 = quadratic)")
+    return 0 if slope <= args.max_slope else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
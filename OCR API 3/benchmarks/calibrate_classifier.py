@@ -0,0 +1,129 @@
+# benchmarks/calibrate_classifier.py
+#
+# Fits the keyword classifier's softmax temperature (CLASSIFIER_TEMPERATURE in
+# classifier.py) and checks that its confidence can be trusted at the UI's
+# gate.
+#
+#   python benchmarks/calibrate_classifier.py                    # golden corpus
+#   python benchmarks/calibrate_classifier.py --corpus training  # any labelled pages
+#
+# The corpus is one sub-folder of .txt pages per category, as in
+# benchmarks/golden/ or a text_model.py training folder. Every page is used
+# as is and as --copies copies with each line dropped with probability
+# --drop: the golden pages are all classified correctly, and without pages
+# that lost part of their text the best fit is "always certain".
+#
+# The temperature is the one with the lowest log loss of the true category
+# over all of those pages. Reported: the fitted value, and for the current
+# CLASSIFIER_TEMPERATURE a reliability table (share of pages right per
+# confidence band). Exits non-zero when the pages at or above CONFIDENCE_GATE
+# are right less often than the gate says.
+#
+# Only the keyword rules are scored; a trained text model (text_model.py)
+# has its own confidence.
+import os
+import sys
+import math
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier import category_scores, scores_to_ranking, CLASSIFIER_TEMPERATURE, CONFIDENCE_GATE  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(HERE, "golden")
+BANDS = (0.0, 0.5, CONFIDENCE_GATE, 0.9, 0.99, 1.0)
+TEMPERATURES = [0.05 * 1.03 ** i for i in range(200)]    # 0.05 .. ~18
+
+
+def load_pages(corpus_dir):
+    """[(category, text)] for every <category>/<name>.txt."""
+    pages = []
+    for category in sorted(os.listdir(corpus_dir)):
+        category_dir = os.path.join(corpus_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(category_dir, name), encoding="utf-8") as f:
+                    pages.append((category, f.read()))
+    return pages
+
+
+def drop_lines(text, rng, drop):
+    return "\n".join(line for line in text.splitlines() if rng.random() >= drop)
+
+
+def scored_pages(pages, copies, drop, seed):
+    """[(true category, keyword scores)] for the pages and their degraded copies."""
+    rng = random.Random(seed)
+    scored = []
+    for category, text in pages:
+        scored.append((category, category_scores(text)))
+        for _ in range(copies):
+            scored.append((category, category_scores(drop_lines(text, rng, drop))))
+    return scored
+
+
+def log_loss(scored, temperature):
+    total = 0.0
+    for category, scores in scored:
+        probability = dict(scores_to_ranking(scores, temperature)).get(category, 0.0)
+        total -= math.log(max(probability, 1e-12))
+    return total / len(scored)
+
+
+def reliability(scored, temperature):
+    """[(low, high, pages, mean confidence, share right)] per confidence band."""
+    bands = [[] for _ in BANDS[:-1]]
+    for category, scores in scored:
+        predicted, confidence = scores_to_ranking(scores, temperature)[0]
+        i = next(i for i in range(len(bands)) if confidence < BANDS[i + 1] or i == len(bands) - 1)
+        bands[i].append((confidence, predicted == category))
+    rows = []
+    for (low, high), band in zip(zip(BANDS, BANDS[1:]), bands):
+        if band:
+            rows.append((low, high, len(band), sum(c for c, _ in band) / len(band),
+                         sum(ok for _, ok in band) / len(band)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit and check the keyword classifier's confidence")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="labelled pages (default benchmarks/golden)")
+    parser.add_argument("--copies", type=int, default=20, help="degraded copies per page (default 20)")
+    parser.add_argument("--drop", type=float, default=0.3, help="chance each line is dropped in a copy (default 0.3)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.corpus)
+    if not pages:
+        print(f"❌ No labelled pages in '{args.corpus}'")
+        return 2
+    scored = scored_pages(pages, args.copies, args.drop, args.seed)
+    print(f"📚 {len(pages)} page(s) from '{args.corpus}' + {len(scored) - len(pages)} degraded copies\n")
+
+    fitted = min(TEMPERATURES, key=lambda t: log_loss(scored, t))
+    print(f"fitted temperature   {fitted:.2f}  (log loss {log_loss(scored, fitted):.4f})")
+    print(f"current temperature  {CLASSIFIER_TEMPERATURE:.2f}  (log loss {log_loss(scored, CLASSIFIER_TEMPERATURE):.4f})")
+    if fitted in (TEMPERATURES[0], TEMPERATURES[-1]):
+        print("⚠️ The fit hit the end of the search range: the corpus is too easy (or too hard) to fit on")
+
+    print(f"\n{'confidence':<14} {'pages':>7} {'mean conf':>10} {'right':>7}")
+    for low, high, count, mean, right in reliability(scored, CLASSIFIER_TEMPERATURE):
+        print(f"{f'{low:.2f}-{high:.2f}':<14} {count:>7} {mean:>10.3f} {right:>7.1%}")
+
+    gated = [(category, scores_to_ranking(scores)[0]) for category, scores in scored]
+    gated = [category == predicted for category, (predicted, confidence) in gated if confidence >= CONFIDENCE_GATE]
+    right = sum(gated) / len(gated) if gated else 1.0
+    print(f"\n{len(gated)} page(s) at or above the {CONFIDENCE_GATE:.0%} gate, {right:.1%} of them right")
+    if right < CONFIDENCE_GATE:
+        print(f"❌ Pages the UI trusts are right less than {CONFIDENCE_GATE:.0%} of the time: "
+              f"set CLASSIFIER_TEMPERATURE to the fitted value")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# classifier.py
+#
+# Keyword-evidence document classifier.
+#
+# classify_category used to be an if/elif chain that returned the first
+# category with any matching keyword, so a tax invoice that mentions "net
+# weight" came out as a Weighbridge slip, and api.py reported a fixed
+# "Category Confidence" of 1.0. Now every keyword found on the page adds its
+# weight to its category, and the scores are turned into a ranked list of
+# (category, confidence) pairs:
+#
+#   rank_categories(text)    # [("Tax Invoice", 0.89), ("E Way Bill", 0.05), ...]
+#   classify(text)           # ("Tax Invoice", 0.89)
+#   classify_category(text)  # "Tax Invoice"
+#
+# Confidence is a softmax over the category scores plus an "Unknown" entry
+# with a fixed score. A page is "Unknown" when no category scores at least
+# CLASSIFIER_UNKNOWN_SCORE. The keyword weights are set by hand; the softmax
+# temperature is fitted to labelled pages so that the confidence can be read
+# as a probability, which is what the UI's CONFIDENCE_GATE (0.8) assumes:
+#
+#   python benchmarks/calibrate_classifier.py    # fit, and check the gate
+#
+# fits it on the golden corpus plus copies of each page with lines dropped
+# at random (OCR that missed part of a page), and fails when pages at or
+# above the gate are right less than 80% of the time. The default below
+# comes from that run; refit when the corpus or the weights change.
+#
+# The first CLASSIFIER_SCAN_CHARS characters of a page are searched first.
+# The title and the labels that tell document types apart sit in the
+# header; what follows on a long page is line items. The rest of the page is
+# only searched when the head alone does not clear CONFIDENCE_GATE for a
+# real category, and then only for the keywords of weight 2 or more. Each
+# keyword costs one substring search, so on a 2,000-line page this is faster
+# than the old chain, which stopped at the first match but searched the
+# whole page (benchmarks/bench_classifier.py).
+#
+# When a trained model is available (text_model.py) it is asked first; its
+# answer is used if it picks a real category with at least
+# TEXT_MODEL_MIN_CONFIDENCE, otherwise the keyword rules decide.
+#
+# Configuration (environment variables):
+#   CLASSIFIER_UNKNOWN_SCORE   score of the "Unknown" entry     (default 1.0)
+#   CLASSIFIER_TEMPERATURE     softmax temperature; higher = less confident   (default 0.42, fitted)
+#   CLASSIFIER_SCAN_CHARS      characters searched first, from the top of the page; 0 = all   (default 3000)
+
+import math
+import os
+
+from ocr_document import as_document
+from text_model import get_text_model, TEXT_MODEL_MIN_CONFIDENCE
+
+CLASSIFIER_UNKNOWN_SCORE = float(os.environ.get("CLASSIFIER_UNKNOWN_SCORE", "1.0"))
+CLASSIFIER_TEMPERATURE = float(os.environ.get("CLASSIFIER_TEMPERATURE", "0.42"))
+CLASSIFIER_SCAN_CHARS = int(os.environ.get("CLASSIFIER_SCAN_CHARS", "3000"))
+
+# docOcrWeb only shows a page's fields when its confidence is above this
+CONFIDENCE_GATE = 0.8
+
+# Ties go to the earlier category (the order of the old if/elif chain)
+CATEGORIES = ["E Way Bill", "Delivery Challan", "LR Copy", "Weighbridge", "Tax Invoice"]
+
+# Lowercase substrings of the OCR text → weight. 4 = page title, 2 = field
+# label specific to the document type, below 1 = only counts in combination.
+KEYWORD_WEIGHTS = {
+    "E Way Bill": {
+        # Invoices and LRs quote the e-way bill number too, so the name alone
+        # is only a field label here; the generated/valid dates are not
+        "e-way bill": 2, "eway bill": 2,
+        "generated date": 2, "valid upto": 2, "transporter doc": 1,
+        "vehicle": 0.25, "quantity": 0.25,
+    },
+    "Delivery Challan": {
+        "delivery challan": 4,
+        "dc no": 2, "challan no": 2,
+        "place of dispatch": 1, "place of delivery": 1,
+    },
+    "LR Copy": {
+        "lr copy": 4, "lorry receipt": 4, "consignment note": 4,
+        "consignor": 0.5, "consignee": 0.5,
+    },
+    "Weighbridge": {
+        "weighbridge": 4, "weigh bridge": 4, "mwb madarsa": 4,
+        "nett wt": 2, "gross wt": 2, "tare wt": 2, "total net weight": 2,
+        "net wt": 1, "rst no": 1,
+        "net": 0.5, "weight": 0.5,
+    },
+    "Tax Invoice": {
+        "tax invoice": 4,
+        "invoice no": 2,
+        "gstin": 0.5, "authorised signatory": 0.5,
+    },
+}
+
+
+class KeywordIndex:
+    """
+    Finds which of a fixed set of keywords occur in a text.
+
+    Keywords are checked shortest first, and a keyword is only searched for
+    when every shorter keyword it contains was found ("net" before "net wt",
+    "total net weight"), so an absent short keyword prunes all longer ones.
+    `guards` are extra substrings searched only for that pruning (" wt"
+    before "gross wt", "tare wt", ...); they are never reported as found.
+    Each keyword costs at most one substring search over the text. (A
+    character-level Aho-Corasick automaton would scan once, but stepping it
+    in Python is far slower per character than str.__contains__.)
+    """
+
+    def __init__(self, keywords, guards=()):
+        keywords = set(keywords)
+        guards = {g for g in guards if g not in keywords and sum(g in kw for kw in keywords) > 1}
+        self.keywords = sorted(keywords | guards, key=lambda kw: (len(kw), kw))
+        self.longest = len(self.keywords[-1]) if self.keywords else 0
+        self._guards = frozenset(guards)
+        self._contains = {
+            kw: [other for other in self.keywords if other != kw and other in kw]
+            for kw in self.keywords
+        }
+
+    def scan(self, text):
+        found = set()
+        for kw in self.keywords:
+            if all(sub in found for sub in self._contains[kw]) and kw in text:
+                found.add(kw)
+        return found - self._guards
+
+
+# Shared by several keywords each: one search rules them all out on most pages
+_GUARDS = ("bill", "challan", "invoice", " wt", "weigh", "consign", "place of")
+
+_index = KeywordIndex((kw for weights in KEYWORD_WEIGHTS.values() for kw in weights), _GUARDS)
+# Past the head only titles and document-specific labels (weight 2 or more) are
+# searched: weaker hints ("net", "quantity", "rst no", ...) are common in line items
+_strong_index = KeywordIndex(
+    (kw for weights in KEYWORD_WEIGHTS.values() for kw, w in weights.items() if w >= 2), _GUARDS)
+
+
+def _scores(found):
+    return {
+        category: sum(w for kw, w in KEYWORD_WEIGHTS[category].items() if kw in found)
+        for category in CATEGORIES
+    }
+
+
+def category_scores(text):
+    """Summed keyword weights per category (accepts raw text or an OCRDocument)."""
+    lower_text = as_document(text).lower_text
+    if CLASSIFIER_SCAN_CHARS <= 0 or len(lower_text) <= CLASSIFIER_SCAN_CHARS:
+        return _scores(_index.scan(lower_text))
+    found = _index.scan(lower_text[:CLASSIFIER_SCAN_CHARS])
+    scores = _scores(found)
+    category, confidence = scores_to_ranking(scores)[0]
+    if category != "Unknown" and confidence >= CONFIDENCE_GATE:
+        return scores
+    # Not conclusive: search the rest too (from a little before the cut, so a
+    # keyword that straddles it is found)
+    found |= _strong_index.scan(lower_text[CLASSIFIER_SCAN_CHARS - _strong_index.longest + 1:])
+    return _scores(found)
+
+
+def scores_to_ranking(scores, temperature=None):
+    """Softmax over `scores` plus the "Unknown" entry, best first."""
+    temperature = temperature or CLASSIFIER_TEMPERATURE
+    scores = dict(scores, Unknown=CLASSIFIER_UNKNOWN_SCORE)
+    order = {category: i for i, category in enumerate(scores)}
+    top = max(scores.values())
+    weights = {c: math.exp((s - top) / temperature) for c, s in scores.items()}
+    total = sum(weights.values())
+    ranked = sorted(scores, key=lambda c: (-scores[c], order[c]))
+    return [(category, weights[category] / total) for category in ranked]
+
+
+def rank_categories(text):
+    doc = as_document(text)
+    model = get_text_model()
+    if model is not None:
+        ranking = model.rank(doc)
+        category, confidence = ranking[0]
+        if category != "Unknown" and confidence >= TEXT_MODEL_MIN_CONFIDENCE:
+            return ranking
+    return scores_to_ranking(category_scores(doc))
+
+
+def classify(text):
+    """Returns (category, confidence) for one page."""
+    return rank_categories(text)[0]
+
+
+def classify_category(text):
+    return classify(text)[0]
@@ -1,21 +1,18 @@
 import os
-import io
 import re
 import time
 from PIL import Image
 from pdf2image import convert_from_path
-from google.cloud import vision
 import unicodedata
 
+from ocr_utils import run_ocr   # Vision / tesseract / replay, see ocr_backends.py
+
 # Set your credentials path
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"D:/OCR with Vision/vision-api.json"
 
 # Folder to scan
 FOLDER_PATH = r"C:\Users\visha\Downloads\January Movement-20241017T094850Z-001\January Movement\Gujarat\test\WB73B6961  30-1"
 
-# Vision API client
-client = vision.ImageAnnotatorClient()
-
 def classify_category(text):
     text = text.lower()
     if "delivery challan" in text or "dc no" in text:
@@ -51,13 +48,6 @@ def normalize_ascii(text):
     return only_ascii.lower().strip()
 
 
-def run_ocr(image_path):
-    with io.open(image_path, 'rb') as image_file:
-        content = image_file.read()
-    image = vision.Image(content=content)
-    response = client.text_detection(image=image)
-    return response.text_annotations[0].description if response.text_annotations else ""
-
 # def extract_consignment_no_near_header(lines):
 #     print("\n🔍 Debugging Consignment No Extraction")
 #     for i, line in enumerate(lines):
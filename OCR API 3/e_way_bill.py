@@ -1,20 +1,23 @@
-import re
-from ocr_utils import normalize_ascii, debug_print_lines
+import logging
+
+from ocr_utils import as_document, debug_print_lines
+from patterns import PATTERNS, find
+from log_config import SAMPLED
+
+log = logging.getLogger(__name__)
 
 def extract_eway_bill_fields(text):
-    print("\n🧾 Processing: E-Way Bill")
-    lines = text.splitlines()
+    log.debug("Extracting E-Way Bill fields", extra=SAMPLED)
+    doc = as_document(text)
+    text = doc.text
+    lines = doc.lines
     # debug_print_lines(text, "E-Way Bill: Line-by-Line OCR Output")
     result = {"Category": "E Way Bill"}
 
-    def find(pattern, flags=re.IGNORECASE):
-        match = re.search(pattern, text, flags)
-        return match.group(1).strip() if match else "Not found"
-
     # Vehicle Number: Look for exact pattern across lines
     vehicle_number = "Not found"
     for line in lines:
-        match = re.search(r"\b([A-Z]{2}\d{2}[A-Z]{1,3}\d{3,4})\b", line)
+        match = PATTERNS["vehicle_number_compact"].search(line)
         if match:
             vehicle_number = match.group(1)
             break
@@ -24,10 +27,11 @@ def extract_eway_bill_fields(text):
     # E-Way Bill No.: Look for 12–15 digit number near "Transporter Doc" or in general
     eway_no = "Not found"
     for i, line in enumerate(lines):
-        if "eway bill" in line.lower() or "transporter doc" in line.lower():
+        lower = doc.lower_lines[i]
+        if "eway bill" in lower or "transporter doc" in lower:
             for j in range(i, i + 3):
                 if j < len(lines):
-                    match = re.search(r"\b\d{10,15}\b", lines[j])
+                    match = PATTERNS["eway_bill_number"].search(lines[j])
                     if match:
                         eway_no = match.group()
                         break
@@ -37,21 +41,21 @@ def extract_eway_bill_fields(text):
 
 
     # 3️⃣ Generated & Valid Dates
-    result["Generated Date"] = find(r"Generated\s+Date[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})")
-    result["Valid Upto"] = find(r"Valid\s+Upto[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})")
+    result["Generated Date"] = find("generated_date", text)
+    result["Valid Upto"] = find("valid_upto", text)
 
     # Quantity: Search after 'Quantity' label with flexible distance and unit parsing
     qty = "Not found"
     for i, line in enumerate(lines):
-        if "quantity" in line.lower():
+        if "quantity" in doc.lower_lines[i]:
             # Look ahead up to 5 lines for value and unit
             for j in range(i + 1, min(i + 6, len(lines))):
-                num_match = re.search(r"\b\d{3,6}(?:\.\d+)?\b", lines[j])
-                unit_match = re.search(r"\b(KGS|KG|MT|TONS?)\b", lines[j], re.IGNORECASE)
+                num_match = PATTERNS["quantity_value"].search(lines[j])
+                unit_match = PATTERNS["weight_unit"].search(lines[j])
 
                 # If value is in one line and unit in next, combine them
                 if num_match and j + 1 < len(lines):
-                    unit_next = re.search(r"\b(KGS|KG|MT|TONS?)\b", lines[j + 1], re.IGNORECASE)
+                    unit_next = PATTERNS["weight_unit"].search(lines[j + 1])
                     if unit_next:
                         qty = f"{float(num_match.group()):,.2f} {unit_next.group().upper()}"
                         break
@@ -69,7 +73,7 @@ def extract_eway_bill_fields(text):
     result["From State"] = "Not found"
     result["To State"] = "Not found"
     for i, line in enumerate(lines):
-        norm = normalize_ascii(line)
+        norm = doc.norm_lines[i]
         if "dispatch from" in norm:
             for j in range(i, i+5):
                 if j < len(lines) and any(st in lines[j].upper() for st in ["MAHARASHTRA", "GUJARAT", "DELHI", "TAMIL", "KARNATAKA"]):
@@ -82,14 +86,14 @@ def extract_eway_bill_fields(text):
                     break
 
     # 6️⃣ Material name / Plastic Category
-    material_line = find(r"Product\s+Name\s+&\s+Desc[^\n]*\n\s*([A-Z\s&]+)")
+    material_line = find("eway_product_name", text)
     if material_line and material_line != "Not found":
         material_clean = material_line.strip().title()
         result["Categorisation of Plastic Waste"] = "PET" if "pet" in material_clean.lower() else material_clean
     else:
         # fallback — scan HSN/product area
-        for line in lines:
-            if "waste" in line.lower() or "plastic" in line.lower():
+        for line, lower in zip(lines, doc.lower_lines):
+            if "waste" in lower or "plastic" in lower:
                 result["Categorisation of Plastic Waste"] = line.strip().title()
                 break
         else:
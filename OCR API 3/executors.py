@@ -0,0 +1,126 @@
+# executors.py
+#
+# Executor layer that keeps blocking work off the asyncio event loop.
+#
+#   - OCR is network-bound (waiting on Vision), so it runs in a thread pool.
+#   - Classification + extraction is CPU-bound regex work, so by default it
+#     runs in a process pool and doesn't fight the event loop for the GIL.
+#   - Job store calls (job_store.py) are SQLite writes that wait on the disk,
+#     so they run on one thread of their own: the store takes one writer at a
+#     time anyway, and a single thread keeps them in the order they were made.
+#
+# The event loop itself only does request I/O and Socket.IO emits.
+#
+# Configuration (environment variables):
+#   OCR_THREAD_WORKERS   threads for OCR requests            (default 8)
+#   EXTRACT_WORKERS      workers for classification/extract  (default: CPU count)
+#   EXTRACT_EXECUTOR     "process" or "thread"               (default "process")
+
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from log_config import configure_logging
+
+OCR_THREAD_WORKERS = int(os.environ.get("OCR_THREAD_WORKERS", "8"))
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+EXTRACT_EXECUTOR = os.environ.get("EXTRACT_EXECUTOR", "process").lower()
+
+log = logging.getLogger(__name__)
+
+_ocr_executor = None
+_extract_executor = None
+_store_executor = None
+_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    global _ocr_executor
+    with _lock:
+        if _ocr_executor is None:
+            _ocr_executor = ThreadPoolExecutor(
+                max_workers=OCR_THREAD_WORKERS, thread_name_prefix="ocr"
+            )
+        return _ocr_executor
+
+
+def get_store_executor():
+    global _store_executor
+    with _lock:
+        if _store_executor is None:
+            _store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        return _store_executor
+
+
+def get_extract_executor():
+    global _extract_executor
+    with _lock:
+        if _extract_executor is None:
+            if EXTRACT_EXECUTOR == "thread":
+                _extract_executor = ThreadPoolExecutor(
+                    max_workers=EXTRACT_WORKERS, thread_name_prefix="extract"
+                )
+            else:
+                # "spawn", not fork: forking after gRPC channels are open is unsafe.
+                # Each worker logs through its own background writer, like the parent.
+                _extract_executor = ProcessPoolExecutor(
+                    max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=configure_logging,
+                )
+        return _extract_executor
+
+
+def _reset_extract_executor(broken):
+    global _extract_executor
+    with _lock:
+        if _extract_executor is broken:
+            _extract_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_ocr_in_executor(func, *args):
+    """Run a blocking OCR call (e.g. run_ocr) on the OCR thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ocr_executor(), func, *args)
+
+
+async def run_extract_in_executor(func, *args):
+    """
+    Run CPU-bound classification/extraction on the extract pool.
+    `func` and its arguments must be picklable (top-level functions) when
+    EXTRACT_EXECUTOR is "process".
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_extract_executor()
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM, segfault in a C extension, ...). Start a fresh
+        # pool and retry this job once instead of failing every later job.
+        log.warning("Extract process pool broke, restarting it")
+        _reset_extract_executor(executor)
+        return await loop.run_in_executor(get_extract_executor(), func, *args)
+
+
+async def run_store_in_executor(func, *args):
+    """Run a job store call (e.g. job_store.claim) on the store thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_store_executor(), func, *args)
+
+
+def shutdown_executors():
+    global _ocr_executor, _extract_executor, _store_executor
+    with _lock:
+        ocr, extract, store = _ocr_executor, _extract_executor, _store_executor
+        _ocr_executor = _extract_executor = _store_executor = None
+    if ocr is not None:
+        ocr.shutdown(wait=False, cancel_futures=True)
+    if extract is not None:
+        extract.shutdown(wait=False, cancel_futures=True)
+    if store is not None:
+        # Let queued writes (a job's "done") reach the store
+        store.shutdown(wait=True)
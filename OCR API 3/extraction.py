@@ -0,0 +1,47 @@
+# extraction.py
+#
+# Classification + field extraction for one page of OCR text.
+#
+# Kept separate from api.py so it can run inside a worker process: the
+# process pool only has to import this module and the extractors, not the
+# FastAPI / Socket.IO app.
+
+from classifier import classify
+from ocr_document import OCRDocument
+from delivery_challan import extract_delivery_challan_fields
+from lr_copy import extract_lr_copy_fields
+from tax_invoice import extract_tax_invoice_fields
+from weighbridge import extract_weighbridge_fields
+from e_way_bill import extract_eway_bill_fields
+from metrics import STAGE_SECONDS, EXTRACT_SECONDS
+
+
+# Dispatch to the correct extractor based on category (`text` may be a str or an OCRDocument)
+def extract_fields_for_category(text, category: str) -> dict:
+    if category == "Delivery Challan":
+        return extract_delivery_challan_fields(text)
+    elif category == "LR Copy":
+        return extract_lr_copy_fields(text)
+    elif category == "Tax Invoice":
+        return extract_tax_invoice_fields(text)
+    elif category == "Weighbridge":
+        return extract_weighbridge_fields(text)
+    elif category == "E Way Bill":
+        return extract_eway_bill_fields(text)
+    else:
+        return {}  # “Unknown” → no fields
+
+
+def classify_and_extract(text: str, layout=None):
+    """
+    Returns (category, extracted_fields) for one page of OCR text. `layout`
+    (word positions, see word_layout.py) lets extractors find values by position.
+    """
+    doc = OCRDocument.from_text(text, layout)   # normalized once, shared by classifier + extractor
+    with STAGE_SECONDS.time(stage="classify"):
+        category, confidence = classify(doc)
+    with EXTRACT_SECONDS.time(category=category):
+        extracted = extract_fields_for_category(doc, category)
+    # The UI only shows fields when parseFloat(...) * 100 > 80
+    extracted["Category Confidence"] = f"{confidence:.2f}"
+    return category, extracted
@@ -0,0 +1,148 @@
+# form_stream.py
+#
+# Reads a multipart/form-data upload part by part while it is still arriving.
+#
+# `await request.form()` only returns once the whole body has been received
+# and spooled, so /extractText could not start on the first file of a folder
+# until the last one was in. aiter_form feeds the request body to
+# python-multipart's push parser as it comes off the socket and yields every
+# part as soon as its closing boundary has been read:
+#
+#   async for name, value in aiter_form(request, UPLOAD_DIR, on_file=hold):
+#       # value is a str for text fields, a StoredUpload for files
+#
+# on_file(upload) is called the moment a file is in place, inside the same
+# parser.write() call, before any other task can run: files are stored by
+# content hash, so one that is already there may belong to a running job
+# that would delete it when it finishes.
+#
+# Files are streamed straight into the uploads folder, hashed on the way and
+# stored under their content hash (upload_store.StagedUpload).
+
+import time
+from collections import deque, namedtuple
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.multipart import parse_options_header
+except ImportError:   # python-multipart < 0.0.13
+    from multipart import MultipartParser
+    from multipart.multipart import parse_options_header
+
+from upload_store import StagedUpload, UploadError, UPLOAD_MAX_BYTES
+from metrics import STAGE_SECONDS
+
+MAX_FIELD_BYTES = 64 * 1024
+
+StoredUpload = namedtuple("StoredUpload", "filename path sha256 size")
+
+
+class _FormReader:
+    """python-multipart callbacks; finished parts collect in `parts`."""
+
+    def __init__(self, upload_dir, max_bytes, on_file=None):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.on_file = on_file
+        self.parts = deque()
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name = None
+        self._filename = None
+        self._field = None        # bytearray while reading a text field
+        self._upload = None       # StagedUpload while reading a file
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError("Form part without a name")
+        self._name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            self._filename = options[b"filename"].decode("utf-8", "replace")
+            self._upload = StagedUpload(self.upload_dir, self._filename, self.max_bytes)
+        else:
+            self._filename = None
+            self._field = bytearray()
+
+    def on_part_data(self, data, start, end):
+        chunk = data[start:end]
+        if self._upload is not None:
+            self._upload.write(chunk)
+        else:
+            self._field += chunk
+            if len(self._field) > MAX_FIELD_BYTES:
+                raise UploadError(f"Form field '{self._name}' is larger than {MAX_FIELD_BYTES} bytes")
+
+    def on_part_end(self):
+        if self._upload is not None:
+            path, sha256, size = self._upload.commit()
+            self._upload = None
+            upload = StoredUpload(self._filename, path, sha256, size)
+            if self.on_file is not None:
+                self.on_file(upload)
+            self.parts.append((self._name, upload))
+        else:
+            self.parts.append((self._name, self._field.decode("utf-8", "replace")))
+            self._field = None
+
+    def close(self):
+        # Drop a file that was cut off mid-part (error, or the client went away)
+        if self._upload is not None:
+            self._upload.discard()
+            self._upload = None
+
+
+async def aiter_form(request, upload_dir, max_bytes=UPLOAD_MAX_BYTES, on_file=None):
+    """
+    Yields (name, value) for each part of a multipart/form-data request as it
+    completes. A file is on disk when it is yielded. Several parts can complete
+    in one chunk, so callers that may delete uploads concurrently mark a file
+    in use from on_file(upload), which runs as soon as it is stored; a file
+    passed to on_file may then never be yielded (error, or the caller stopped).
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data body")
+
+    reader = _FormReader(upload_dir, max_bytes, on_file)
+    parser = MultipartParser(options[b"boundary"], reader.callbacks())
+    parse_seconds = 0.0   # parsing + writing to disk, not waiting on the network
+    try:
+        async for chunk in request.stream():
+            started = time.perf_counter()
+            parser.write(chunk)
+            parse_seconds += time.perf_counter() - started
+            while reader.parts:
+                yield reader.parts.popleft()
+        parser.finalize()
+        STAGE_SECONDS.observe(parse_seconds, stage="upload_parse")
+        while reader.parts:
+            yield reader.parts.popleft()
+    finally:
+        reader.close()
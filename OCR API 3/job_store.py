@@ -0,0 +1,298 @@
+# job_store.py
+#
+# Durable job queue for api.py.
+#
+# Jobs used to live only in memory, and the disconnect handler threw away
+# pages that had already been rasterized, so a browser refresh, a Wi-Fi
+# reconnect or a uvicorn reload lost the batch. Every page job is now a row in
+# a local SQLite file:
+#
+#   queued ──claim──▶ running ──complete──▶ done
+#      ▲                 │
+#      └──fail (retry)───┤──fail (out of attempts)──▶ failed
+#
+# A claimed job carries a lease (owner + expiry) that the claiming process
+# renews while it is alive. Jobs whose lease ran out (the process died or was
+# reloaded) go back to "queued", so after a restart workers pick up where
+# the old process stopped. Each attempt counts, so a page that crashes the
+# worker every time ends up "failed" instead of looping.
+#
+# Jobs belong to a batch (one /extractText upload). A client that reconnects
+# with a new socket reattaches to its batch ID and is sent the results it
+# missed. A batch also records its owner (the client id), which the
+# scheduler shares capacity by. Every job that reaches done/failed also gets
+# the next number in a store-wide sequence, which is the cursor for
+# incremental result polling (results_since, served by GET
+# /batches/{id}/results).
+#
+# Configuration (environment variables):
+#   JOB_STORE_PATH      SQLite file                               (default "jobs.sqlite3")
+#   JOB_LEASE_SECONDS   lease on a running job, renewed while alive (default 60)
+#   JOB_MAX_ATTEMPTS    tries per page before it is marked failed  (default 3)
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite3")
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATES = ("done", "failed")
+
+_JOB_COLUMNS = ("job_id", "batch_id", "source_path", "file_name", "parent", "pdf", "page",
+                "text", "category_hint", "state", "attempts", "error", "result")
+
+
+class JobStore:
+    def __init__(self, path=JOB_STORE_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.instance_id = uuid.uuid4().hex    # lease owner for this process
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS batches (
+                   batch_id    TEXT PRIMARY KEY,
+                   sid         TEXT,
+                   owner       TEXT,
+                   created_at  REAL NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS jobs (
+                   job_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                   batch_id      TEXT NOT NULL,
+                   source_path   TEXT,
+                   file_name     TEXT NOT NULL,
+                   parent        TEXT,
+                   pdf           INTEGER NOT NULL,
+                   page          INTEGER NOT NULL,
+                   text          TEXT,
+                   category_hint TEXT,
+                   state         TEXT NOT NULL,
+                   attempts      INTEGER NOT NULL DEFAULT 0,
+                   lease_owner   TEXT,
+                   lease_expires REAL,
+                   error         TEXT,
+                   result        TEXT,
+                   created_at    REAL NOT NULL,
+                   updated_at    REAL NOT NULL
+               );
+               CREATE TABLE IF NOT EXISTS finished (
+                   seq       INTEGER PRIMARY KEY AUTOINCREMENT,
+                   batch_id  TEXT NOT NULL,
+                   job_id    INTEGER NOT NULL UNIQUE
+               );
+               CREATE INDEX IF NOT EXISTS jobs_batch ON jobs(batch_id, job_id);
+               CREATE INDEX IF NOT EXISTS finished_batch ON finished(batch_id, seq);
+               CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+               CREATE INDEX IF NOT EXISTS jobs_source ON jobs(source_path);"""
+        )
+        # Stores created before batches had an owner: the socket they were last attached to
+        if "owner" not in {row[1] for row in self._conn.execute("PRAGMA table_info(batches)")}:
+            self._conn.execute("ALTER TABLE batches ADD COLUMN owner TEXT")
+            self._conn.execute("UPDATE batches SET owner = COALESCE(sid, batch_id)")
+        # Stores created before the finished table existed: give their finished jobs a seq
+        self._conn.execute(
+            """INSERT OR IGNORE INTO finished (batch_id, job_id)
+               SELECT batch_id, job_id FROM jobs WHERE state IN (?, ?) ORDER BY updated_at""",
+            TERMINAL_STATES,
+        )
+
+    # ─── batches ───
+    def create_batch(self, sid, owner=None):
+        """New batch attached to socket `sid`, owned by client `owner` (default: the socket)."""
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO batches (batch_id, sid, owner, created_at) VALUES (?, ?, ?, ?)",
+                               (batch_id, sid, owner or sid, time.time()))
+        return batch_id
+
+    def attach(self, batch_id, sid):
+        """Point a batch at a (new) socket; False if the batch is unknown."""
+        with self._lock:
+            cur = self._conn.execute("UPDATE batches SET sid = ? WHERE batch_id = ?", (sid, batch_id))
+            return cur.rowcount == 1
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT batch_id, created_at FROM batches WHERE batch_id = ?", (batch_id,)
+            ).fetchone()
+        return {"batch_id": row[0], "created_at": row[1]} if row else None
+
+    def batch_sid(self, batch_id):
+        with self._lock:
+            row = self._conn.execute("SELECT sid FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return row[0] if row else None
+
+    def batch_owner(self, batch_id):
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return row[0] if row and row[0] else batch_id
+
+    def batch_counts(self, batch_id):
+        """{state: number of jobs} for one batch."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state", (batch_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def finished_jobs(self, batch_id):
+        """Terminal jobs of a batch (with their results), in the order they finished."""
+        return self.results_since(batch_id, 0, limit=-1)
+
+    def results_since(self, batch_id, cursor=0, limit=100):
+        """Jobs of a batch that finished after `cursor`, in finishing order; each has its "seq".
+        Pass the last seq seen as the next cursor. limit=-1 returns all."""
+        columns = ", ".join(f"j.{c}" for c in _JOB_COLUMNS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT {columns}, f.seq, j.updated_at FROM finished f JOIN jobs j ON j.job_id = f.job_id
+                    WHERE f.batch_id = ? AND f.seq > ? ORDER BY f.seq LIMIT ?""",
+                (batch_id, cursor, limit),
+            ).fetchall()
+        jobs = []
+        for row in rows:
+            job = _job_from_row(row[:len(_JOB_COLUMNS)])
+            job["seq"], job["finished_at"] = row[len(_JOB_COLUMNS):]
+            jobs.append(job)
+        return jobs
+
+    # ─── jobs ───
+    def add_job(self, batch_id, job, source_path=None):
+        """Persist a new queued job; returns its job_id."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                """INSERT INTO jobs (batch_id, source_path, file_name, parent, pdf, page, text,
+                                     category_hint, state, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)""",
+                (batch_id, source_path, job["file_name"], job.get("parent"), int(job.get("pdf", False)),
+                 job.get("page", 0), job.get("text"), job.get("category_hint"), now, now),
+            )
+            return cur.lastrowid
+
+    def claim(self, job_id):
+        """queued → running under our lease. False if someone else has it or it is finished."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                """UPDATE jobs SET state = 'running', attempts = attempts + 1,
+                                   lease_owner = ?, lease_expires = ?, updated_at = ?
+                   WHERE job_id = ? AND state = 'queued'""",
+                (self.instance_id, now + self.lease_seconds, now, job_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id, error, retry=True):
+        """Record a failed attempt; returns the new state ("queued" to retry, or "failed")."""
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        state = "queued" if retry and row and row[0] < self.max_attempts else "failed"
+        self._finish(job_id, state, error=str(error))
+        return state
+
+    def _finish(self, job_id, state, result=None, error=None):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    """UPDATE jobs SET state = ?, result = COALESCE(?, result), error = ?,
+                                       lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                       WHERE job_id = ?""",
+                    (state, result, error, time.time(), job_id),
+                )
+                if state in TERMINAL_STATES:
+                    self._mark_finished(job_id)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _mark_finished(self, job_id):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO finished (batch_id, job_id) SELECT batch_id, job_id FROM jobs WHERE job_id = ?",
+            (job_id,),
+        )
+
+    def renew_leases(self):
+        """Extend the lease on every job this process is running."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE state = 'running' AND lease_owner = ?",
+                (time.time() + self.lease_seconds, self.instance_id),
+            )
+            return cur.rowcount
+
+    def requeue_expired(self):
+        """Running jobs whose lease ran out go back to queued (or failed when out of attempts).
+        Returns the requeued jobs."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE state = 'running' AND lease_expires < ?",
+                (now,),
+            ).fetchall()
+            requeued = []
+            for row in rows:
+                job = _job_from_row(row)
+                state = "queued" if job["attempts"] < self.max_attempts else "failed"
+                self._conn.execute(
+                    """UPDATE jobs SET state = ?, lease_owner = NULL, lease_expires = NULL,
+                                       error = COALESCE(error, 'lease expired'), updated_at = ?
+                       WHERE job_id = ? AND state = 'running'""",
+                    (state, now, job["job_id"]),
+                )
+                if state == "queued":
+                    job["state"] = state
+                    requeued.append(job)
+                else:
+                    self._mark_finished(job["job_id"])
+            return requeued
+
+    def queued_jobs(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE state = 'queued' ORDER BY job_id"
+            ).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def source_pending(self, source_path):
+        """Jobs still queued or running that need `source_path`."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE source_path = ? AND state NOT IN (?, ?)",
+                (source_path, *TERMINAL_STATES),
+            ).fetchone()
+        return row[0]
+
+
+def _job_from_row(row):
+    job = dict(zip(_JOB_COLUMNS, row))
+    job["pdf"] = bool(job["pdf"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Process-wide job store, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
@@ -0,0 +1,187 @@
+# log_config.py
+#
+# Structured, leveled logging that never blocks the event loop.
+#
+# Every module used to print(): extract_text dumped the raw headers and every
+# enqueued job dict, process_image_job and the extractors printed per page.
+# On a 1,000-page batch that is thousands of synchronous stdout writes on the
+# event loop thread. Modules now log through the standard library:
+#
+#   log = logging.getLogger(__name__)
+#   log.info("Enqueued %d page(s)", n, extra={"file": name})
+#   log.debug("OCR done", extra=SAMPLED)     # per-page detail, sampled
+#
+# configure_logging() (api.py startup, main.py, the extract pool workers)
+# puts a QueueHandler on the root logger: a log call only formats the
+# message and appends it to a bounded in-memory queue; a QueueListener
+# thread does the actual writing to stderr. If the queue is full, the record
+# is dropped and counted (dropped_records()) instead of waiting.
+#
+# Correlation IDs: bind(batch_id=..., job_id=...) sets context variables that
+# are stamped onto every record logged inside the block, including records
+# from the asyncio tasks it starts. Lines then carry e.g.
+# "batch=3f2a… job=1187" (or "batch_id"/"job_id" keys in JSON).
+#
+# Sampling: records logged with extra=SAMPLED (per-page debug lines) are kept
+# for one job in LOG_SAMPLE_EVERY, chosen by job id, so a kept job's lines
+# are all there. Everything else is subject to LOG_LEVEL only.
+#
+# Configuration (environment variables):
+#   LOG_LEVEL          root level: DEBUG, INFO, WARNING, ...        (default "INFO")
+#   LOG_FORMAT         "text" or "json" (one object per line)       (default "text")
+#   LOG_SAMPLE_EVERY   keep sampled debug lines for 1 job in N      (default 10)
+#   LOG_QUEUE_SIZE     records buffered before new ones are dropped (default 10000)
+
+import os
+import sys
+import copy
+import json
+import zlib
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_EVERY = max(1, int(os.environ.get("LOG_SAMPLE_EVERY", "10")))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+SAMPLED = {"sampled": True}
+
+_batch_id = contextvars.ContextVar("batch_id", default=None)
+_job_id = contextvars.ContextVar("job_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName",
+                                                        "batch_id", "job_id", "sampled"}
+
+_EXC_FORMATTER = logging.Formatter()
+
+_listener = None
+_lock = threading.Lock()
+_dropped = 0
+
+
+@contextmanager
+def bind(batch_id=None, job_id=None):
+    """Correlation IDs for every record logged inside the block (and tasks started there)."""
+    tokens = []
+    if batch_id is not None:
+        tokens.append((_batch_id, _batch_id.set(batch_id)))
+    if job_id is not None:
+        tokens.append((_job_id, _job_id.set(job_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def dropped_records():
+    return _dropped
+
+
+class _ContextFilter(logging.Filter):
+    """Stamps the correlation IDs onto the record and applies sampling."""
+
+    def __init__(self, sample_every):
+        super().__init__()
+        self.sample_every = sample_every
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        record.batch_id = getattr(record, "batch_id", None) or _batch_id.get()
+        record.job_id = getattr(record, "job_id", None) or _job_id.get()
+        if getattr(record, "sampled", False) and self.sample_every > 1:
+            key = record.job_id if record.job_id is not None else next(self._counter)
+            return zlib.crc32(str(key).encode()) % self.sample_every == 0
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+    def prepare(self, record):
+        # Merge the args here (they may be mutable) and render a traceback while
+        # it still exists; the listener thread formats the rest
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        record.fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(context)s %(message)s%(fields_text)s")
+
+    def format(self, record):
+        context = [f"batch={record.batch_id}"] if getattr(record, "batch_id", None) else []
+        if getattr(record, "job_id", None) is not None:
+            context.append(f"job={record.job_id}")
+        record.context = f" [{' '.join(context)}]" if context else ""
+        fields = getattr(record, "fields", {})
+        record.fields_text = "".join(f" {k}={v!r}" for k, v in fields.items())
+        return super().format(record)
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("batch_id", "job_id"):
+            if getattr(record, key, None) is not None:
+                payload[key] = getattr(record, key)
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_every=LOG_SAMPLE_EVERY, queue_size=LOG_QUEUE_SIZE):
+    """Route the root logger through a background writer. Safe to call more than once."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+
+        handler = _DroppingQueueHandler(queue.Queue(queue_size))
+        handler.addFilter(_ContextFilter(sample_every))
+
+        root = logging.getLogger()
+        for old in list(root.handlers):
+            root.removeHandler(old)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush what is queued and stop the writer thread."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
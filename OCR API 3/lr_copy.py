@@ -1,41 +1,43 @@
-import re
-from ocr_utils import (normalize_ascii,
+import logging
+
+from ocr_utils import (as_document,
                        extract_consignor_consignee_blocks,
                        extract_states_from_blocks,
+                       extract_states_from_layout,
                        extract_consignment_no_using_date_proximity,
                        debug_print_lines
 )
+from patterns import PATTERNS, find
+from log_config import SAMPLED
+
+log = logging.getLogger(__name__)
+
 def extract_lr_copy_fields(text):
-    print("\n🦾 Processing: LR Copy")
+    log.debug("Extracting LR Copy fields", extra=SAMPLED)
 
-    lines = [normalize_ascii(line) for line in text.splitlines()]
+    doc = as_document(text)
+    text = doc.text
+    lines = list(doc.norm_lines)
     result = {"Category": "LR Copy"}
 
     # debug_print_lines(text, "LR Copy: Line-by-Line OCR Output")
 
-    def find(pattern, group=1, flags=re.IGNORECASE):
-        match = re.search(pattern, text, flags)
-        if not match:
-            return "Not found"
-        for g in match.groups():
-            if g:
-                return g.strip()
-        return "Not found"
-
-    vehicle_pattern = r"([A-Z]{2}\d{2}[A-Z]{1,3}\s?\d{3,4})"
-    date_pattern = r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})|(\d{1,2}[\s\-]?(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[\s\-]?\d{2,4})"
-
     consignment_no = extract_consignment_no_using_date_proximity(lines)
-    date_val = find(r"DATE[:\-]?\s*" + date_pattern)
-    transporter = "BHARAT CARRING AGENT" if "bharat carring agent" in normalize_ascii(text).lower() else "Not found"
+    date_val = find("date_after_date_label", text)
+    transporter = "BHARAT CARRING AGENT" if "bharat carring agent" in doc.norm_text else "Not found"
     consignor, consignee = extract_consignor_consignee_blocks(lines)
-    from_state, to_state = extract_states_from_blocks(lines)
+    from_state, to_state = extract_states_from_blocks(lines, norm_lines=lines)
+    if doc.layout is not None:
+        # Positions beat line offsets; the line scan stays as the fallback
+        layout_from, layout_to = extract_states_from_layout(doc.layout)
+        from_state = layout_from if layout_from != "Not found" else from_state
+        to_state = layout_to if layout_to != "Not found" else to_state
 
     qty_val = "Not found"
-    table_match = re.search(r"PLASTIC SCRAP[\s\S]{0,300}?(?:TOTAL|VALUE|LR TYPE)", text, re.IGNORECASE)
+    table_match = PATTERNS["lr_item_table"].search(text)
     if table_match:
         table_block = table_match.group(0)
-        quantities = re.findall(r"\b(\d{1,3}(?:,\d{3})*(?:\.\d{1,3}))\b", table_block)
+        quantities = PATTERNS["grouped_decimal_quantity"].findall(table_block)
         numeric_vals = [float(q.replace(',', '')) for q in quantities]
         if numeric_vals:
             qty_val = f"{max(numeric_vals):,.3f} MT"
@@ -47,7 +49,7 @@ def extract_lr_copy_fields(text):
         # print("📍 To State:", to_state)
 
     result.update({
-        "Vehicle Number": find(vehicle_pattern),
+        "Vehicle Number": find("vehicle_number", text),
         "Date": date_val,
         "No.": consignment_no,
         "Transporter Name": transporter,
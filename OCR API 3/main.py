@@ -1,72 +1,215 @@
 # main.py
+#
+# Batch command for backfilling folders of documents:
+#
+#   python main.py "D:\January Movement" "D:\February Movement" --workers 8 --output results.jsonl
+#
+# Every PDF/JPG/PNG under the input roots is processed concurrently. One JSON
+# line per page is appended to --output as soon as its file finishes, and the
+# file is recorded in a manifest (default: <output>.manifest) so a rerun after
+# a crash skips everything that already completed. Files that failed are not
+# recorded and are retried on the next run.
+#
+# --save-text DIR also writes each page's OCR text to DIR/<category>/, the
+# training-folder layout text_model.py expects, as <name>_<path hash>_page_N.txt:
+# the hash of the file's full path keeps same-named files from different
+# folders apart.
+#
+# --ocr-backend tesseract runs OCR locally, and --ocr-backend replay serves
+# texts recorded earlier (OCR_RECORD_DIR) with synthetic latency, to size
+# --workers or time the extractors without Vision (see ocr_backends.py).
 import os
+import sys
+import json
 import time
-from pdf2image import convert_from_path
-from ocr_utils import run_ocr, classify_category
-from delivery_challan import extract_delivery_challan_fields
-from lr_copy import extract_lr_copy_fields
-from tax_invoice import extract_tax_invoice_fields
-from weighbridge import extract_weighbridge_fields
-from e_way_bill import extract_eway_bill_fields
-
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = r"D:\OCR with Vision\OCR API 3\vision-api.json"
-
-# FOLDER_PATH = r"C:\Users\visha\Downloads\test 4\83"
-FOLDER_PATH = r"C:\Users\visha\Downloads\January Movement-20241017T094850Z-001\January Movement\Gujarat\test\WB73B6961  30-1"
-
-def process_text(text, filename, start_time):
-    category = classify_category(text)
-    if category == "Tax Invoice":
-        extracted = extract_tax_invoice_fields(text)
-    elif category == "E Way Bill":
-        extracted = extract_eway_bill_fields(text)
-    elif category == "LR Copy":
-        extracted = extract_lr_copy_fields(text)
-    elif category == "Delivery Challan":
-        extracted = extract_delivery_challan_fields(text)
-    elif category == "Weighbridge":
-         extracted = extract_weighbridge_fields(text)
-    else:
-        print(f"\n📄 File: {filename}")
-        print(f"❓ Skipped. Unrecognized category: {category}")
-        return
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from ocr_utils import run_ocr_layout, run_ocr_many_layout
+from extraction import classify_and_extract
+from executors import get_extract_executor, shutdown_executors
+from pdf_text import split_pdf_pages
+from pdf_pages import iter_pdf_pages
+from page_buffer import PageBuffer
+from ocr_backends import get_ocr_backend, set_ocr_backend, OCR_BACKENDS, OCR_BACKEND
+from ocr_batcher import VISION_BATCH_SIZE
+from log_config import configure_logging, stop_logging
+
+SUPPORTED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png")
+
+
+def save_page_text(save_dir, category, filename, page, text):
+    category_dir = os.path.join(save_dir, category)
+    os.makedirs(category_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    path_hash = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()[:8]
+    with open(os.path.join(category_dir, f"{stem}_{path_hash}_page_{page}.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def process_text(text, filename, page, start_time, save_text=None, layout=None):
+    # Classification + extraction is CPU-bound; run it on the extract pool
+    category, extracted = get_extract_executor().submit(classify_and_extract, text, layout).result()
+    if save_text:
+        save_page_text(save_text, category, filename, page, text)
     extracted["Category"] = category
     extracted["Processing Time"] = f"{round(time.time() - start_time, 2)} seconds"
+    return {
+        "file": filename,
+        "page": page,
+        "category": category,
+        "status": "completed" if category != "Unknown" else "skipped",
+        "fields": extracted,
+    }
 
-    print(f"\n📄 File: {filename}")
-    for key, value in extracted.items():
-        print(f"{key:<22}: {value}")
-    print("-" * 80)
 
-for filename in os.listdir(FOLDER_PATH):
-    path = os.path.join(FOLDER_PATH, filename)
-    start_time = time.time()
+def process_pdf(path, start_time, save_text=None):
+    # Pages with a usable text layer skip rasterization + OCR entirely
+    page_texts, scanned_pages = split_pdf_pages(path)
 
-    if filename.lower().endswith(".pdf"):
+    # Pages are rendered one at a time (bounded look-ahead) into in-memory JPEGs
+    # and OCR'd VISION_BATCH_SIZE at a time, so they share batch_annotate_images
+    # requests while at most one chunk of page images is held, however long the PDF
+    page_layouts = {}
+    chunk = {}
+
+    def ocr_chunk():
         try:
-            pages = convert_from_path(path, dpi=300)
-            if len(pages) > 1:
-                for i, page in enumerate(pages):
-                    temp_img = os.path.join(FOLDER_PATH, f"temp_page_{i}.jpg")
-                    page.save(temp_img, "JPEG")
-                    text = run_ocr(temp_img)
-                    os.remove(temp_img)
-                    process_text(text, f"{filename} [Page {i+1}]", start_time)
-            else:
-                temp_img = os.path.join(FOLDER_PATH, "temp_page.jpg")
-                pages[0].save(temp_img, "JPEG")
-                text = run_ocr(temp_img)
-                os.remove(temp_img)
-                process_text(text, filename, start_time)
-
-        except Exception as e:
-            print(f"❌ Failed to process PDF {filename}: {e}")
+            results = run_ocr_many_layout(list(chunk.values()))
+            for i, (text, layout) in zip(chunk.keys(), results):
+                page_texts[i], page_layouts[i] = text, layout
+        finally:
+            for page_image in chunk.values():
+                page_image.release()
+            chunk.clear()
+
+    try:
+        for i, page in iter_pdf_pages(path, scanned_pages):
+            chunk[i] = PageBuffer.from_image(page, f"{os.path.basename(path)}_page_{i}.jpg")
+            page.close()
+            if len(chunk) >= VISION_BATCH_SIZE:
+                ocr_chunk()
+        if chunk:
+            ocr_chunk()
+    finally:
+        for page_image in chunk.values():
+            page_image.release()
+
+    return [process_text(page_texts[i], path, i, start_time, save_text, page_layouts.get(i))
+            for i in sorted(page_texts)]
+
+
+def process_file(path, save_text=None):
+    start_time = time.time()
+    if path.lower().endswith(".pdf"):
+        return process_pdf(path, start_time, save_text)
+    text, layout = run_ocr_layout(path)
+    return [process_text(text, path, 0, start_time, save_text, layout)]
+
+
+# ─── Inputs + manifest ───
+def iter_input_files(roots):
+    for root in roots:
+        if os.path.isfile(root):
+            if root.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.abspath(root)
             continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def file_key(path):
+    # A file counts as "the same" while its path, size and mtime are unchanged
+    st = os.stat(path)
+    return f"{path}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def load_manifest(manifest_path):
+    done = set()
+    if not os.path.isfile(manifest_path):
+        return done
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                continue  # torn last line from a crash
+    return done
+
+
+def run_batch(roots, workers, output_path, manifest_path, save_text=None):
+    done = load_manifest(manifest_path)
+    todo = [(path, file_key(path)) for path in iter_input_files(roots)]
+    todo = [(path, key) for path, key in todo if key not in done]
+    print(f"📂 {len(todo)} file(s) to process, {len(done)} already in manifest")
+    if not todo:
+        return 0
+
+    get_ocr_backend().warm_up()
+    write_lock = threading.Lock()
+    failures = 0
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+         open(manifest_path, "a", encoding="utf-8") as manifest, \
+         ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(process_file, path, save_text): (path, key) for path, key in todo}
+
+        for n, future in enumerate(as_completed(futures), start=1):
+            path, key = futures[future]
+            try:
+                records = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ [{n}/{len(todo)}] Failed to process {path}: {e}")
+                continue
+
+            with write_lock:
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                # Only after the results are on disk does the file count as done
+                manifest.write(json.dumps({"key": key, "file": path, "pages": len(records)}) + "\n")
+                manifest.flush()
+
+            categories = ", ".join(sorted({r["category"] for r in records})) or "no pages"
+            print(f"📄 [{n}/{len(todo)}] {path} → {len(records)} page(s): {categories}")
+
+    print(f"✅ Done: {len(todo) - failures} file(s) processed, {failures} failed")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR + extract every PDF/image under the given folders.")
+    parser.add_argument("roots", nargs="+", help="input folders (or individual files)")
+    parser.add_argument("--workers", type=int, default=8, help="files processed concurrently (default 8)")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--manifest", help="completed-files manifest (default: <output>.manifest)")
+    parser.add_argument("--credentials", help="path to the Vision service-account JSON "
+                                              "(default: GOOGLE_APPLICATION_CREDENTIALS)")
+    parser.add_argument("--ocr-backend", choices=sorted(OCR_BACKENDS), default=OCR_BACKEND,
+                        help="OCR engine: vision, tesseract (local) or replay (recorded texts; "
+                             "see ocr_backends.py) (default: OCR_BACKEND or vision)")
+    parser.add_argument("--save-text", help="also write each page's OCR text to <dir>/<category>/ "
+                                            "(training data for text_model.py)")
+    args = parser.parse_args(argv)
+
+    if args.credentials:
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = args.credentials
+    configure_logging()   # module logs (LOG_LEVEL) go to stderr; progress lines below stay on stdout
+    set_ocr_backend(args.ocr_backend)
+
+    try:
+        return run_batch(args.roots, max(1, args.workers), args.output,
+                         args.manifest or f"{args.output}.manifest", args.save_text)
+    finally:
+        shutdown_executors()
+        stop_logging()
 
-    elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
-        text = run_ocr(path)
-        process_text(text, filename, start_time)
 
-    else:
-        continue
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# metrics.py
+#
+# Stage timings and pipeline gauges, exposed in the Prometheus text format on
+# api.py's GET /metrics.
+#
+# The only timing we had was main.py's "Processing Time" string, so a slow
+# batch could be Vision, pdf2image or our regexes and nothing told us which.
+# Every stage of a page now records its duration:
+#
+#   with STAGE_SECONDS.time(stage="pdf_render"):
+#       page = render_page(...)
+#
+#   ocr_stage_seconds{stage=...}    upload_parse, pdf_split, pdf_render,
+#                                   preprocess, ocr (cache + batching + RPC),
+#                                   ocr_rpc, classify, emit, job (end to end)
+#   ocr_extract_seconds{category}   each extractor
+#   ocr_cache_lookups_total{result} hit / miss, plus the ocr_cache_hit_ratio gauge
+#   ocr_jobs_total{status}          completed / failed / retried
+#   ocr_preprocess_bytes_*_total    page bytes before (in) / after (out) preprocessing,
+#                                   and saved (in - out); ocr_preprocess_pages_total{result}
+#   ocr_pattern_*_total{pattern}    regex calls / hits / seconds (PATTERN_STATS_ENABLED=1,
+#                                   see patterns.py)
+#
+# Queue depth, in-flight jobs and page memory are gauges read when /metrics
+# is scraped (register_gauge in api.py), so the hot path doesn't pay for them.
+#
+# This is the text exposition format written by hand rather than
+# prometheus_client: classification and extraction run in a spawned process
+# pool, and prometheus_client would need its multiprocess mode (a shared
+# directory of mmap files) to see those. Instead the pool function is wrapped
+# in capture_samples, which returns the worker's observations along with the
+# result, and the parent replays them into its own registry.
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = {}                  # name -> Histogram / Counter
+_gauges = {}                    # name -> (help, callback)
+_capture = threading.local()    # .samples is a list while capture_samples runs
+
+log = logging.getLogger(__name__)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+    family_suffix = ""   # the HELP/TYPE lines name the family as its samples do
+
+    def __init__(self, name, help, labelnames=()):
+        if name in _registry or name in _gauges:
+            raise ValueError(f"metric '{name}' is already registered")
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        _registry[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _record(self, value, labels):
+        samples = getattr(_capture, "samples", None)
+        if samples is not None:
+            samples.append((self.name, labels, value))   # replayed by the parent process
+        else:
+            self._apply(self._key(labels), value)
+
+    def collect(self):
+        with self._lock:
+            series = {key: self._snapshot(state) for key, state in self._series.items()}
+        family = self.name + self.family_suffix
+        lines = [f"# HELP {family} {self.help}", f"# TYPE {family} {self.kind}"]
+        for key in sorted(series):
+            lines.extend(self._lines(key, series[key]))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+    family_suffix = "_total"
+
+    def inc(self, amount=1, **labels):
+        self._record(amount, labels)
+
+    def _apply(self, key, amount):
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._series.get(self._key(labels), 0)
+
+    def _snapshot(self, state):
+        return state
+
+    def _lines(self, key, total):
+        return [f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(total)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self._record(value, labels)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _apply(self, key, value):
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = [[0] * len(self.buckets), 0, 0.0]   # bucket counts, count, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def _snapshot(self, state):
+        return list(state[0]), state[1], state[2]
+
+    def _lines(self, key, state):
+        counts, count, total = state
+        labels = _format_labels(self.labelnames, key)
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        le = _format_labels(self.labelnames, key, [("le", "+Inf")])
+        lines.append(f"{self.name}_bucket{le} {count}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+
+def register_gauge(name, help, callback):
+    """
+    A gauge read at scrape time. `callback()` returns a number, or a dict of
+    {label value: number} for a gauge with one label (given as `name{label}`).
+    """
+    if name.split("{")[0] in _registry or name in _gauges:
+        raise ValueError(f"metric '{name}' is already registered")
+    _gauges[name] = (help, callback)
+
+
+def _collect_gauge(name, help, callback):
+    base, _, label = name.partition("{")
+    label = label.rstrip("}")
+    lines = [f"# HELP {base} {help}", f"# TYPE {base} gauge"]
+    try:
+        value = callback()
+    except Exception as e:
+        # A broken callback must not take the whole endpoint down
+        log.warning("Gauge '%s' raised %r", base, e)
+        return lines
+    if isinstance(value, dict):
+        for key in sorted(value):
+            lines.append(f"{base}{_format_labels((label,), (key,))} {_format_value(value[key])}")
+    elif value is not None:
+        lines.append(f"{base} {_format_value(value)}")
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.collect())
+    for name, (help, callback) in list(_gauges.items()):
+        lines.extend(_collect_gauge(name, help, callback))
+    return "\n".join(lines) + "\n"
+
+
+# ─── process pools ───
+def capture_samples(func, *args):
+    """
+    Runs func(*args) and returns (result, samples): the observations made by
+    the call, instead of recording them here. Submit this to a process pool
+    and hand the samples to replay_samples in the parent.
+    """
+    _capture.samples = samples = []
+    try:
+        return func(*args), _fold_counters(samples)
+    finally:
+        _capture.samples = None
+
+
+def _fold_counters(samples):
+    # One sample per counter series instead of one per inc(): less to pickle
+    # back from the pool when every regex call is counted
+    folded, totals = [], {}
+    for name, labels, value in samples:
+        if isinstance(_registry.get(name), Counter):
+            key = (name, tuple(sorted(labels.items())))
+            totals[key] = totals.get(key, 0) + value
+        else:
+            folded.append((name, labels, value))
+    folded.extend((name, dict(labels), value) for (name, labels), value in totals.items())
+    return folded
+
+
+def replay_samples(samples):
+    for name, labels, value in samples:
+        metric = _registry.get(name)
+        if metric is not None:
+            metric._apply(metric._key(labels), value)
+
+
+# ─── the metrics themselves ───
+STAGE_SECONDS = Histogram("ocr_stage_seconds", "Time spent per pipeline stage", ["stage"])
+EXTRACT_SECONDS = Histogram("ocr_extract_seconds", "Time spent in each category's field extractor", ["category"])
+CACHE_LOOKUPS = Counter("ocr_cache_lookups", "OCR response cache lookups", ["result"])
+JOBS = Counter("ocr_jobs", "Page jobs by outcome", ["status"])
+PREPROCESS_PAGES = Counter("ocr_preprocess_pages", "Pages preprocessed, by whether the result was smaller", ["result"])
+PREPROCESS_BYTES_IN = Counter("ocr_preprocess_bytes_in", "Page image bytes before preprocessing")
+PREPROCESS_BYTES_OUT = Counter("ocr_preprocess_bytes_out", "Page image bytes sent to OCR after preprocessing")
+PREPROCESS_BYTES_SAVED = Counter("ocr_preprocess_bytes_saved", "Upload bytes saved by preprocessing")
+PATTERN_CALLS = Counter("ocr_pattern_calls", "Calls per named extractor pattern", ["pattern"])
+PATTERN_HITS = Counter("ocr_pattern_hits", "Calls per named extractor pattern that matched", ["pattern"])
+PATTERN_SECONDS = Counter("ocr_pattern_seconds", "Time spent per named extractor pattern", ["pattern"])
+
+
+def _cache_hit_ratio():
+    hits, misses = CACHE_LOOKUPS.value(result="hit"), CACHE_LOOKUPS.value(result="miss")
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+register_gauge("ocr_cache_hit_ratio", "Share of OCR cache lookups that were hits", _cache_hit_ratio)
@@ -0,0 +1,370 @@
+# ocr_backends.py
+#
+# OCR engines behind one interface, picked with OCR_BACKEND:
+#
+#   vision     Google Vision (default): OCR cache, preprocessing, micro-batched
+#              requests over the shared client pool
+#   tesseract  local CPU engine through pytesseract (needs the tesseract
+#              binary); no network, no credentials
+#   replay     texts stored on disk, served with synthetic latency; for
+#              benchmarks and load tests without the cloud API
+#
+# Every backend turns raw image bytes into the page text:
+#
+#   backend = get_ocr_backend()
+#   backend.ocr(content, category=None)           # → str
+#   backend.ocr_many(contents, category=None)     # → [str], same order
+#   backend.ocr_layout(content, category=None)    # → (str, WordLayout or None)
+#
+# ocr_layout also returns the word positions (word_layout.py) where the
+# engine reports them: Vision and tesseract always, replay when they were
+# recorded.
+#
+# OCR_RECORD_DIR, when set, saves every text the active backend returns as
+# <dir>/<sha256 of the image bytes>.txt (and its layout as .layout.json). That is the layout the replay backend
+# reads, so one run against Vision can be replayed offline afterwards:
+#
+#   OCR_RECORD_DIR=ocr_replay python main.py samples/
+#   OCR_BACKEND=replay OCR_REPLAY_LATENCY_MS=400 python main.py samples/ --workers 32
+#
+# Configuration (environment variables):
+#   OCR_BACKEND             "vision", "tesseract" or "replay"         (default "vision")
+#   OCR_RECORD_DIR          record every OCR text here                (default: off)
+#   OCR_REPLAY_DIR          texts served by the replay backend        (default "ocr_replay")
+#   OCR_REPLAY_LATENCY_MS   synthetic latency per request             (default 0)
+#   OCR_REPLAY_JITTER_MS    ± uniform jitter on that latency          (default 0)
+#   OCR_REPLAY_MISSING      page not on disk: "error", "empty", or "cycle"
+#                           (serve the stored texts in turn)          (default "error")
+#   TESSERACT_LANG          tesseract language(s)                     (default "eng")
+#   TESSERACT_CONFIG        extra tesseract options                   (default "--psm 3")
+
+import io
+import os
+import json
+import time
+import logging
+import uuid
+import random
+import itertools
+import threading
+
+from PIL import Image
+
+from ocr_cache import get_ocr_cache, content_key, cache_key
+from ocr_batcher import get_ocr_batcher
+from preprocess import preprocess_page, policy_key
+from vision_client import warm_up_vision_clients, get_vision_pool
+from word_layout import WordLayout
+from metrics import STAGE_SECONDS, CACHE_LOOKUPS
+
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "vision").lower()
+OCR_RECORD_DIR = os.environ.get("OCR_RECORD_DIR") or None
+OCR_REPLAY_DIR = os.environ.get("OCR_REPLAY_DIR", "ocr_replay")
+OCR_REPLAY_LATENCY_MS = float(os.environ.get("OCR_REPLAY_LATENCY_MS", "0"))
+OCR_REPLAY_JITTER_MS = float(os.environ.get("OCR_REPLAY_JITTER_MS", "0"))
+OCR_REPLAY_MISSING = os.environ.get("OCR_REPLAY_MISSING", "error").lower()
+TESSERACT_LANG = os.environ.get("TESSERACT_LANG", "eng")
+TESSERACT_CONFIG = os.environ.get("TESSERACT_CONFIG", "--psm 3")
+
+log = logging.getLogger(__name__)
+
+
+class OCRBackend:
+    name = None
+
+    def ocr(self, content, category=None):
+        raise NotImplementedError
+
+    def ocr_many(self, contents, category=None):
+        return [self.ocr(content, category) for content in contents]
+
+    def ocr_layout(self, content, category=None):
+        """(text, WordLayout or None) for one page."""
+        return self.ocr(content, category), None
+
+    def ocr_many_layout(self, contents, category=None):
+        return [self.ocr_layout(content, category) for content in contents]
+
+    def warm_up(self):
+        """Called once at startup by api.py and main.py."""
+
+    def close(self):
+        pass
+
+
+# ─── Google Vision ───
+def _response_text(response):
+    return response.text_annotations[0].description if response.text_annotations else ""
+
+
+class VisionBackend(OCRBackend):
+    name = "vision"
+
+    def _cached_response(self, content, category=None):
+        """Returns (cache_key, response) — response is None on a cache miss."""
+        cache = get_ocr_cache()
+        if cache is None:
+            return None, None
+        from google.cloud import vision  # Import inside function
+        key = cache_key(content, policy_key(category))
+        stored = cache.get(key)
+        CACHE_LOOKUPS.inc(result="miss" if stored is None else "hit")
+        return key, (vision.AnnotateImageResponse.deserialize(stored) if stored is not None else None)
+
+    def _store_response(self, key, response):
+        cache = get_ocr_cache()
+        if cache is None or key is None or response.error.code:
+            return  # never cache failed pages
+        from google.cloud import vision  # Import inside function
+        cache.put(key, vision.AnnotateImageResponse.serialize(response))
+
+    def annotate(self, content, category=None):
+        """
+        Full Vision response for one page: local cache first, then preprocessing
+        (shrinks the upload; `category` picks the policy) and the micro-batcher.
+        """
+        key, response = self._cached_response(content, category)
+        if response is None:
+            # Concurrent callers share one batch_annotate_images request
+            response = get_ocr_batcher().annotate(preprocess_page(content, category))
+            self._store_response(key, response)
+        return response
+
+    def ocr(self, content, category=None):
+        return _response_text(self.annotate(content, category))
+
+    def ocr_layout(self, content, category=None):
+        response = self.annotate(content, category)
+        return _response_text(response), WordLayout.from_vision_response(response)
+
+    def ocr_many(self, contents, category=None):
+        return [_response_text(response) for response in self.annotate_many(contents, category)]
+
+    def ocr_many_layout(self, contents, category=None):
+        return [(_response_text(response), WordLayout.from_vision_response(response))
+                for response in self.annotate_many(contents, category)]
+
+    def annotate_many(self, contents, category=None):
+        # All cache misses are submitted before waiting on any, so they share requests
+        batcher = get_ocr_batcher()
+        pending = []
+        for content in contents:
+            key, response = self._cached_response(content, category)
+            future = batcher.submit(preprocess_page(content, category)) if response is None else None
+            pending.append((key, response, future))
+
+        responses = []
+        for key, response, future in pending:
+            if future is not None:
+                response = future.result()
+                self._store_response(key, response)
+            responses.append(response)
+        return responses
+
+    def warm_up(self):
+        warm_up_vision_clients()
+
+    def close(self):
+        get_vision_pool().close()
+
+
+# ─── Tesseract (local, CPU) ───
+class TesseractBackend(OCRBackend):
+    name = "tesseract"
+
+    def __init__(self, lang=TESSERACT_LANG, config=TESSERACT_CONFIG):
+        self.lang = lang
+        self.config = config
+
+    def ocr(self, content, category=None):
+        import pytesseract  # Import inside function: optional dependency
+        with Image.open(io.BytesIO(content)) as image, STAGE_SECONDS.time(stage="ocr_rpc"):
+            return pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    def ocr_layout(self, content, category=None):
+        import pytesseract  # Import inside function: optional dependency
+        with Image.open(io.BytesIO(content)) as image, STAGE_SECONDS.time(stage="ocr_rpc"):
+            data = pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                             output_type=pytesseract.Output.DICT)
+        # One pass gives both: rebuild the text line by line from the words
+        lines, current = [], None
+        for i, word in enumerate(data["text"]):
+            if not word or not word.strip():
+                continue
+            line_id = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            if line_id != current:
+                lines.append([])
+                current = line_id
+            lines[-1].append(word)
+        return "\n".join(" ".join(words) for words in lines), WordLayout.from_tesseract_data(data)
+
+    def warm_up(self):
+        try:
+            import pytesseract  # Import inside function: optional dependency
+            version = pytesseract.get_tesseract_version()
+            log.info("Using tesseract %s (lang=%s)", version, self.lang)
+        except Exception as e:
+            log.error("tesseract not available, OCR will fail: %s", e)
+
+
+# ─── Replay (stored texts + synthetic latency) ───
+class ReplayBackend(OCRBackend):
+    name = "replay"
+
+    def __init__(self, replay_dir=OCR_REPLAY_DIR, latency_ms=OCR_REPLAY_LATENCY_MS,
+                 jitter_ms=OCR_REPLAY_JITTER_MS, missing=OCR_REPLAY_MISSING):
+        if missing not in ("error", "empty", "cycle"):
+            raise ValueError(f"OCR_REPLAY_MISSING must be error, empty or cycle, not {missing!r}")
+        self.replay_dir = replay_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.missing = missing
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def _sleep(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            with STAGE_SECONDS.time(stage="ocr_rpc"):   # stands in for the request
+                time.sleep(delay / 1000)
+
+    def _stored_layout(self, key):
+        try:
+            with open(os.path.join(self.replay_dir, f"{key}.layout.json"), encoding="utf-8") as f:
+                return WordLayout.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _stored_text(self, key):
+        try:
+            with open(os.path.join(self.replay_dir, f"{key}.txt"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        if self.missing == "empty":
+            return ""
+        if self.missing == "cycle":
+            with self._lock:
+                if self._cycle is None:
+                    names = sorted(n for n in os.listdir(self.replay_dir) if n.endswith(".txt"))
+                    if not names:
+                        raise FileNotFoundError(f"No recorded texts in '{self.replay_dir}'")
+                    self._cycle = itertools.cycle(names)
+                name = next(self._cycle)
+            with open(os.path.join(self.replay_dir, name), encoding="utf-8") as f:
+                return f.read()
+        raise FileNotFoundError(f"No recorded text for page {key} in '{self.replay_dir}'")
+
+    def ocr(self, content, category=None):
+        self._sleep()
+        return self._stored_text(content_key(content))
+
+    def ocr_many(self, contents, category=None):
+        # One request's worth of latency for the whole batch, like batch_annotate_images
+        self._sleep()
+        return [self._stored_text(content_key(content)) for content in contents]
+
+    def ocr_layout(self, content, category=None):
+        self._sleep()
+        key = content_key(content)
+        return self._stored_text(key), self._stored_layout(key)
+
+    def ocr_many_layout(self, contents, category=None):
+        self._sleep()
+        keys = [content_key(content) for content in contents]
+        return [(self._stored_text(key), self._stored_layout(key)) for key in keys]
+
+    def warm_up(self):
+        count = (sum(1 for n in os.listdir(self.replay_dir) if n.endswith(".txt"))
+                 if os.path.isdir(self.replay_dir) else 0)
+        log.info("Replaying %d recorded page(s) from '%s', latency %g±%g ms, missing pages: %s",
+                 count, self.replay_dir, self.latency_ms, self.jitter_ms, self.missing)
+
+
+# ─── Recording wrapper ───
+class RecordingBackend(OCRBackend):
+    """Passes calls through to `inner` and saves every text for ReplayBackend."""
+
+    def __init__(self, inner, record_dir):
+        self.inner = inner
+        self.name = inner.name
+        self.record_dir = record_dir
+        os.makedirs(record_dir, exist_ok=True)
+
+    def _write(self, path, data):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _record(self, content, text, layout=None):
+        key = content_key(content)
+        self._write(os.path.join(self.record_dir, f"{key}.txt"), text)
+        if layout is not None:
+            self._write(os.path.join(self.record_dir, f"{key}.layout.json"),
+                        json.dumps(layout.to_dict(), ensure_ascii=False, separators=(",", ":")))
+
+    def ocr(self, content, category=None):
+        text = self.inner.ocr(content, category)
+        self._record(content, text)
+        return text
+
+    def ocr_many(self, contents, category=None):
+        texts = self.inner.ocr_many(contents, category)
+        for content, text in zip(contents, texts):
+            self._record(content, text)
+        return texts
+
+    def ocr_layout(self, content, category=None):
+        text, layout = self.inner.ocr_layout(content, category)
+        self._record(content, text, layout)
+        return text, layout
+
+    def ocr_many_layout(self, contents, category=None):
+        results = self.inner.ocr_many_layout(contents, category)
+        for content, (text, layout) in zip(contents, results):
+            self._record(content, text, layout)
+        return results
+
+    def warm_up(self):
+        self.inner.warm_up()
+        log.info("Recording OCR texts to '%s'", self.record_dir)
+
+    def close(self):
+        self.inner.close()
+
+
+OCR_BACKENDS = {
+    "vision": VisionBackend,
+    "tesseract": TesseractBackend,
+    "replay": ReplayBackend,
+}
+
+
+def create_ocr_backend(name=OCR_BACKEND, record_dir=OCR_RECORD_DIR):
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend {name!r} (choose from {', '.join(OCR_BACKENDS)})")
+    backend = OCR_BACKENDS[name]()
+    return RecordingBackend(backend, record_dir) if record_dir else backend
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_ocr_backend():
+    """Process-wide backend, created on first use from OCR_BACKEND / OCR_RECORD_DIR."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_ocr_backend()
+    return _backend
+
+
+def set_ocr_backend(name, record_dir=OCR_RECORD_DIR):
+    """Replace the process-wide backend (main.py's --ocr-backend); returns it."""
+    global _backend
+    with _backend_lock:
+        _backend = create_ocr_backend(name, record_dir)
+    return _backend
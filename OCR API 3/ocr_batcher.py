@@ -0,0 +1,128 @@
+# ocr_batcher.py
+#
+# Micro-batching in front of Google Vision.
+#
+# Instead of one text_detection RPC per page, pages submitted from any thread
+# are collected for up to VISION_BATCH_MAX_WAIT seconds (or until
+# VISION_BATCH_SIZE pages / VISION_BATCH_MAX_BYTES are waiting) and sent as a
+# single batch_annotate_images call. Each caller gets back its own
+# AnnotateImageResponse through a Future.
+#
+# Configuration (environment variables):
+#   VISION_BATCH_SIZE       pages per batch request, Vision allows 16   (default 16)
+#   VISION_BATCH_MAX_WAIT   seconds to wait for a batch to fill         (default 0.05)
+#   VISION_BATCH_MAX_BYTES  image bytes per batch request               (default 10 MB)
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from vision_client import get_vision_pool, VISION_POOL_SIZE
+from metrics import STAGE_SECONDS
+
+VISION_BATCH_SIZE = min(16, int(os.environ.get("VISION_BATCH_SIZE", "16")))
+VISION_BATCH_MAX_WAIT = float(os.environ.get("VISION_BATCH_MAX_WAIT", "0.05"))
+VISION_BATCH_MAX_BYTES = int(os.environ.get("VISION_BATCH_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+class _Pending:
+    __slots__ = ("content", "future")
+
+    def __init__(self, content):
+        self.content = content
+        self.future = Future()
+
+
+class OCRBatcher:
+    def __init__(self, pool=None, max_batch=VISION_BATCH_SIZE, max_wait=VISION_BATCH_MAX_WAIT,
+                 max_bytes=VISION_BATCH_MAX_BYTES, senders=VISION_POOL_SIZE):
+        self._pool = pool
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue()
+        self._carry = None           # item that didn't fit in the previous batch
+        self._senders = ThreadPoolExecutor(max_workers=max(1, senders), thread_name_prefix="vision-batch")
+        self._thread = threading.Thread(target=self._collect_loop, name="vision-batcher", daemon=True)
+        self._thread.start()
+        self.stats = {"batches": 0, "pages": 0}
+
+    def submit(self, content: bytes) -> Future:
+        """Queue one page; the Future resolves to its AnnotateImageResponse."""
+        pending = _Pending(content)
+        self._queue.put(pending)
+        return pending.future
+
+    def annotate(self, content: bytes):
+        """Blocking helper: submit one page and wait for its response."""
+        return self.submit(content).result()
+
+    # ─── internals ───
+    def _next_batch(self):
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, size = [first], len(first.content)
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(item.content) > self.max_bytes:
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item.content)
+        return batch
+
+    def _collect_loop(self):
+        while True:
+            batch = self._next_batch()
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        from google.cloud import vision  # Import inside function
+
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=item.content),
+                features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
+            )
+            for item in batch
+        ]
+        try:
+            with (self._pool or get_vision_pool()).client() as client, STAGE_SECONDS.time(stage="ocr_rpc"):
+                response = client.batch_annotate_images(requests=requests)
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["pages"] += len(batch)
+        # Responses come back in request order
+        responses = list(response.responses)
+        for idx, item in enumerate(batch):
+            if idx < len(responses):
+                item.future.set_result(responses[idx])
+            else:
+                item.future.set_exception(RuntimeError("Vision batch returned too few responses"))
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_ocr_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = OCRBatcher()
+    return _batcher
@@ -0,0 +1,123 @@
+# ocr_cache.py
+#
+# Persistent, content-addressed cache of Vision responses.
+#
+# Users re-upload the same slips and invoices over and over; each page is
+# keyed by the SHA-256 of its image bytes as rendered/uploaded (before
+# preprocessing, so a hit skips that too) plus the preprocessing policy it
+# is sent with (preprocess.policy_key: a page OCR'd under another category's
+# crop/scale/quality is another entry), and the full AnnotateImageResponse
+# is stored in a local SQLite file. A hit skips the network entirely. The file is kept under OCR_CACHE_MAX_BYTES by evicting
+# least-recently-used entries. api.py and main.py may share the file, so the
+# stored size is always read from SQLite, never tracked in memory.
+#
+# Configuration (environment variables):
+#   OCR_CACHE_ENABLED     "0" to disable                   (default "1")
+#   OCR_CACHE_PATH        SQLite file                      (default "ocr_cache.sqlite3")
+#   OCR_CACHE_MAX_BYTES   total stored response size cap   (default 512 MB)
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") != "0"
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", "ocr_cache.sqlite3")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def content_key(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_key(content: bytes, policy: str) -> str:
+    return f"{content_key(content)}-{policy}"
+
+
+class OCRCache:
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS ocr_cache (
+                   key         TEXT PRIMARY KEY,
+                   response    BLOB NOT NULL,
+                   size        INTEGER NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_lru ON ocr_cache(last_access)")
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def get(self, key):
+        """Returns the stored response bytes, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, response_bytes):
+        size = len(response_bytes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # IMMEDIATE: another process using the file can't change the total between the sum and the eviction
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(response_bytes), size, time.time()),
+                )
+                self.stats["stores"] += 1
+                total = self._size_bytes()
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def size_bytes(self):
+        with self._lock:
+            return self._size_bytes()
+
+    def _size_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+
+    def _evict(self, total):
+        # Drop least-recently-used entries until we're back under 90% of the cap
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", doomed)
+        self.stats["evictions"] += len(doomed)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """Process-wide cache, or None when OCR_CACHE_ENABLED=0."""
+    global _cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OCRCache()
+    return _cache
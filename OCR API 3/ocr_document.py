@@ -0,0 +1,77 @@
+# ocr_document.py
+#
+# One page of OCR text, prepared once.
+#
+# Extractors used to call normalize_ascii on the same lines again and again
+# (per line, per pass, sometimes on the whole text). An OCRDocument is built
+# once per page with every view the extractors need; classify_category and
+# all extract_*_fields functions take one (they still accept a plain string
+# and wrap it themselves).
+
+import unicodedata
+from bisect import bisect_right
+from dataclasses import dataclass
+
+
+def normalize_ascii(text):
+    # Replace known OCR or non-ASCII issues first (before ASCII stripping)
+    replacements = {
+        'Το': 'To',   # Greek Tau + Omicron
+        'το': 'to',
+        ' T0': 'To',  # T-zero
+        ' t0': 'to',
+        ' Tо': 'To',  # Cyrillic o
+        ' tо': 'to',
+        'tο': 'to',   # mix of Latin t + Greek omicron
+        't o': 'to',
+    }
+
+    for wrong, right in replacements.items():
+        text = text.replace(wrong, right)
+
+    # Now normalize and strip accents
+    nfkd = unicodedata.normalize('NFKD', text)
+    only_ascii = nfkd.encode('ASCII', 'ignore').decode('utf-8')
+
+    return only_ascii.lower().strip()
+
+
+@dataclass(frozen=True)
+class OCRDocument:
+    text: str                 # raw OCR text
+    lines: tuple              # text.splitlines()
+    norm_lines: tuple         # normalize_ascii(line) for each line
+    lower_lines: tuple        # line.lower() for each line
+    lower_text: str           # text.lower()
+    norm_text: str            # "\n".join(norm_lines)
+    line_offsets: tuple       # offset in `text` where each line starts
+    layout: object = None     # WordLayout (word_layout.py) when the OCR engine reported word positions
+
+    @classmethod
+    def from_text(cls, text, layout=None):
+        lines = text.splitlines()
+        offsets, pos = [], 0
+        for raw in text.splitlines(keepends=True):
+            offsets.append(pos)
+            pos += len(raw)
+        norm_lines = tuple(normalize_ascii(line) for line in lines)
+        return cls(
+            text=text,
+            lines=tuple(lines),
+            norm_lines=norm_lines,
+            lower_lines=tuple(line.lower() for line in lines),
+            lower_text=text.lower(),
+            norm_text="\n".join(norm_lines),
+            line_offsets=tuple(offsets),
+            layout=layout,
+        )
+
+    def line_index(self, offset):
+        """Index of the line containing character `offset` of `text` (e.g. a regex match start)."""
+        return max(0, bisect_right(self.line_offsets, offset) - 1)
+
+
+def as_document(text_or_doc):
+    if isinstance(text_or_doc, OCRDocument):
+        return text_or_doc
+    return OCRDocument.from_text(text_or_doc)
@@ -1,68 +1,35 @@
-import io
-import re
-import unicodedata
-from PIL import Image
-
-def run_ocr(image_path):
-    from google.cloud import vision  # Import inside function
-    client = vision.ImageAnnotatorClient()  # Initialize here
-    with open(image_path, 'rb') as image_file:
-        content = image_file.read()
-    image = vision.Image(content=content)
-    response = client.text_detection(image=image)
-    return response.text_annotations[0].description if response.text_annotations else ""
-
-def classify_category(text):
-    text = text.lower()
-
-    # Strong pattern for E-Way Bill — multiple keywords must exist
-    if (
-        ("eway bill" in text or "e-way bill" in text) and
-        "generated date" in text and
-        "vehicle" in text and
-        "quantity" in text
-    ):
-        return "E Way Bill"
-
-    elif "delivery challan" in text or "dc no" in text:
-        return "Delivery Challan"
-    elif "lr copy" in text or "lorry receipt" in text or "consignment note" in text:
-        return "LR Copy"
-    elif (
-        "weighbridge" in text or 
-        "nett wt" in text or "gross wt" in text or "tare wt" in text or
-        "total net weight" in text or "mwb madarsa" in text or
-        ("net" in text and "weight" in text)
-    ):
-        return "Weighbridge"
-    elif "tax invoice" in text or "invoice no" in text:
-        return "Tax Invoice"
-
-    return "Unknown"
-
-
-def normalize_ascii(text):
-    # Replace known OCR or non-ASCII issues first (before ASCII stripping)
-    replacements = {
-        'Το': 'To',   # Greek Tau + Omicron
-        'το': 'to',
-        ' T0': 'To',  # T-zero
-        ' t0': 'to',
-        ' Tо': 'To',  # Cyrillic o
-        ' tо': 'to',
-        'tο': 'to',   # mix of Latin t + Greek omicron
-        't o': 'to',
-    }
-
-    for wrong, right in replacements.items():
-        text = text.replace(wrong, right)
-
-    # Now normalize and strip accents
-    nfkd = unicodedata.normalize('NFKD', text)
-    only_ascii = nfkd.encode('ASCII', 'ignore').decode('utf-8')
-
-    return only_ascii.lower().strip()
-
+import logging
+from ocr_document import as_document, normalize_ascii
+from ocr_backends import get_ocr_backend
+from patterns import PATTERNS
+from classifier import classify_category
+from log_config import SAMPLED
+
+log = logging.getLogger(__name__)
+
+def _image_content(image):
+    """`image` may be a file path, raw bytes/memoryview, or a PageBuffer."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if hasattr(image, "getvalue"):
+        return image.getvalue()
+    with open(image, 'rb') as image_file:
+        return image_file.read()
+
+def run_ocr(image, category=None):
+    # Vision, tesseract or replay: see ocr_backends.py
+    return get_ocr_backend().ocr(_image_content(image), category)
+
+def run_ocr_layout(image, category=None):
+    """(text, WordLayout or None): the page text plus its word positions, see word_layout.py."""
+    return get_ocr_backend().ocr_layout(_image_content(image), category)
+
+def run_ocr_many_layout(images, category=None):
+    return get_ocr_backend().ocr_many_layout([_image_content(image) for image in images], category)
+
+def run_ocr_many(images, category=None):
+    """OCR several pages at once (e.g. all pages of a PDF); returns texts in the same order."""
+    return get_ocr_backend().ocr_many([_image_content(image) for image in images], category)
 
 # def extract_consignment_no_near_header(lines):
 #     print("\n🔍 Debugging Consignment No Extraction")
@@ -98,16 +65,16 @@ def extract_consignment_no_using_date_proximity(lines):
     date_index = -1
     # Step 1: locate the line containing the Date
     for i, line in enumerate(lines):
-        if re.search(r"\bDATE[:\-]?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})", line):
+        if PATTERNS["date_line"].search(line):
             date_index = i
-            print(f"📆 Found date line at {i}: '{line.strip()}'")
+            log.debug("Found date line at %d: '%s'", i, line.strip(), extra=SAMPLED)
             break
 
     # Step 2: Look 5–6 lines above the date for a number that looks like LR No
     if date_index > 0:
         for j in range(date_index - 1, max(date_index - 10, -1), -1):
-            if re.match(r"^\s*[0-9]{3,6}\s*$", lines[j].strip()):
-                print(f"✅ Found consignment number at line {j}: '{lines[j].strip()}'")
+            if PATTERNS["consignment_number_line"].match(lines[j].strip()):
+                log.debug("Found consignment number at line %d: '%s'", j, lines[j].strip(), extra=SAMPLED)
                 return lines[j].strip()
 
     # print("❌ Consignment number not found near DATE block")
@@ -128,36 +95,49 @@ def extract_consignor_consignee_blocks(lines):
 
 
 
-def extract_states_from_blocks(lines):
+def extract_states_from_blocks(lines, norm_lines=None):
+    # Pass norm_lines (e.g. OCRDocument.norm_lines) to skip re-normalizing every line
     from_state, to_state = "Not found", "Not found"
+    if norm_lines is None:
+        norm_lines = [normalize_ascii(line) for line in lines]
 
     for i, line in enumerate(lines):
-        clean_line = normalize_ascii(line)
+        clean_line = norm_lines[i]
 
         # print(f"🔍 At line {i}, cleaned line: '{clean_line}'")  # Log every line for debugging
 
         if clean_line == "from" and i + 2 < len(lines):
             # print(f"📍 Found 'From' at line {i}: {line.strip()}")
             # print(f"   Checking line {i+2} for state: {lines[i+2].strip()}")
-            match = re.search(r"\(([^)]+)\)", lines[i + 2])
+            match = PATTERNS["parenthesized"].search(lines[i + 2])
             if match:
                 from_state = match.group(1).strip()
 
-        elif re.fullmatch(r"to", clean_line.strip()) and i + 2 < len(lines):
+        elif PATTERNS["to_label"].fullmatch(clean_line.strip()) and i + 2 < len(lines):
             # print(f"📍 Found 'To' at line {i}: {line.strip()}")
             # print(f"   Checking line {i+2} for state: {lines[i+2].strip()}")
-            match = re.search(r"\(([^)]+)\)", lines[i + 2])
+            match = PATTERNS["parenthesized"].search(lines[i + 2])
             if match:
                 to_state = match.group(1).strip()
 
 
     return from_state, to_state
 
+
+def extract_states_from_layout(layout):
+    # extract_states_from_blocks by position: the "(State)" in the block under a
+    # standalone "From" / "To" heading, normalized like the LR copy's lines
+    states = []
+    for label in ("from", "to"):
+        match = PATTERNS["parenthesized"].search(layout.text_below(label, rows=3, alone=True))
+        states.append(normalize_ascii(match.group(1)) if match else "Not found")
+    return tuple(states)
+
 def debug_print_lines(text, label="Debugging OCR Lines"):
-    print(f"\n🔍 {label}")
-    lines = text.splitlines()
-    for i, line in enumerate(lines):
-        print(f"Line {i}: '{line.strip()}'")
+    # One record for the whole page, so the lines stay together in the log
+    if log.isEnabledFor(logging.DEBUG):
+        numbered = "\n".join(f"Line {i}: '{line.strip()}'" for i, line in enumerate(text.splitlines()))
+        log.debug("%s\n%s", label, numbered)
 
 
 
@@ -171,15 +151,16 @@ def debug_print_lines(text, label="Debugging OCR Lines"):
 #     return "Not found"
 
 def extract_material_name_from_lines(text):
-    lines = text.splitlines()
+    doc = as_document(text)
+    lines = doc.lines
     material = "Not found"
     material_keywords = ["plastic", "scrap", "bottle", "waste", "granule", "flake", "fiber", "film"]
 
     for i, line in enumerate(lines):
-        clean = line.strip().lower()
+        clean = doc.lower_lines[i].strip()
         
         # Case 1: "1 Material Name" pattern
-        match = re.match(r"^\d+\s+([A-Z\s\-]+)$", line.strip(), re.IGNORECASE)
+        match = PATTERNS["numbered_item"].match(line.strip())
         if match:
             possible = match.group(1).strip().title()
             if any(k in possible.lower() for k in material_keywords):
@@ -188,7 +169,7 @@ def extract_material_name_from_lines(text):
         # Case 2: after 'Description of Goods'
         if "description of goods" in clean and i+1 < len(lines):
             next_line = lines[i+1].strip()
-            if re.match(r"^\d+\s+[A-Z\s\-]+$", next_line, re.IGNORECASE):
+            if PATTERNS["numbered_item"].match(next_line):
                 possible = " ".join(next_line.split()[1:]).strip().title()
                 if any(k in possible.lower() for k in material_keywords):
                     return possible
@@ -200,9 +181,10 @@ def extract_material_name_from_lines(text):
     return material
 
 def extract_quantity_from_lines(text):
-    lines = text.splitlines()
+    doc = as_document(text)
+    lines = doc.lines
     quantity = "Not found"
-    pattern = re.compile(r"(\d{1,3}(?:,\d{3})*(?:\.\d{1,3})?)\s*(KGS|KG|MT|TONS?)", re.IGNORECASE)
+    pattern = PATTERNS["quantity_with_unit"]
 
     candidates = []
 
@@ -218,7 +200,7 @@ def extract_quantity_from_lines(text):
                     continue
 
         # Also check 2 lines after material (if we detect 'Description of Goods')
-        if "description of goods" in line.lower() and i + 2 < len(lines):
+        if "description of goods" in doc.lower_lines[i] and i + 2 < len(lines):
             for offset in range(1, 3):
                 nearby = lines[i + offset]
                 matches = pattern.findall(nearby)
@@ -239,23 +221,24 @@ def extract_quantity_from_lines(text):
 
 
 def extract_invoice_number_from_lines(text):
-    lines = text.splitlines()
+    doc = as_document(text)
+    lines = doc.norm_lines   # every step below works on normalized lines
     invoice_number = "Not found"
 
-    invoice_format = re.compile(r"\b[A-Z]{1,3}[-/]?\d{2,6}(?:[-/]\d{2,4})?\b", re.IGNORECASE)
-    simple_number = re.compile(r"\b\d{3,6}\b")
+    invoice_format = PATTERNS["invoice_number"]
+    simple_number = PATTERNS["short_number"]
 
     def looks_like_date(s):
-        return re.search(r"\b(?:\d{1,2}[/-])?(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[/-]?\d{2,4}\b", s, re.IGNORECASE)
+        return PATTERNS["month_name_date"].search(s)
 
     def is_noise(s):
         return any(x in s.lower() for x in ["eway", "gst", "phone", "dated", "bill no", "invoice date", "authorised", "sign", "amount"])
 
     # STEP 1: Look near "Invoice No."
     for i, line in enumerate(lines):
-        if "invoice no" in normalize_ascii(line):
+        if "invoice no" in line:
             for j in range(i + 1, min(i + 4, len(lines))):
-                target = normalize_ascii(lines[j])
+                target = lines[j]
                 if looks_like_date(target) or is_noise(target):
                     continue
                 if invoice_format.search(target):
@@ -265,15 +248,14 @@ def extract_invoice_number_from_lines(text):
 
     # STEP 2: Check 'Dispatch Doc No.', 'Reference No.' as fallbacks
     for i, line in enumerate(lines):
-        if "dispatch doc no" in normalize_ascii(line) or "reference no" in normalize_ascii(line):
+        if "dispatch doc no" in line or "reference no" in line:
             for j in range(i + 1, min(i + 3, len(lines))):
-                val = normalize_ascii(lines[j]).strip()
+                val = lines[j].strip()
                 if simple_number.fullmatch(val) and not looks_like_date(val) and not is_noise(val):
                     return val
 
     # STEP 3: Full scan fallback
-    for line in lines:
-        norm = normalize_ascii(line)
+    for norm in lines:
         if is_noise(norm) or looks_like_date(norm):
             continue
         match = invoice_format.search(norm)
@@ -0,0 +1,96 @@
+# page_buffer.py
+#
+# In-memory page images.
+#
+# Rendered PDF pages used to be written to temp_pages/ as JPEGs, read back by
+# run_ocr and then deleted. A PageBuffer keeps the encoded page in memory
+# instead and hands the bytes straight to the OCR client. Only when the
+# process-wide PAGE_MEMORY_BUDGET is exhausted does a page spill to disk.
+#
+# Configuration (environment variables):
+#   PAGE_MEMORY_BUDGET   bytes of page images held in memory   (default 256 MB)
+#   PAGE_SPILL_DIR       where over-budget pages are written    (default "temp_pages")
+
+import io
+import os
+import uuid
+import threading
+
+PAGE_MEMORY_BUDGET = int(os.environ.get("PAGE_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+PAGE_SPILL_DIR = os.environ.get("PAGE_SPILL_DIR", "temp_pages")
+
+_budget_lock = threading.Lock()
+_memory_used = 0
+
+
+def memory_used():
+    return _memory_used
+
+
+def _reserve(size):
+    global _memory_used
+    with _budget_lock:
+        if _memory_used + size > PAGE_MEMORY_BUDGET:
+            return False
+        _memory_used += size
+        return True
+
+
+def _unreserve(size):
+    global _memory_used
+    with _budget_lock:
+        _memory_used -= size
+
+
+class PageBuffer:
+    """Encoded image bytes for one page, in memory or (over budget) in a spill file."""
+
+    __slots__ = ("name", "size", "_data", "_path")
+
+    def __init__(self, data: bytes, name: str = "page.jpg"):
+        self.name = name
+        self.size = len(data)
+        self._data = None
+        self._path = None
+        if _reserve(self.size):
+            self._data = data
+        else:
+            os.makedirs(PAGE_SPILL_DIR, exist_ok=True)
+            self._path = os.path.join(PAGE_SPILL_DIR, f"{uuid.uuid4()}_{name}")
+            with open(self._path, "wb") as f:
+                f.write(data)
+
+    @classmethod
+    def from_image(cls, pil_image, name="page.jpg", quality=90):
+        """Encode a PIL image (e.g. a rendered PDF page) once, in memory."""
+        out = io.BytesIO()
+        pil_image.save(out, "JPEG", quality=quality)
+        return cls(out.getvalue(), name)
+
+    def __repr__(self):
+        where = "memory" if self._data is not None else self._path
+        return f"PageBuffer({self.name!r}, {self.size} bytes, {where})"
+
+    @property
+    def in_memory(self):
+        return self._data is not None
+
+    def getvalue(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        if self._path is None:
+            raise ValueError(f"PageBuffer '{self.name}' was already released")
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    def release(self):
+        """Free the memory (or delete the spill file). Safe to call twice."""
+        if self._data is not None:
+            self._data = None
+            _unreserve(self.size)
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
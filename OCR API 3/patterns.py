@@ -0,0 +1,143 @@
+# patterns.py
+#
+# Compiled, named regular expressions shared by every extractor.
+#
+# Extractors used to pass raw pattern strings to re.search/re.findall inside
+# their loops and rebuild the same vehicle/date patterns on every call. All
+# patterns now live here, compiled once:
+#
+#   from patterns import PATTERNS, find
+#   PATTERNS["vehicle_number"].search(text)
+#   find("invoice_date", text)        # first non-empty group, or "Not found"
+#
+# To see which patterns dominate extraction, set PATTERN_STATS_ENABLED=1:
+# every call is then counted and timed into ocr_pattern_{calls,hits,seconds}_total
+# {pattern} on /metrics (recorded in the extract pool and replayed by api.py
+# like the other extract metrics, see metrics.py). Off by default, since it
+# adds two clock reads and a counter update to every regex call.
+#
+# Configuration (environment variables):
+#   PATTERN_STATS_ENABLED   "1" to count and time every call   (default "0")
+
+import os
+import re
+import time
+
+from metrics import PATTERN_CALLS, PATTERN_HITS, PATTERN_SECONDS
+
+PATTERN_STATS_ENABLED = os.environ.get("PATTERN_STATS_ENABLED", "0") == "1"
+
+
+class NamedPattern:
+    """A compiled pattern with a name for the stats. Mirrors the re.Pattern methods we use."""
+
+    __slots__ = ("name", "regex")
+
+    def __init__(self, name, pattern, flags=0):
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+
+    def _run(self, method, *args):
+        if not PATTERN_STATS_ENABLED:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        PATTERN_SECONDS.inc(time.perf_counter() - started, pattern=self.name)
+        PATTERN_CALLS.inc(pattern=self.name)
+        if result:
+            PATTERN_HITS.inc(pattern=self.name)
+        return result
+
+    def search(self, string):
+        return self._run(self.regex.search, string)
+
+    def match(self, string):
+        return self._run(self.regex.match, string)
+
+    def fullmatch(self, string):
+        return self._run(self.regex.fullmatch, string)
+
+    def findall(self, string):
+        return self._run(self.regex.findall, string)
+
+    def sub(self, repl, string):
+        return self._run(self.regex.sub, repl, string)
+
+    def __repr__(self):
+        return f"NamedPattern({self.name!r}, {self.regex.pattern!r})"
+
+
+PATTERNS = {}
+
+
+def register(name, pattern, flags=0):
+    if name in PATTERNS:
+        raise ValueError(f"Pattern '{name}' is already registered")
+    PATTERNS[name] = NamedPattern(name, pattern, flags)
+    return PATTERNS[name]
+
+
+def find(name, text):
+    """Search `text` with a registered pattern; first non-empty group, stripped, or "Not found"."""
+    match = PATTERNS[name].search(text)
+    if not match:
+        return "Not found"
+    for g in match.groups():
+        if g:
+            return g.strip()
+    return "Not found"
+
+
+# ─── Building blocks ───
+MONTHS = r"(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)"
+DATE_NUMERIC = r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}"
+# Numeric date or "12-JAN-2024" style; two capture groups (+ the month) for find()
+DATE_ANY = r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})|(\d{1,2}[\s\-]?(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[\s\-]?\d{2,4})"
+_I = re.IGNORECASE
+
+# ─── Vehicle numbers ───
+register("vehicle_number", r"([A-Z]{2}\d{2}[A-Z]{1,3}\s?\d{3,4})", _I)
+register("vehicle_number_bounded", r"\b([A-Z]{2}\d{2}[A-Z]{1,3}\s?\d{3,4})\b", _I)
+register("vehicle_number_compact", r"\b([A-Z]{2}\d{2}[A-Z]{1,3}\d{3,4})\b")        # e.g. DD01E9074
+register("vehicle_number_loose", r"\b[A-Z]{2}\d{2,3}[A-Z]?\s?\d{3,4}\b")           # e.g. WB738 6961
+register("vehicle_number_loose_anywhere", r"[A-Z]{2}\d{2,3}[A-Z]?\s?\d{3,4}")
+
+# ─── Dates ───
+register("date_after_date_label", r"DATE[:\-]?\s*" + DATE_ANY, _I)
+register("date_after_dated_label", r"(?:Dated:|Date:)[:\-]?\s*" + DATE_ANY, _I)
+register("invoice_date", r"(?:INVOICE\s*DATE|DATED)[:\-]?\s*" + DATE_ANY, _I)
+register("date_line", r"\bDATE[:\-]?\s*(" + DATE_NUMERIC + r")")
+register("generated_date", r"Generated\s+Date[:\-]?\s*(" + DATE_NUMERIC + r")", _I)
+register("valid_upto", r"Valid\s+Upto[:\-]?\s*(" + DATE_NUMERIC + r")", _I)
+register("weighbridge_date", r"\b(?:\d{2}/\d{2}/\d{2,4}|\d{4}-\d{2}-\d{2})\b")     # DD/MM/YY(YY) or YYYY-MM-DD
+register("month_name_date", r"\b(?:\d{1,2}[/-])?" + MONTHS + r"[/-]?\d{2,4}\b", _I)
+
+# ─── Quantities ───
+register("quantity_with_unit", r"(\d{1,3}(?:,\d{3})*(?:\.\d{1,3})?)\s*(KGS|KG|MT|TONS?)", _I)
+register("weight_unit", r"\b(KGS|KG|MT|TONS?)\b", _I)
+register("decimal_quantity", r"\b(\d{1,3}\.\d{1,3})\b")                            # 10.500
+register("grouped_decimal_quantity", r"\b(\d{1,3}(?:,\d{3})*(?:\.\d{1,3}))\b")    # 1,234.500
+register("quantity_value", r"\b\d{3,6}(?:\.\d+)?\b")
+register("weight_digits", r"\d{4,6}")
+register("weight_value", r"\b\d{4,6}(?:\.\d{1,2})?\b")
+
+# ─── Document numbers ───
+register("eway_bill_number", r"\b\d{10,15}\b")
+register("challan_number", r"(?:DC\s*No.|Challan\s*No\.?)[:\-]?\s*([A-Z0-9\-\/]+)", _I)
+register("invoice_number", r"\b[A-Z]{1,3}[-/]?\d{2,6}(?:[-/]\d{2,4})?\b", _I)
+register("short_number", r"\b\d{3,6}\b")
+register("consignment_number_line", r"^\s*[0-9]{3,6}\s*$")
+
+# ─── Blocks and labels ───
+register("consignee_details", r"CONSIGNEEDETAILS\s*([\s\S]{10,200}?)\n[A-Z\s]{5,}")
+register("consignor_details", r"CONSIGNORDETAILS\s*([\s\S]{10,200}?)\n[A-Z\s]{5,}")
+register("place_of_dispatch", r"Place of Dispatch[:\-]?\s*\n?([A-Za-z\s]+)\n?\(([A-Za-z\s]+)\)")
+register("place_of_delivery", r"Place of Delivery[:\-]?\s*\n?([A-Za-z\s]+)\n?\(([A-Za-z\s]+)\)")
+register("challan_item_table", r"SR[\s\n]+NO[\s\S]{20,800}?(?:TOTAL|SPECIAL INSTRUCTIONS)", _I)
+register("lr_item_table", r"PLASTIC SCRAP[\s\S]{0,300}?(?:TOTAL|VALUE|LR TYPE)", _I)
+register("eway_product_name", r"Product\s+Name\s+&\s+Desc[^\n]*\n\s*([A-Z\s&]+)", _I)
+register("parenthesized", r"\(([^)]+)\)")
+register("to_label", r"to")
+register("numbered_item", r"^\d+\s+([A-Z\s\-]+)$", _I)                               # "1 PLASTIC SCRAP"
+register("non_text_line", r"^[\d\W\s]+$")
+register("multi_space", r"\s{2,}")
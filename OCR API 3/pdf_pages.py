@@ -0,0 +1,102 @@
+# pdf_pages.py
+#
+# Streaming PDF rasterization.
+#
+# convert_from_path(path, dpi=300) renders the whole document into memory
+# before returning; a 40-page scan is gigabytes of PIL images and a long wait
+# before the first page can be OCR'd. These iterators render one page at a
+# time and stay at most PDF_RENDER_LOOKAHEAD pages ahead of the consumer, so
+# peak memory follows the look-ahead, not the document length.
+#
+# Configuration (environment variables):
+#   PDF_RENDER_DPI         render resolution             (default 300)
+#   PDF_RENDER_LOOKAHEAD   pages rendered ahead of use   (default 2)
+
+import os
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from metrics import STAGE_SECONDS
+
+PDF_RENDER_DPI = int(os.environ.get("PDF_RENDER_DPI", "300"))
+PDF_RENDER_LOOKAHEAD = max(1, int(os.environ.get("PDF_RENDER_LOOKAHEAD", "2")))
+
+
+def pdf_page_count(pdf_path):
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def render_page(pdf_path, page_number, dpi=PDF_RENDER_DPI):
+    """Rasterize a single page (1-based) to a PIL image."""
+    with STAGE_SECONDS.time(stage="pdf_render"):
+        return convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)[0]
+
+
+def iter_pdf_pages(pdf_path, page_numbers=None, dpi=PDF_RENDER_DPI, lookahead=PDF_RENDER_LOOKAHEAD):
+    """
+    Yields (page_number, PIL image) in page order. `page_numbers` limits
+    rendering to those pages (e.g. only the scanned ones); None means all.
+    Up to `lookahead` pages are rendered in the background while the caller
+    works on the current one.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, pdf_page_count(pdf_path) + 1)
+    numbers = iter(page_numbers)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=lookahead, thread_name_prefix="pdf-render") as pool:
+        def schedule():
+            n = next(numbers, None)
+            if n is not None:
+                pending.append((n, pool.submit(render_page, pdf_path, n, dpi)))
+
+        for _ in range(lookahead):
+            schedule()
+        while pending:
+            n, future = pending.popleft()
+            image = future.result()
+            schedule()
+            yield n, image
+
+
+async def aiter_pdf_pages(pdf_path, page_numbers=None, dpi=PDF_RENDER_DPI, lookahead=PDF_RENDER_LOOKAHEAD):
+    """
+    Async version of iter_pdf_pages for api.py; rendering runs in the default
+    executor. When the consumer stops early (or is cancelled), look-ahead
+    renders that haven't started are skipped and running ones are waited
+    for and their pages closed, so no render outlives the iterator.
+    """
+    loop = asyncio.get_running_loop()
+    if page_numbers is None:
+        page_numbers = range(1, await loop.run_in_executor(None, pdf_page_count, pdf_path) + 1)
+    numbers = iter(page_numbers)
+    pending = deque()
+    stopped = threading.Event()
+
+    def render(n):
+        # Cancelling an executor future can't stop it once it is queued behind
+        # other work and then picked up, so the flag is checked here instead
+        return None if stopped.is_set() else render_page(pdf_path, n, dpi)
+
+    def schedule():
+        n = next(numbers, None)
+        if n is not None:
+            pending.append((n, loop.run_in_executor(None, render, n)))
+
+    for _ in range(lookahead):
+        schedule()
+    try:
+        while pending:
+            n, future = pending.popleft()
+            image = await future
+            schedule()
+            yield n, image
+    finally:
+        stopped.set()
+        for page in await asyncio.gather(*(future for _, future in pending), return_exceptions=True):
+            if page is not None and not isinstance(page, BaseException):
+                page.close()
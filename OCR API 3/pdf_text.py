@@ -0,0 +1,90 @@
+# pdf_text.py
+#
+# Pre-OCR stage for PDFs: read the embedded text layer (poppler's pdftotext,
+# which ships alongside the pdftoppm that pdf2image already needs) and decide
+# page by page whether it is good enough to skip rasterization + Vision.
+#
+# Machine-generated e-way bills and tax invoices carry a perfect text layer;
+# scans have none (or a few stray characters), so only those get OCR'd.
+#
+# Configuration (environment variables):
+#   PDF_TEXT_MIN_CHARS   non-whitespace characters a page needs   (default 80)
+#   PDF_TEXT_MIN_SCORE   completeness score a page needs, 0..1    (default 0.6)
+
+import os
+import re
+import shutil
+import subprocess
+
+from metrics import STAGE_SECONDS
+
+PDF_TEXT_MIN_CHARS = int(os.environ.get("PDF_TEXT_MIN_CHARS", "80"))
+PDF_TEXT_MIN_SCORE = float(os.environ.get("PDF_TEXT_MIN_SCORE", "0.6"))
+
+_WORD = re.compile(r"[A-Za-z0-9]{2,}")
+_CLEAN_CHAR = re.compile(r"[A-Za-z0-9.,:;/\-()&%#@'\"+]")
+
+
+def extract_pdf_text_pages(pdf_path, timeout=60):
+    """
+    Text layer of every page, in page order, or None when pdftotext isn't
+    available or fails (callers then OCR every page as before).
+    """
+    pdftotext = shutil.which("pdftotext")
+    if pdftotext is None:
+        return None
+    try:
+        proc = subprocess.run(
+            [pdftotext, "-enc", "UTF-8", pdf_path, "-"],
+            capture_output=True, timeout=timeout, check=True,
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+    # pdftotext ends every page with a form feed
+    pages = proc.stdout.decode("utf-8", errors="replace").split("\f")
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+
+def score_text_layer(text):
+    """
+    0..1 estimate of how complete/clean a page's text layer is: share of
+    non-whitespace characters that look like normal document text, averaged
+    with the share of tokens that look like words or numbers. Scanner-added
+    garbage layers and near-empty pages score low.
+    """
+    chars = "".join(text.split())
+    if len(chars) < PDF_TEXT_MIN_CHARS:
+        return 0.0
+    clean_ratio = len(_CLEAN_CHAR.findall(chars)) / len(chars)
+    tokens = text.split()
+    word_ratio = sum(1 for t in tokens if _WORD.search(t)) / len(tokens)
+    return round((clean_ratio + word_ratio) / 2, 3)
+
+
+def is_text_layer_usable(text):
+    return score_text_layer(text) >= PDF_TEXT_MIN_SCORE
+
+
+def split_pdf_pages(pdf_path):
+    """
+    Returns (text_pages, scanned_pages):
+      - text_pages: {page_number: text} for pages whose text layer is usable
+      - scanned_pages: {page_number: weak_text} for pages (1-based, in order)
+        that still need OCR — the weak text is often still enough to guess
+        the category — or None if the text layer couldn't be read at all
+    """
+    with STAGE_SECONDS.time(stage="pdf_split"):
+        pages = extract_pdf_text_pages(pdf_path)
+    if pages is None:
+        return {}, None
+
+    text_pages, scanned_pages = {}, {}
+    for page_number, text in enumerate(pages, start=1):
+        if is_text_layer_usable(text):
+            text_pages[page_number] = text
+        else:
+            scanned_pages[page_number] = text
+    return text_pages, scanned_pages
@@ -0,0 +1,79 @@
+# pipeline.py
+#
+# Bounded stages for api.py's upload pipeline:
+#
+#   receive ──▶ rasterize ──▶ OCR ──▶ extract ──▶ emit
+#   request     Stage         FairScheduler workers (process_image_job)
+#   handler
+#
+# /extractText used to parse the whole form, save every file and render every
+# PDF before it returned, so the first result of a big folder arrived minutes
+# after the upload started. Now the request handler only receives: each file
+# is handed to the rasterize stage as soon as its part has been read (see
+# form_stream.py), and each rendered page to the scheduler as soon as it is
+# rendered, so OCR of the first pages overlaps the rest of the upload.
+#
+# Every hand-off is bounded. When RASTER_QUEUE_SIZE files are waiting to be
+# split, the request handler stops reading the body (TCP pushes back on the
+# client); when MAX_QUEUED_PAGES rendered pages are waiting for OCR,
+# rasterizing pauses. Memory follows the bounds, not the batch size.
+#
+# Configuration (environment variables):
+#   RASTER_WORKERS      files split/rendered concurrently             (default 2)
+#   RASTER_QUEUE_SIZE   received files waiting to be rasterized       (default 16)
+#   MAX_QUEUED_PAGES    rendered pages waiting for OCR before pausing (default 64)
+
+import os
+import asyncio
+import logging
+
+RASTER_WORKERS = int(os.environ.get("RASTER_WORKERS", "2"))
+RASTER_QUEUE_SIZE = int(os.environ.get("RASTER_QUEUE_SIZE", "16"))
+MAX_QUEUED_PAGES = int(os.environ.get("MAX_QUEUED_PAGES", "64"))
+
+log = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    A bounded queue drained by `workers` tasks running `handler(item)`.
+    put() waits while the queue is full.
+    """
+
+    def __init__(self, name, handler, workers, maxsize):
+        self.name = name
+        self._handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item):
+        await self._queue.put(item)
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self, worker_id):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("%s worker %d raised %r", self.name, worker_id, e)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,161 @@
+# preprocess.py
+#
+# Shrinks page images before they are uploaded to Vision.
+#
+# 300 DPI colour renders and raw phone photos are often several MB, and on
+# slow uplinks the upload dominates per-page latency. Each page is:
+#   1. converted to grayscale,
+#   2. cropped to the inked area (empty margins removed),
+#   3. downsampled so a typical text line is about `target_text_height` px
+#      (never upscaled),
+#   4. re-encoded as JPEG at the policy's quality.
+# If the result is not smaller than the input, the original bytes are sent.
+#
+# Policies are per document category (run before OCR, so the category is only
+# a hint, e.g. from a weak PDF text layer); unknown categories use "default".
+#
+# Configuration (environment variables):
+#   PREPROCESS_ENABLED   "0" to send pages unchanged   (default "1")
+
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+from statistics import median
+
+from PIL import Image, ImageOps
+
+from metrics import (STAGE_SECONDS, PREPROCESS_PAGES, PREPROCESS_BYTES_IN, PREPROCESS_BYTES_OUT,
+                     PREPROCESS_BYTES_SAVED)
+
+PREPROCESS_ENABLED = os.environ.get("PREPROCESS_ENABLED", "1") != "0"
+
+PREPROCESS_POLICIES = {
+    "default": {
+        "grayscale": True,
+        "crop_margins": True,
+        "target_text_height": 28,   # px per text line after resizing
+        "min_scale": 0.35,          # never shrink more than this in one go
+        "jpeg_quality": 80,
+    },
+    # Thermal weighbridge slips are faint and low-contrast: keep more pixels
+    "Weighbridge": {
+        "grayscale": True,
+        "crop_margins": True,
+        "target_text_height": 34,
+        "min_scale": 0.5,
+        "jpeg_quality": 88,
+    },
+    # Dense but cleanly printed forms
+    "E Way Bill": {
+        "grayscale": True,
+        "crop_margins": True,
+        "target_text_height": 24,
+        "min_scale": 0.35,
+        "jpeg_quality": 75,
+    },
+}
+
+INK_THRESHOLD = 160        # grayscale values below this count as ink
+ANALYSIS_WIDTH = 1000      # text height is estimated on a thumbnail this wide
+MARGIN_PAD = 0.01          # keep 1% of the page around the inked area
+
+log = logging.getLogger(__name__)
+
+
+def get_policy(category=None):
+    return PREPROCESS_POLICIES.get(category) or PREPROCESS_POLICIES["default"]
+
+
+def policy_key(category=None):
+    """Short ID of what preprocess_page does to a page of this category, for cache keys."""
+    if not PREPROCESS_ENABLED:
+        return "raw"
+    spec = json.dumps(get_policy(category), sort_keys=True)
+    return hashlib.sha256(spec.encode()).hexdigest()[:12]
+
+
+def _ink_mask(gray):
+    return gray.point(lambda v: 255 if v < INK_THRESHOLD else 0)
+
+
+def estimate_text_height(gray):
+    """
+    Median height in px of text lines, from the horizontal ink profile of a
+    thumbnail (rows with ink form runs; each run is roughly one text line).
+    Returns None when no text-like rows are found.
+    """
+    scale = min(1.0, ANALYSIS_WIDTH / gray.width)
+    thumb = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))))
+    # Squash every row to a single pixel: its value is that row's ink fraction
+    profile = list(_ink_mask(thumb).resize((1, thumb.height), Image.BOX).getdata())
+
+    runs, run = [], 0
+    for value in profile:
+        if value > 3:          # > ~1% of the row is ink
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+
+    runs = [r for r in runs if r >= 2]
+    if not runs:
+        return None
+    return median(runs) / scale
+
+
+def preprocess_image(image, category=None):
+    """Applies the category's policy to a PIL image; returns a new PIL image."""
+    policy = get_policy(category)
+    image = ImageOps.exif_transpose(image)
+
+    if policy["grayscale"] and image.mode != "L":
+        image = image.convert("L")
+    gray = image if image.mode == "L" else image.convert("L")
+
+    if policy["crop_margins"]:
+        bbox = _ink_mask(gray).getbbox()
+        if bbox:
+            pad_x, pad_y = int(image.width * MARGIN_PAD), int(image.height * MARGIN_PAD)
+            bbox = (max(0, bbox[0] - pad_x), max(0, bbox[1] - pad_y),
+                    min(image.width, bbox[2] + pad_x), min(image.height, bbox[3] + pad_y))
+            image, gray = image.crop(bbox), gray.crop(bbox)
+
+    text_height = estimate_text_height(gray)
+    if text_height:
+        scale = max(policy["min_scale"], policy["target_text_height"] / text_height)
+        if scale < 1.0:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+    return image
+
+
+def preprocess_page(content: bytes, category=None) -> bytes:
+    """Encoded page in, smaller encoded page out (or the input, if we couldn't shrink it)."""
+    if not PREPROCESS_ENABLED:
+        return content
+
+    started = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            processed = preprocess_image(image, category)
+            out = io.BytesIO()
+            processed.save(out, "JPEG", quality=get_policy(category)["jpeg_quality"], optimize=True)
+        result = out.getvalue()
+    except Exception as e:
+        log.warning("Skipping page (%s), sending original", e)
+        result = content
+
+    skipped = len(result) >= len(content)
+    if skipped:
+        result = content
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="preprocess")
+    PREPROCESS_PAGES.inc(result="skipped" if skipped else "shrunk")
+    PREPROCESS_BYTES_IN.inc(len(content))
+    PREPROCESS_BYTES_OUT.inc(len(result))
+    PREPROCESS_BYTES_SAVED.inc(len(content) - len(result))
+    return result
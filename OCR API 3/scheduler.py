@@ -0,0 +1,181 @@
+# scheduler.py
+#
+# Shared job scheduler for api.py.
+#
+# Replaces the old "one serial queue per socket" model: every client's jobs
+# go into one scheduler that runs N workers concurrently, hands out jobs
+# round-robin between clients (optionally weighted), caps how many jobs a
+# single client may have in flight, and caps total in-flight jobs so we stay
+# inside our Vision quota.
+#
+# The owner of a job is the client that uploaded it, not its batch: a client
+# running five uploads at once still gets one turn and one cap (api.py keeps
+# the owner with the batch, see job_store.py).
+#
+# Configuration (environment variables):
+#   SCHEDULER_WORKERS       concurrent worker tasks             (default 8)
+#   PER_USER_MAX_INFLIGHT   max in-flight jobs per client        (default 4)
+#   VISION_MAX_INFLIGHT     max in-flight jobs overall (quota)   (default 8)
+#   SCHEDULER_WEIGHTS       "owner=weight,..." turns per round   (default every owner 1)
+
+import os
+import asyncio
+import logging
+from collections import deque, defaultdict
+
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "8"))
+PER_USER_MAX_INFLIGHT = int(os.environ.get("PER_USER_MAX_INFLIGHT", "4"))
+VISION_MAX_INFLIGHT = int(os.environ.get("VISION_MAX_INFLIGHT", "8"))
+SCHEDULER_WEIGHTS = os.environ.get("SCHEDULER_WEIGHTS", "")
+
+log = logging.getLogger(__name__)
+
+
+def parse_weights(spec):
+    """SCHEDULER_WEIGHTS: 'clientA=3,clientB=2' → {"clientA": 3, "clientB": 2}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        owner, sep, weight = item.rpartition("=")
+        if not sep or not owner.strip() or not weight.strip().isdigit():
+            raise ValueError(f"SCHEDULER_WEIGHTS: expected owner=weight, got '{item}'")
+        weights[owner.strip()] = max(1, int(weight))
+    return weights
+
+
+class FairScheduler:
+    """
+    Weighted round-robin scheduler over per-owner FIFO queues.
+
+    `handler` is an async callable `handler(owner, job)`; an owner is any
+    hashable key (the client id of the batch in api.py). An owner with
+    weight w (from `weights` or set_weight) gets up to w consecutive jobs
+    each time its turn comes round.
+    """
+
+    def __init__(self, handler, workers=SCHEDULER_WORKERS, per_user_limit=PER_USER_MAX_INFLIGHT,
+                 max_inflight=VISION_MAX_INFLIGHT, weights=None):
+        self._handler = handler
+        self.workers = max(1, workers)
+        self.per_user_limit = max(1, per_user_limit)
+        self.max_inflight = max(1, max_inflight)
+
+        self._queues = {}                    # owner -> deque of pending jobs
+        self._rotation = deque()             # owners with pending jobs, in turn order
+        self._credits = defaultdict(int)     # jobs taken in the owner's current turn
+        self._weights = dict(parse_weights(SCHEDULER_WEIGHTS) if weights is None else weights)
+        self._inflight = defaultdict(int)
+        self._inflight_total = 0
+
+        lock = asyncio.Lock()
+        self._cond = asyncio.Condition(lock)
+        self._room = asyncio.Condition(lock)   # signalled when pending jobs are handed out
+        self._tasks = []
+
+    # ─── public API ───
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, owner, job):
+        async with self._cond:
+            queue = self._queues.get(owner)
+            if queue is None:
+                queue = self._queues[owner] = deque()
+            if not queue:
+                self._rotation.append(owner)
+            queue.append(job)
+            self._cond.notify()
+
+    async def drop(self, owner):
+        """Forget an owner; returns the jobs that had not started yet."""
+        async with self._cond:
+            pending = list(self._queues.pop(owner, ()))
+            if owner in self._rotation:
+                self._rotation.remove(owner)
+            self._credits.pop(owner, None)
+            self._room.notify_all()
+            return pending
+
+    async def wait_for_room(self, limit):
+        """Wait until fewer than `limit` jobs are pending (back-pressure for producers)."""
+        async with self._room:
+            while self.pending() >= limit:
+                await self._room.wait()
+
+    def set_weight(self, owner, weight):
+        self._weights[owner] = max(1, int(weight))
+
+    def pending(self, owner=None):
+        if owner is not None:
+            return len(self._queues.get(owner, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    def inflight(self, owner=None):
+        if owner is not None:
+            return self._inflight.get(owner, 0)
+        return self._inflight_total
+
+    # ─── internals ───
+    def _pick(self):
+        if self._inflight_total >= self.max_inflight:
+            return None
+
+        for _ in range(len(self._rotation)):
+            owner = self._rotation[0]
+            queue = self._queues.get(owner)
+
+            if not queue:
+                self._rotation.popleft()
+                self._credits.pop(owner, None)
+                continue
+
+            if self._inflight[owner] >= self.per_user_limit:
+                # At its cap: let the next owner go, keep its place in line
+                self._rotation.rotate(-1)
+                self._credits[owner] = 0
+                continue
+
+            job = queue.popleft()
+            self._credits[owner] += 1
+            if not queue:
+                self._rotation.popleft()
+                self._credits.pop(owner, None)
+            elif self._credits[owner] >= self._weights.get(owner, 1):
+                self._rotation.rotate(-1)
+                self._credits[owner] = 0
+            return owner, job
+
+        return None
+
+    async def _worker(self, worker_id):
+        while True:
+            async with self._cond:
+                picked = self._pick()
+                while picked is None:
+                    await self._cond.wait()
+                    picked = self._pick()
+                owner, job = picked
+                self._room.notify_all()
+                self._inflight[owner] += 1
+                self._inflight_total += 1
+
+            try:
+                await self._handler(owner, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("Worker %d: job for '%s' raised %r", worker_id, owner, e)
+            finally:
+                async with self._cond:
+                    self._inflight[owner] -= 1
+                    if self._inflight[owner] <= 0:
+                        del self._inflight[owner]
+                    self._inflight_total -= 1
+                    self._cond.notify_all()
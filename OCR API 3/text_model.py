@@ -0,0 +1,267 @@
+# text_model.py
+#
+# Small trainable document classifier, used ahead of the keyword rules in
+# classifier.py.
+#
+# Pages that don't contain one of the exact phrases in classifier.py come out
+# "Unknown" and get no extraction, and users re-upload them. This model learns
+# from OCR text we have already seen instead:
+#
+#   - features: hashed word unigrams + bigrams and character trigrams (which
+#     survive OCR misspellings like "weighbrldge"), on the ASCII-normalized
+#     text, sublinear tf, L2-normalized;
+#   - model: multinomial logistic regression trained with SGD, pure Python.
+#
+# Training data is a folder with one sub-folder of .txt files per category
+# (sub-folder names are the category names, "Unknown" allowed):
+#
+#   training/Weighbridge/slip_001.txt
+#   training/E Way Bill/ewb_17.txt
+#
+#   python text_model.py train training --output text_model.json
+#   python text_model.py predict page.txt
+#
+# `python main.py ... --save-text DIR` writes every page's OCR text into that
+# layout, labelled with the category it got; move misfiled pages and train.
+#
+# The model is loaded once per process (see get_text_model); without a model
+# file classifier.py uses the keyword rules alone.
+#
+# Configuration (environment variables):
+#   TEXT_MODEL_PATH             model file                          (default "text_model.json")
+#   TEXT_MODEL_MIN_CONFIDENCE   below this the keyword rules decide (default 0.6)
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+
+from ocr_document import as_document
+
+log = logging.getLogger(__name__)
+
+TEXT_MODEL_PATH = os.environ.get("TEXT_MODEL_PATH", "text_model.json")
+TEXT_MODEL_MIN_CONFIDENCE = float(os.environ.get("TEXT_MODEL_MIN_CONFIDENCE", "0.6"))
+
+N_FEATURES = 2 ** 18
+_TOKEN = re.compile(r"[a-z0-9]+")
+_DIGIT = re.compile(r"\d")
+
+
+def extract_features(text, n_features=N_FEATURES):
+    """Sparse feature vector {index: value} for one page (raw text or OCRDocument)."""
+    # Digits → 0 so "RST No 4521" and "RST No 9870" share features
+    tokens = _TOKEN.findall(_DIGIT.sub("0", as_document(text).norm_text))
+    grams = Counter(f"w:{t}" for t in tokens)
+    grams.update(f"b:{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    for t in tokens:
+        if t.isalpha() and len(t) > 3:
+            padded = f"<{t}>"
+            grams.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+
+    features = {}
+    for gram, count in grams.items():
+        index = zlib.crc32(gram.encode()) % n_features
+        features[index] = features.get(index, 0.0) + 1.0 + math.log(count)
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {index: v / norm for index, v in features.items()}
+
+
+class TextModel:
+    def __init__(self, classes, weights=None, bias=None, n_features=N_FEATURES, info=None):
+        self.classes = list(classes)
+        self.weights = weights if weights is not None else {}   # feature index → [weight per class]
+        self.bias = bias if bias is not None else [0.0] * len(self.classes)
+        self.n_features = n_features
+        self.info = info or {}
+
+    # ─── inference ───
+    def _probabilities(self, features):
+        scores = list(self.bias)
+        for index, value in features.items():
+            row = self.weights.get(index)
+            if row is not None:
+                for k, w in enumerate(row):
+                    scores[k] += w * value
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def rank(self, text):
+        """[(category, probability), ...] best first."""
+        probs = self._probabilities(extract_features(text, self.n_features))
+        return sorted(zip(self.classes, probs), key=lambda cp: cp[1], reverse=True)
+
+    # ─── training ───
+    @classmethod
+    def train(cls, samples, epochs=10, learning_rate=0.5, l2=1e-5, seed=0, n_features=N_FEATURES):
+        """`samples` is a list of (text, category). SGD on the softmax cross-entropy."""
+        classes = sorted({category for _, category in samples})
+        model = cls(classes, n_features=n_features)
+        class_index = {c: k for k, c in enumerate(classes)}
+        data = [(extract_features(text, n_features), class_index[c]) for text, c in samples]
+        rng = random.Random(seed)
+
+        step = 0
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for features, target in data:
+                step += 1
+                lr = learning_rate / (1.0 + l2 * learning_rate * step)
+                probs = model._probabilities(features)
+                grads = [p - (1.0 if k == target else 0.0) for k, p in enumerate(probs)]
+                decay = 1.0 - lr * l2
+                for index, value in features.items():
+                    row = model.weights.get(index)
+                    if row is None:
+                        row = model.weights[index] = [0.0] * len(classes)
+                    for k, g in enumerate(grads):
+                        row[k] = row[k] * decay - lr * g * value
+                for k, g in enumerate(grads):
+                    model.bias[k] -= lr * g
+        return model
+
+    # ─── persistence ───
+    def save(self, path):
+        payload = {
+            "version": 1,
+            "n_features": self.n_features,
+            "classes": self.classes,
+            "bias": [round(b, 6) for b in self.bias],
+            "weights": {str(i): [round(w, 6) for w in row] for i, row in self.weights.items()},
+            "info": self.info,
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        weights = {int(i): row for i, row in payload["weights"].items()}
+        return cls(payload["classes"], weights, payload["bias"], payload["n_features"], payload.get("info"))
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_text_model():
+    """Process-wide model, loaded on first use; None when there is no model file."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                _model = _load_model(TEXT_MODEL_PATH)
+                _model_loaded = True
+    return _model
+
+
+def _load_model(path):
+    if not os.path.isfile(path):
+        log.info("No model at '%s', using keyword rules only", path)
+        return None
+    try:
+        model = TextModel.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        log.warning("Could not load '%s', using keyword rules only: %s", path, e)
+        return None
+    log.info("Loaded '%s': %d classes, %d features", path, len(model.classes), len(model.weights))
+    return model
+
+
+# ─── Command line: train / predict ───
+def load_training_folder(folder):
+    samples = []
+    for category in sorted(os.listdir(folder)):
+        category_dir = os.path.join(folder, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for filename in sorted(os.listdir(category_dir)):
+            if filename.lower().endswith(".txt"):
+                with open(os.path.join(category_dir, filename), encoding="utf-8", errors="replace") as f:
+                    samples.append((f.read(), category))
+    return samples
+
+
+def accuracy(model, samples):
+    if not samples:
+        return None
+    correct = sum(1 for text, category in samples if model.rank(text)[0][0] == category)
+    return correct / len(samples)
+
+
+def train_command(args):
+    samples = load_training_folder(args.folder)
+    counts = Counter(category for _, category in samples)
+    print(f"📚 {len(samples)} page(s): " + ", ".join(f"{c}={n}" for c, n in sorted(counts.items())))
+    if len(counts) < 2:
+        print("❌ Need at least two categories to train")
+        return 1
+
+    rng = random.Random(args.seed)
+    rng.shuffle(samples)
+    holdout = samples[:int(len(samples) * args.holdout)]
+    train = samples[len(holdout):]
+
+    started = time.time()
+    model = TextModel.train(train, epochs=args.epochs, seed=args.seed)
+    print(f"⏱️ Trained on {len(train)} page(s) in {time.time() - started:.1f}s")
+
+    held_out = accuracy(model, holdout)
+    if held_out is not None:
+        print(f"🎯 Hold-out accuracy: {held_out:.3f} on {len(holdout)} page(s)")
+        # The saved model is refit on everything
+        model = TextModel.train(samples, epochs=args.epochs, seed=args.seed)
+
+    model.info = {"pages": len(samples), "counts": dict(counts), "holdout_accuracy": held_out,
+                  "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    model.save(args.output)
+    print(f"✅ Saved {args.output} ({len(model.weights)} features)")
+    return 0
+
+
+def predict_command(args):
+    model = TextModel.load(args.model)
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            ranking = model.rank(f.read())
+        print(f"{path}: " + ", ".join(f"{c} {p:.2f}" for c, p in ranking[:3]))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or run the hashed n-gram document classifier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="train from <folder>/<category>/*.txt")
+    train.add_argument("folder")
+    train.add_argument("--output", default=TEXT_MODEL_PATH)
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--holdout", type=float, default=0.2, help="fraction kept aside to report accuracy")
+    train.add_argument("--seed", type=int, default=0)
+    train.set_defaults(func=train_command)
+
+    predict = commands.add_parser("predict", help="rank the categories of .txt files")
+    predict.add_argument("files", nargs="+")
+    predict.add_argument("--model", default=TEXT_MODEL_PATH)
+    predict.set_defaults(func=predict_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
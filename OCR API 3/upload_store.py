@@ -0,0 +1,227 @@
+# upload_store.py
+#
+# Writes uploaded files to the uploads folder without holding them in memory.
+#
+# extract_text used to `await upload.read()` every file, so a large folder
+# upload held each whole PDF in memory on its way to disk. Uploads are now
+# written piece by piece into a temporary ".part" file, hashed on the way, and
+# renamed to "<sha256><ext>" (StagedUpload, used by form_stream.py and by
+# assemble below): one write per file, and the same file uploaded twice (a
+# re-upload, or a duplicate inside a folder) is stored once. Uploads larger
+# than UPLOAD_MAX_BYTES are rejected while streaming.
+#
+# Large folders from slow links are uploaded in parts instead (UploadSessions):
+#
+#   POST /uploads                       → upload_id, part_size, parts received so far
+#   PUT  /uploads/{upload_id}/parts/{n} → store part n (0-based), idempotent
+#   POST /uploads/{upload_id}/complete  → reassemble, hash, enqueue into a batch
+#
+# Each part is its own file under <upload_dir>/.sessions/<upload_id>/, written
+# to a temporary name and renamed once it is complete, so a dropped connection
+# loses at most the part in flight and the client re-sends only the parts the
+# session does not list. Sessions untouched for UPLOAD_SESSION_TTL are removed.
+#
+# Configuration (environment variables):
+#   UPLOAD_MAX_BYTES      largest accepted file             (default 200 MB)
+#   UPLOAD_CHUNK_SIZE     bytes read per chunk when assembling   (default 1 MB)
+#   UPLOAD_PART_SIZE      part size of chunked uploads      (default 4 MB)
+#   UPLOAD_SESSION_TTL    seconds an idle session is kept   (default 86400)
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE", str(4 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", "86400"))
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+def content_path(upload_dir, sha256, filename):
+    """Where a file with this content is stored: <upload_dir>/<sha256><ext>."""
+    return os.path.join(upload_dir, sha256 + os.path.splitext(filename)[1].lower())
+
+
+def commit_upload(tmp_path, path):
+    """Move a finished .part file into place; returns False if that content was already stored."""
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+class StagedUpload:
+    """
+    A file being written to the uploads folder: write() it piece by piece,
+    then commit() moves it to its content path, or discard() drops it.
+
+    The file is in place when commit() returns; callers that may delete
+    uploads concurrently must mark it in use before their next await.
+    """
+
+    def __init__(self, upload_dir, filename, max_bytes=UPLOAD_MAX_BYTES):
+        self.upload_dir = upload_dir
+        self.filename = filename or ""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._tmp_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.part")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"{self.filename} is larger than {self.max_bytes} bytes")
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        """Returns (path, sha256, size)."""
+        self._file.close()
+        sha256 = self._digest.hexdigest()
+        path = content_path(self.upload_dir, sha256, self.filename)
+        commit_upload(self._tmp_path, path)
+        self._tmp_path = None
+        return path, sha256, self.size
+
+    def discard(self):
+        self._file.close()
+        if self._tmp_path is not None and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+
+class UploadSessions:
+    """Chunked uploads in progress, kept on disk so they survive reconnects and restarts."""
+
+    def __init__(self, upload_dir, part_size=UPLOAD_PART_SIZE, max_bytes=UPLOAD_MAX_BYTES,
+                 ttl=UPLOAD_SESSION_TTL):
+        self.upload_dir = upload_dir
+        self.root = os.path.join(upload_dir, ".sessions")
+        self.part_size = part_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+
+    def _dir(self, upload_id):
+        # IDs come from URLs: only ever our own hex names
+        if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+            return None
+        return os.path.join(self.root, upload_id)
+
+    def create(self, file_name, size):
+        if size < 0:
+            raise UploadError(f"Invalid size for {file_name}: {size}")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"{file_name} is larger than {self.max_bytes} bytes")
+        self.sweep()
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "file_name": file_name,
+            "size": size,
+            "part_size": self.part_size,
+            "total_parts": max(1, -(-size // self.part_size)),
+            "created_at": time.time(),
+        }
+        session_dir = self._dir(session["upload_id"])
+        os.makedirs(session_dir)
+        with open(os.path.join(session_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        return session
+
+    def get(self, upload_id):
+        """The session with its "received" part numbers, or None if unknown."""
+        session_dir = self._dir(upload_id)
+        if session_dir is None:
+            return None
+        try:
+            with open(os.path.join(session_dir, "meta.json"), encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        session["received"] = sorted(
+            int(name[:-5]) for name in os.listdir(session_dir) if name.endswith(".part")
+        )
+        return session
+
+    def expected_part_size(self, session, n):
+        if not 0 <= n < session["total_parts"]:
+            raise UploadError(f"Part {n} out of range (0..{session['total_parts'] - 1})")
+        return min(session["part_size"], session["size"] - n * session["part_size"])
+
+    async def write_part(self, session, n, chunks):
+        """Store part `n` from an async iterator of bytes; returns its size."""
+        expected = self.expected_part_size(session, n)
+        session_dir = self._dir(session["upload_id"])
+        tmp_path = os.path.join(session_dir, f"{n}.{uuid.uuid4().hex}.tmp")
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > expected:
+                        raise UploadError(f"Part {n} is larger than {expected} bytes")
+                    f.write(chunk)
+            if size != expected:
+                raise UploadError(f"Part {n} is {size} bytes, expected {expected}")
+            os.replace(tmp_path, os.path.join(session_dir, f"{n}.part"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def assemble(self, session, chunk_size=UPLOAD_CHUNK_SIZE):
+        """
+        Concatenate the parts into a StagedUpload, hashing on the way, and
+        return it uncommitted: the caller commits it and marks the file in use
+        with no await in between, then discard()s the session.
+        Blocking file I/O: run it in an executor.
+        """
+        missing = sorted(set(range(session["total_parts"])) - set(session["received"]))
+        if missing:
+            raise UploadError(f"Missing parts: {missing}")
+        session_dir = self._dir(session["upload_id"])
+        staged = StagedUpload(self.upload_dir, session["file_name"], self.max_bytes)
+        try:
+            for n in range(session["total_parts"]):
+                with open(os.path.join(session_dir, f"{n}.part"), "rb") as f:
+                    while True:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        staged.write(chunk)
+        except BaseException:
+            staged.discard()
+            raise
+        return staged
+
+    def discard(self, upload_id):
+        session_dir = self._dir(upload_id)
+        if session_dir:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+    def sweep(self):
+        """Remove sessions nobody has touched for `ttl` seconds."""
+        cutoff = time.time() - self.ttl
+        for upload_id in os.listdir(self.root):
+            session_dir = os.path.join(self.root, upload_id)
+            try:
+                last_write = max(os.path.getmtime(os.path.join(session_dir, name))
+                                 for name in os.listdir(session_dir) + ["."])
+            except OSError:
+                continue
+            if last_write < cutoff:
+                shutil.rmtree(session_dir, ignore_errors=True)
@@ -0,0 +1,213 @@
+# vision_client.py
+#
+# Long-lived Google Vision clients shared by api.py and main.py.
+#
+# Creating an ImageAnnotatorClient loads credentials and opens a fresh gRPC
+# channel (TLS handshake included). Doing that once per page was a large share
+# of per-page latency, so clients are now created once, kept in a small pool
+# and handed out to whoever needs to make a request.
+
+import os
+import queue
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+VISION_POOL_SIZE = int(os.environ.get("VISION_POOL_SIZE", "4"))
+VISION_CLIENT_MAX_AGE = float(os.environ.get("VISION_CLIENT_MAX_AGE", "3600"))    # seconds
+VISION_CLIENT_MAX_FAILURES = int(os.environ.get("VISION_CLIENT_MAX_FAILURES", "3"))
+
+log = logging.getLogger(__name__)
+
+
+def _create_vision_client():
+    from google.cloud import vision  # Import inside function
+    return vision.ImageAnnotatorClient()
+
+
+class _PooledClient:
+    __slots__ = ("client", "created_at", "failures", "uses")
+
+    def __init__(self, client):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.failures = 0
+        self.uses = 0
+
+
+_CLOSED = object()   # put in the idle queue by close()
+_FREED = object()    # put in the idle queue when a slot is freed without a client to hand over
+
+
+class VisionClientPool:
+    """
+    Fixed-size pool of ImageAnnotatorClient instances.
+
+    Clients are created lazily (or all at once by warm_up()) and reused.
+    A client is recycled, i.e. closed and replaced on next use, when it has
+    failed `max_failures` requests in a row or is older than `max_age`
+    seconds, so a channel stuck in a bad state does not poison later pages.
+    """
+
+    def __init__(self, size=VISION_POOL_SIZE, max_age=VISION_CLIENT_MAX_AGE,
+                 max_failures=VISION_CLIENT_MAX_FAILURES, factory=_create_vision_client):
+        self.size = max(1, size)
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "requests": 0, "failures": 0}
+
+    def warm_up(self):
+        """Create every client up-front so the first pages don't pay for it."""
+        warmed = []
+        try:
+            while True:
+                with self._lock:
+                    if self._created >= self.size:
+                        break
+                    self._created += 1
+                try:
+                    warmed.append(self._new_client())
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+        finally:
+            # Also when a later client failed: the ones created so far count
+            # against the pool size, so they must be in it
+            for pooled in warmed:
+                self._idle.put(pooled)
+        return len(warmed)
+
+    @contextmanager
+    def client(self):
+        """
+        Borrow a client for one request:
+
+            with pool.client() as client:
+                response = client.text_detection(image=image)
+        """
+        pooled = self._acquire()
+        try:
+            yield pooled.client
+        except Exception:
+            pooled.failures += 1
+            self.stats["failures"] += 1
+            raise
+        else:
+            pooled.failures = 0
+        finally:
+            pooled.uses += 1
+            self.stats["requests"] += 1
+            self._release(pooled)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if pooled is not _CLOSED and pooled is not _FREED:
+                self._close_client(pooled)
+        # Wake whoever is waiting in _acquire for a client to be released
+        self._idle.put(_CLOSED)
+
+    # ─── internals ───
+    def _new_client(self):
+        pooled = _PooledClient(self._factory())
+        self.stats["created"] += 1
+        return pooled
+
+    def _acquire(self):
+        while True:
+            if self._closed:
+                raise RuntimeError("Vision client pool is closed")
+
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._new_client()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                pooled = self._idle.get()  # wait for a client (or a free slot) to be released
+
+            if pooled is _FREED:
+                continue                   # a slot opened up: check can_create again
+            if pooled is _CLOSED:
+                self._idle.put(_CLOSED)    # pass it on to the next waiter
+                raise RuntimeError("Vision client pool is closed")
+            if self._is_stale(pooled):
+                self._close_client(pooled)
+                self.stats["recycled"] += 1
+                try:
+                    pooled = self._new_client()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            return pooled
+
+    def _release(self, pooled):
+        if self._closed:
+            self._close_client(pooled)
+            return
+        if pooled.failures >= self.max_failures:
+            # Replace it now rather than handing a broken channel to the next caller
+            self._close_client(pooled)
+            self.stats["recycled"] += 1
+            with self._lock:
+                self._created -= 1
+            # A caller may already be waiting in _acquire, having seen the pool
+            # full: wake it so it creates the replacement
+            self._idle.put(_FREED)
+            return
+        self._idle.put(pooled)
+
+    def _is_stale(self, pooled):
+        return time.monotonic() - pooled.created_at > self.max_age
+
+    @staticmethod
+    def _close_client(pooled):
+        try:
+            pooled.client.transport.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_vision_pool():
+    """Process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = VisionClientPool()
+    return _pool
+
+
+def warm_up_vision_clients():
+    """Called once at startup by api.py and main.py."""
+    try:
+        count = get_vision_pool().warm_up()
+        log.info("Warmed up %d Vision client(s)", count)
+    except Exception as e:
+        # Don't refuse to start (e.g. credentials not mounted yet); clients
+        # will be created lazily on the first request instead.
+        log.warning("Warm-up failed, will retry lazily: %s", e)
@@ -0,0 +1,251 @@
+# word_layout.py
+#
+# Word positions of one OCR'd page, with a grid index for layout queries.
+#
+# run_ocr used to keep only the page text, so extractors located values by
+# line arithmetic: the vehicle number "somewhere in lines 5-10", the state
+# "two lines after From". Those offsets break as soon as a slip has one more
+# header line or the OCR reads two columns in a different order. A
+# WordLayout keeps every word with its bounding box, so a value can be found
+# where it is on the page:
+#
+#   layout = WordLayout.from_vision_response(response)
+#   layout.value_right_of("vehicle no")     # "WB73B 6961"
+#   layout.text_below("from", rows=3)       # the block under the "From" label
+#
+# Storage is column-oriented: the words in reading order plus one flat
+# array('i') of x0, y0, x1, y1 per word, so a page of ~500 words is a few KB
+# and pickles cheaply into the extract process pool.
+#
+# Queries go through a uniform grid (cell ≈ two text lines) built on first
+# use: a query only looks at the words in the cells its search rectangle
+# covers, and labels are looked up through a token → positions map. A grid
+# suits a page of similar-sized words as well as an R-tree (shapely's
+# STRtree) would, without the extra dependency; on a 460-word page a query
+# takes tens of microseconds (benchmarks/bench_layout.py).
+#
+# Coordinates are in pixels of the image that was OCR'd (after
+# preprocessing), with y growing downwards.
+
+import re
+from array import array
+from statistics import median
+
+from ocr_document import normalize_ascii
+
+_TOKEN_STRIP = re.compile(r"^[^a-z0-9]+|[^a-z0-9]+$")
+
+
+def _token(word):
+    # "No.:" → "no", "VEHICLE" → "vehicle"
+    return _TOKEN_STRIP.sub("", normalize_ascii(word))
+
+
+class WordLayout:
+    __slots__ = ("words", "boxes", "_tokens", "_line_height", "_cell", "_grid", "_extent", "_positions")
+
+    def __init__(self, words, boxes):
+        self.words = list(words)                # word texts, reading order
+        self.boxes = array("i", boxes)          # x0, y0, x1, y1 per word
+        if len(self.boxes) != 4 * len(self.words):
+            raise ValueError("need four coordinates per word")
+        self._tokens = None
+        self._line_height = None
+        self._cell = None
+        self._grid = None
+        self._extent = None
+        self._positions = None
+
+    # ─── construction ───
+    @classmethod
+    def from_vision_response(cls, response):
+        """From an AnnotateImageResponse: text_annotations[1:] are the words."""
+        words, boxes = [], []
+        for annotation in list(response.text_annotations)[1:]:
+            vertices = annotation.bounding_poly.vertices
+            if not vertices:
+                continue
+            xs = [v.x for v in vertices]
+            ys = [v.y for v in vertices]
+            words.append(annotation.description)
+            boxes.extend((min(xs), min(ys), max(xs), max(ys)))
+        return cls(words, boxes)
+
+    @classmethod
+    def from_tesseract_data(cls, data):
+        """From pytesseract.image_to_data(..., output_type=Output.DICT)."""
+        words, boxes = [], []
+        for i, text in enumerate(data["text"]):
+            if text and text.strip():
+                left, top = data["left"][i], data["top"][i]
+                words.append(text)
+                boxes.extend((left, top, left + data["width"][i], top + data["height"][i]))
+        return cls(words, boxes)
+
+    def to_dict(self):
+        return {"words": self.words, "boxes": self.boxes.tolist()}
+
+    @classmethod
+    def from_dict(cls, payload):
+        return cls(payload["words"], payload["boxes"])
+
+    def __len__(self):
+        return len(self.words)
+
+    def __reduce__(self):
+        return (self.__class__, (self.words, self.boxes))
+
+    # ─── geometry helpers ───
+    def box(self, i):
+        return tuple(self.boxes[4 * i:4 * i + 4])
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = [_token(w) for w in self.words]
+        return self._tokens
+
+    def positions(self, token):
+        """Indexes of the words whose normalized token is `token`."""
+        if self._positions is None:
+            positions = {}
+            for i, t in enumerate(self.tokens):
+                positions.setdefault(t, []).append(i)
+            self._positions = positions
+        return self._positions.get(token, ())
+
+    @property
+    def line_height(self):
+        if self._line_height is None:
+            b = self.boxes
+            heights = [b[k + 3] - b[k + 1] for k in range(0, len(b), 4)]
+            self._line_height = max(1, int(median(heights))) if heights else 1
+        return self._line_height
+
+    def _build_grid(self):
+        self._cell = 2 * self.line_height
+        grid = {}
+        b = self.boxes
+        for i in range(len(self.words)):
+            x0, y0, x1, y1 = b[4 * i:4 * i + 4]
+            for cx in range(x0 // self._cell, x1 // self._cell + 1):
+                for cy in range(y0 // self._cell, y1 // self._cell + 1):
+                    grid.setdefault((cx, cy), []).append(i)
+        self._grid = grid
+        self._extent = (max(b[2::4], default=0), max(b[3::4], default=0))
+
+    def within(self, x0, y0, x1, y1):
+        """Ids of the words whose box intersects the rectangle, in reading order."""
+        if self._grid is None:
+            self._build_grid()
+        cell, grid, b = self._cell, self._grid, self.boxes
+        # Only cells that can hold words: open-ended queries stop at the page edge
+        x1, y1 = min(x1, self._extent[0]), min(y1, self._extent[1])
+        found = set()
+        for cx in range(max(0, x0) // cell, max(0, x1) // cell + 1):
+            for cy in range(max(0, y0) // cell, max(0, y1) // cell + 1):
+                for i in grid.get((cx, cy), ()):
+                    if b[4 * i] <= x1 and b[4 * i + 2] >= x0 and b[4 * i + 1] <= y1 and b[4 * i + 3] >= y0:
+                        found.add(i)
+        return sorted(found)
+
+    def _same_row(self, i, y0, y1):
+        # Vertical overlap of at least half the smaller height
+        wy0, wy1 = self.boxes[4 * i + 1], self.boxes[4 * i + 3]
+        overlap = min(y1, wy1) - max(y0, wy0)
+        return overlap >= 0.5 * max(1, min(y1 - y0, wy1 - wy0))
+
+    def _row_text(self, ids):
+        return " ".join(self.words[i] for i in sorted(ids, key=lambda i: self.boxes[4 * i]))
+
+    # ─── labels ───
+    def find_label(self, phrase, alone=False):
+        """
+        Boxes (x0, y0, x1, y1) of each occurrence of `phrase`: consecutive
+        words on one row whose normalized tokens match the phrase's words.
+        With `alone`, only occurrences with no other word within three line
+        heights on either side (a "To" column heading, not "Bill To").
+        """
+        wanted = [t for t in (_token(w) for w in phrase.split()) if t]
+        if not wanted:
+            return []
+        tokens, b = self.tokens, self.boxes
+        found = []
+        for start in self.positions(wanted[0]):
+            if tokens[start:start + len(wanted)] != wanted:
+                continue
+            ids = range(start, start + len(wanted))
+            y0, y1 = b[4 * start + 1], b[4 * start + 3]
+            if all(self._same_row(i, y0, y1) for i in ids):
+                box = (min(b[4 * i] for i in ids), min(b[4 * i + 1] for i in ids),
+                       max(b[4 * i + 2] for i in ids), max(b[4 * i + 3] for i in ids))
+                if alone and self._has_neighbours(box, ids):
+                    continue
+                found.append(box)
+        return found
+
+    def _has_neighbours(self, box, ids):
+        x0, y0, x1, y1 = box
+        reach = 3 * self.line_height
+        return any(i not in ids and self._same_row(i, y0, y1)
+                   for i in self.within(x0 - reach, y0, x1 + reach, y1))
+
+    # ─── positional queries ───
+    def right_of(self, box, max_gap=None):
+        """
+        Ids of the words on the same row as `box` and to its right, left to
+        right, up to the first horizontal gap wider than `max_gap`
+        (default: three line heights, i.e. the next column).
+        """
+        x0, y0, x1, y1 = box
+        h = self.line_height
+        max_gap = 3 * h if max_gap is None else max_gap
+        b = self.boxes
+        ids = [i for i in self.within(x1 - h // 2, y0, float("inf"), y1)
+               if b[4 * i] >= x1 - h // 2 and self._same_row(i, y0, y1)]
+        ids.sort(key=lambda i: b[4 * i])
+        row, edge = [], x1
+        for i in ids:
+            if b[4 * i] - edge > max_gap:
+                break
+            row.append(i)
+            edge = max(edge, b[4 * i + 2])
+        return row
+
+    def below(self, box, rows=1, max_dy=None):
+        """
+        Ids of the words in the first `rows` rows under `box` that overlap it
+        horizontally (widened by one line height), top to bottom, left to right.
+        Rows are at most `max_dy` (default: 2 × (`rows` + 1) line heights) down.
+        """
+        x0, y0, x1, y1 = box
+        h = self.line_height
+        max_dy = (rows + 1) * 2 * h if max_dy is None else max_dy
+        b = self.boxes
+        candidates = [i for i in self.within(x0 - h, y1, x1 + h, y1 + max_dy) if b[4 * i + 1] >= y1 - h // 2]
+        candidates.sort(key=lambda i: (b[4 * i + 1], b[4 * i]))
+        result = []
+        while candidates and rows > 0:
+            top = candidates[0]
+            ry0, ry1 = b[4 * top + 1], b[4 * top + 3]
+            row = [i for i in candidates if self._same_row(i, ry0, ry1)]
+            result.append(sorted(row, key=lambda i: b[4 * i]))
+            candidates = [i for i in candidates if i not in row]
+            rows -= 1
+        return result
+
+    def value_right_of(self, label, max_gap=None):
+        """Text to the right of the first occurrence of `label` ("" if none), without a leading ':'/'-'."""
+        for box in self.find_label(label):
+            ids = self.right_of(box, max_gap)
+            if ids:
+                return self._row_text(ids).lstrip(":-. ").strip()
+        return ""
+
+    def text_below(self, label, rows=1, alone=False):
+        """Rows of text under the first occurrence of `label`, joined with newlines ("" if none)."""
+        for box in self.find_label(label, alone):
+            block = self.below(box, rows)
+            if block:
+                return "\n".join(self._row_text(row) for row in block)
+        return ""
@@ -1,6 +1,6 @@
 import Navbar from "./components/Navbar";
 import plus from "./assets/icons/plus.png";
-import { createRef, useState, useEffect } from "react";
+import { createRef, useRef, useState, useEffect } from "react";
 import TableRow from "./components/TableRow";
 import { io } from "socket.io-client";
 import { ToastContainer, toast } from "react-toastify";
@@ -13,9 +13,22 @@ import "react-pdf/dist/esm/Page/AnnotationLayer.css";
 import "react-pdf/dist/esm/Page/TextLayer.css";
 import downloadIcon from "./assets/icons/download.png";
 import { downloadCompleteCSV, downloadCompletePDF } from "./utils/download";
+import { uploadFilesChunked } from "./utils/upload";
 
 pdfjs.GlobalWorkerOptions.workerSrc = "/pdf.worker.min.js";
 
+// Stable across reconnects and reloads: the server shares its workers fairly
+// between client ids, not between sockets or batches
+const CLIENT_ID_KEY = "ocrClientId";
+function getClientId() {
+  let clientId = localStorage.getItem(CLIENT_ID_KEY);
+  if (!clientId) {
+    clientId = crypto.randomUUID();
+    localStorage.setItem(CLIENT_ID_KEY, clientId);
+  }
+  return clientId;
+}
+
 function App() {
   const inputRef = createRef();
 
@@ -30,6 +43,8 @@ function App() {
   const [selectedRow, setSelectedRow] = useState(null);
 
   const [socket, setSocket] = useState(null);
+  // Batch of the last upload; after a reconnect the server resends its results
+  const batchIdRef = useRef(null);
 
   const [uploadType, setUploadType] = useState("files");
   const [subfolders, setSubfolders] = useState([]);
@@ -43,7 +58,7 @@ function App() {
 
   useEffect(() => {
     // const newSocket = io("https://ocr.recircle.in");
-  const newSocket = io("http://localhost:8000");
+  const newSocket = io("http://localhost:8000", { auth: { clientId: getClientId() } });
     setSocket(newSocket);
 
     return () => {
@@ -52,6 +67,22 @@ function App() {
     };
   }, []);
 
+  useEffect(() => {
+    if (socket) {
+      // A reconnect gets a new socket id: reattach it to the running batch
+      const reattach = () => {
+        if (batchIdRef.current) {
+          socket.emit("reattach", { batchId: batchIdRef.current });
+        }
+      };
+      socket.on("connect", reattach);
+
+      return () => {
+        socket.off("connect", reattach);
+      };
+    }
+  }, [socket]);
+
   useEffect(() => {
     if (socket) {
       socket.on("fileStatus", (data) => {
@@ -459,34 +490,26 @@ function App() {
 
       setProgress(0);
 
-      const formData = new FormData();
-      files.forEach((file) => {
-        if (validPdfFormat) {
-          formData.append("images", file);
-        }
-
-        if (validSubfolderFormat) {
-          formData.append("images", file);
-          formData.append("parents[]", file.webkitRelativePath.split("/")[1]);
-        }
-      });
-
-      fetch(`${backendURL}/extractText`, {
-        method: "POST",
-        body: formData,
-        headers: {
-          "socket-id": socket.id,
+      // Files go up in resumable parts; pages are processed as each file completes
+      uploadFilesChunked({
+        backendURL,
+        socketId: socket.id,
+        files,
+        parents: validSubfolderFormat
+          ? files.map((file) => file.webkitRelativePath.split("/")[1])
+          : [],
+        onBatch: (batchId) => {
+          batchIdRef.current = batchId;
         },
       })
-        .then((response) => {
-          if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-          } else {
-            console.log("Files uploaded successfully");
-          }
+        .then(() => {
+          console.log("Files uploaded successfully");
         })
         .catch((error) => {
           console.error("Error during file upload: ", error);
+          toast.error("Upload interrupted: select the folder again to resume.", {
+            theme: "dark",
+          });
         });
     } else {
       console.log("No files selected");
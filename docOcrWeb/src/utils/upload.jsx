@@ -0,0 +1,165 @@
+// Chunked, resumable uploads (see "Chunked, resumable uploads" in api.py).
+//
+// Every file is cut into the part size the server asks for, parts are sent
+// PARALLEL_PARTS at a time across all files, and a failed part is retried
+// with backoff. Upload IDs are kept in localStorage per file, so submitting
+// the same folder again after a dropped connection or a page reload only
+// sends the parts the server does not have yet.
+
+const PARALLEL_PARTS = 4;
+const MAX_ATTEMPTS = 5;
+const STORAGE_KEY = "ocrUploads";
+
+const fileKey = (file) =>
+  `${file.webkitRelativePath || file.name}:${file.size}:${file.lastModified}`;
+
+const loadUploadIds = () => {
+  try {
+    return JSON.parse(localStorage.getItem(STORAGE_KEY)) || {};
+  } catch {
+    return {};
+  }
+};
+
+const saveUploadId = (file, uploadId) => {
+  const ids = loadUploadIds();
+  if (uploadId) {
+    ids[fileKey(file)] = uploadId;
+  } else {
+    delete ids[fileKey(file)];
+  }
+  localStorage.setItem(STORAGE_KEY, JSON.stringify(ids));
+};
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const request = async (url, options = {}) => {
+  const response = await fetch(url, options);
+  if (!response.ok) {
+    const error = new Error(`HTTP error! status: ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+  return response.json();
+};
+
+// Retries network errors and 5xx responses; a 4xx will not get better
+const withRetry = async (action) => {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await action();
+    } catch (error) {
+      if (attempt >= MAX_ATTEMPTS || (error.status && error.status < 500)) {
+        throw error;
+      }
+      await sleep(Math.min(1000 * 2 ** (attempt - 1), 15000));
+    }
+  }
+};
+
+const jsonPost = (url, body) =>
+  request(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+
+// Reuse the file's earlier upload session if the server still has it
+const openSession = async (backendURL, file) => {
+  const uploadId = loadUploadIds()[fileKey(file)];
+  if (uploadId) {
+    try {
+      return await withRetry(() => request(`${backendURL}/uploads/${uploadId}`));
+    } catch (error) {
+      if (error.status !== 404) throw error;
+    }
+  }
+  const session = await withRetry(() =>
+    jsonPost(`${backendURL}/uploads`, { file_name: file.name, size: file.size })
+  );
+  saveUploadId(file, session.upload_id);
+  return session;
+};
+
+// Runs `tasks` (functions returning promises) at most `limit` at a time
+const runPool = async (tasks, limit) => {
+  let next = 0;
+  const worker = async () => {
+    while (next < tasks.length) {
+      await tasks[next++]();
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(limit, tasks.length) }, worker));
+};
+
+/**
+ * Uploads `files` into a new batch for `socketId`; `parents[i]` is the
+ * subfolder of files[i] (or undefined). `onBatch` gets the batch ID as soon
+ * as the batch exists; each file is enqueued on the server when its last
+ * part arrives. Resolves with the batch ID once every file is uploaded.
+ */
+export const uploadFilesChunked = async ({
+  backendURL,
+  socketId,
+  files,
+  parents = [],
+  onBatch,
+}) => {
+  const { batch_id: batchId } = await withRetry(() =>
+    request(`${backendURL}/batches`, {
+      method: "POST",
+      headers: { "socket-id": socketId },
+    })
+  );
+  onBatch?.(batchId);
+
+  const sessions = files.map((file, index) => ({
+    file,
+    parent: parents[index] ?? null,
+    pending: 0,
+  }));
+  await runPool(
+    sessions.map((entry) => async () => {
+      entry.session = await openSession(backendURL, entry.file);
+    }),
+    PARALLEL_PARTS
+  );
+
+  const completeFile = async (entry) => {
+    await withRetry(() =>
+      jsonPost(`${backendURL}/uploads/${entry.session.upload_id}/complete`, {
+        batch_id: batchId,
+        parent: entry.parent,
+      })
+    );
+    saveUploadId(entry.file, null);
+  };
+
+  const partTasks = [];
+  for (const entry of sessions) {
+    const { file, session } = entry;
+    const received = new Set(session.received);
+    for (let n = 0; n < session.total_parts; n++) {
+      const start = n * session.part_size;
+      const end = Math.min(start + session.part_size, file.size);
+      if (received.has(n)) continue;
+      entry.pending++;
+      partTasks.push(async () => {
+        await withRetry(() =>
+          request(`${backendURL}/uploads/${session.upload_id}/parts/${n}`, {
+            method: "PUT",
+            headers: { "Content-Type": "application/octet-stream" },
+            body: file.slice(start, end),
+          })
+        );
+        entry.pending--;
+        if (entry.pending === 0) await completeFile(entry);
+      });
+    }
+    // Every part was already on the server
+    if (entry.pending === 0) partTasks.push(() => completeFile(entry));
+  }
+
+  await runPool(partTasks, PARALLEL_PARTS);
+  return batchId;
+};